@@ -1,6 +1,21 @@
+import importlib
+import os
+import threading
+import time
+
+run_started = time.perf_counter()
+script_started = time.time()
+
 import streamlit as st
-import pandas as pd
-import plotly.express as px
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+from live_data import source_fingerprint
+from shared_cache import SharedCache
+
+# pandas, plotly.express and the catalogue modules are imported inside the
+# loaders and figure functions below: the title and section picker are on
+# screen before any of them load, a background thread loads the catalogue
+# once per process, and only the selected section is built on each run.
 
 # Set dark theme
 st.set_page_config(page_title="Flipkart Smartphone Analysis", layout="wide")
@@ -63,194 +78,336 @@ st.markdown(
 )
 
 # Load data
-@st.cache_data
-def load_data():
-    data = pd.read_csv('flipkart_smartphones.csv')
-    data.columns = data.columns.str.lower().str.replace(' ', '_')
-    data['ratings'] = pd.to_numeric(data['ratings'], errors='coerce')
-    data['original_price'] = pd.to_numeric(data['original_price'], errors='coerce')
-    data['discounted_price'] = pd.to_numeric(data['discounted_price'], errors='coerce')
-    data['battery_capacity'] = pd.to_numeric(data['battery_capacity'], errors='coerce')
-    data['memory'] = data['memory'].astype(str)
-    data['storage'] = data['storage'].astype(str)
-    data['rear_camera'] = data['rear_camera'].astype(str)
-    data['front_camera'] = data['front_camera'].astype(str)
-    data['processor'] = data['processor'].astype(str)
+APP_COLUMNS = [
+    'brand', 'model', 'original_price', 'discounted_price', 'ratings', 'battery_capacity',
+    'memory', 'storage', 'rear_camera', 'front_camera', 'processor', 'display_size',
+    'rear_mp_primary', 'front_mp',
+]
+
+DATA_SOURCE = 'flipkart_smartphones.csv'
+
+# A cache resource, not cache data: the frame is memory-mapped from the columnar
+# store, and returning the same object keeps every session (and, through the OS
+# page cache, every process) on one copy instead of a pickled copy per call.
+# Every loader takes the dataset version, so a changed CSV is loaded again
+# (max_entries drops the old versions) and figures are never built from a
+# frame older than the version they are shared under.
+@st.cache_resource(max_entries=2)
+def load_data(version):
+    from datastore import load_catalogue as load_columns
+    # Column names and numeric columns come back already normalized; run
+    # `python ingest.py flipkart_smartphones.csv` once to skip the CSV parse
+    # memory/storage/camera/processor arrive as categoricals and prices/ratings
+    # downcast, following schema.py, instead of one Python str per row
+    data = load_columns(DATA_SOURCE, APP_COLUMNS)
     return data
 
-data = load_data()
+# Model -> row index, built once per process instead of masking the frame on every rerun
+@st.cache_resource(max_entries=2)
+def load_catalogue(version):
+    from catalogue import CatalogueIndex
+    return CatalogueIndex(load_data(version))
+
+# Typeahead index so the selectboxes only hold the current matches
+@st.cache_resource(max_entries=2)
+def load_model_search(version):
+    from model_search import ModelSearchIndex
+    return ModelSearchIndex(load_catalogue(version).models())
+
+# Pre-aggregated counts behind the pie and the ratings histogram
+@st.cache_resource(max_entries=2)
+def load_rollup(version):
+    from rollup import load_rollup as build_rollup
+    return build_rollup(DATA_SOURCE)
+
+# Brand bitmaps and sorted price/rating indexes for the sidebar filters
+@st.cache_resource(max_entries=2)
+def load_cross_filter(version):
+    from filters import CrossFilter
+    return CrossFilter(load_data(version))
+
+# Normalized spec vectors behind "phones like this"
+@st.cache_resource(max_entries=2)
+def load_similar(version):
+    from similar import SimilarPhones
+    return SimilarPhones(load_catalogue(version))
+
+def warm_up(version):
+    # Every loader, in the order the page asks for them, then the charting imports
+    for load in (load_data, load_cross_filter, load_rollup, load_catalogue, load_model_search, load_similar):
+        load(version)
+    for module in ("plotly.express", "scatter"):
+        importlib.import_module(module)
+
+# Once per process and dataset version, while the first visitor's page renders; the
+# cached loaders make a session that needs a resource first wait for the same computation
+@st.cache_resource(max_entries=2)
+def start_warm_up(version):
+    thread = threading.Thread(target=warm_up, args=(version,), name="app-warm-up", daemon=True)
+    add_script_run_ctx(thread, get_script_run_ctx())
+    thread.start()
+    return thread
+
+def process_started():
+    # Wall-clock start of this process (Linux), so interpreter and Streamlit
+    # start-up and the imports above count towards the first render
+    try:
+        with open("/proc/self/stat") as f:
+            ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        age = time.clock_gettime(time.CLOCK_BOOTTIME) - ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+    return time.time() - age
+
+# Process start and first complete render, for the timings in the sidebar
+@st.cache_resource
+def startup_timings():
+    # Elsewhere, the top of the first script run stands in for the process start
+    return {"started": process_started() or script_started}
+
+timings = startup_timings()
 
 # ---- Title ----
 st.markdown("<div class='stTitle'>📱 Flipkart Smartphone Data Analysis</div>", unsafe_allow_html=True)
 
+# Only the selected section runs. (st.tabs would run, and send, every tab's charts.)
+SECTIONS = ["🏆 Brand Market Share", "💲 Price vs Ratings", "🔋 Battery Capacity vs Price",
+            "⭐ Ratings Distribution", "🆚 Compare Smartphones"]
+section = st.radio("Section", SECTIONS, horizontal=True, label_visibility="collapsed")
+
+# The version every loader and shared figure of this run is keyed on
+dataset_version = source_fingerprint(DATA_SOURCE)
+start_warm_up(dataset_version)
+
+with st.spinner("Loading catalogue..."):
+    from rollup import PRICE_STEP
+    data = load_data(dataset_version)
+    cross_filter = load_cross_filter(dataset_version)
+
+# ---- Filters ----
+price_max = int(data['discounted_price'].max() // PRICE_STEP + 1) * PRICE_STEP
+selected_brands = st.sidebar.multiselect("Brands", cross_filter.brands)
+price_range = st.sidebar.slider("Price range (INR)", 0, price_max, (0, price_max), step=PRICE_STEP)
+min_rating = st.sidebar.slider("Minimum rating", 0.0, 5.0, 0.0, step=0.1)
+if price_range == (0, price_max):
+    price_range = None
+
+# Charts below read the filtered rows (scatters) or the filtered rollup (pie, histogram),
+# computed only by the sections that use them
+def filtered_data():
+    return cross_filter.select(selected_brands, price_range, min_rating)
+
+def filtered_rollup():
+    return load_rollup(dataset_version).filtered(selected_brands, price_range, min_rating)
+
+# Figure JSON is shared with the other Streamlit processes and keyed by dataset
+# version and filters, so each chart is built once per filter state (see shared_cache.py)
+shared_cache = SharedCache()
+filter_key = (tuple(sorted(selected_brands)), price_range, min_rating)
+
+# ...and kept per process, so a rerun with unchanged filters (or another
+# session with the same ones) reuses the figure without reading the disk cache
+@st.cache_resource(max_entries=256)
+def cached_figure(version, name, key, _build):
+    return shared_cache.figure(version, ('app', name) + key, _build)
+
+def shared_figure(name, build):
+    return cached_figure(dataset_version, name, filter_key, build)
+
 # ---- Brand Market Share ----
-st.markdown("<div class='section-header'>🏆 Brand Market Share</div>", unsafe_allow_html=True)
-brand_counts = data['brand'].value_counts().reset_index()
-brand_counts.columns = ['brand', 'count']
-
-fig_brand_share = px.pie(
-    brand_counts,
-    names='brand',
-    values='count',
-    title='Brand Market Share',
-    hole=0.3,
-    color_discrete_sequence=px.colors.qualitative.Bold
-)
+def brand_share_figure():
+    import plotly.express as px
+    brand_counts = filtered_rollup().brand_counts().reset_index()
+    brand_counts.columns = ['brand', 'count']
 
-fig_brand_share.update_layout(
-    paper_bgcolor='#121212',
-    plot_bgcolor='#121212',
-    font=dict(color='#E0E0E0'),
-    legend=dict(
-        font=dict(color='#FFFFFF'),
-        bgcolor='#1E1E1E',
-        bordercolor='#00ADB5',
-        borderwidth=1
+    fig_brand_share = px.pie(
+        brand_counts,
+        names='brand',
+        values='count',
+        title='Brand Market Share',
+        hole=0.3,
+        color_discrete_sequence=px.colors.qualitative.Bold
     )
-)
-st.plotly_chart(fig_brand_share)
+
+    fig_brand_share.update_layout(
+        paper_bgcolor='#121212',
+        plot_bgcolor='#121212',
+        font=dict(color='#E0E0E0'),
+        legend=dict(
+            font=dict(color='#FFFFFF'),
+            bgcolor='#1E1E1E',
+            bordercolor='#00ADB5',
+            borderwidth=1
+        )
+    )
+    return fig_brand_share
 
 # ---- Price vs Ratings ----
-st.markdown("<div class='section-header'>💲 Price vs Ratings</div>", unsafe_allow_html=True)
-
-fig_price_vs_rating = px.scatter(
-    data,
-    x='original_price',
-    y='ratings',
-    color='brand',
-    title='Price vs Ratings',
-    hover_data=['model'],
-    color_discrete_sequence=px.colors.qualitative.Set1
-)
+def price_vs_rating_figure():
+    import plotly.express as px
+    from scatter import scatter_figure
+    # WebGL above a few thousand rows, a per-brand sample on very large catalogues
+    fig_price_vs_rating = scatter_figure(
+        filtered_data(),
+        x='original_price',
+        y='ratings',
+        color='brand',
+        title='Price vs Ratings',
+        hover_data=['model'],
+        color_discrete_sequence=px.colors.qualitative.Set1
+    )
 
-fig_price_vs_rating.update_layout(
-    paper_bgcolor='#121212',
-    plot_bgcolor='#121212',
-    font=dict(color='#E0E0E0'),
-    legend=dict(
-        font=dict(color='#FFFFFF'),
-        bgcolor='#1E1E1E',
-        bordercolor='#00ADB5',
-        borderwidth=1
+    fig_price_vs_rating.update_layout(
+        paper_bgcolor='#121212',
+        plot_bgcolor='#121212',
+        font=dict(color='#E0E0E0'),
+        legend=dict(
+            font=dict(color='#FFFFFF'),
+            bgcolor='#1E1E1E',
+            bordercolor='#00ADB5',
+            borderwidth=1
+        )
     )
-)
-st.plotly_chart(fig_price_vs_rating)
+    return fig_price_vs_rating
 
 # ---- Battery vs Price ----
-st.markdown("<div class='section-header'>🔋 Battery Capacity vs Price</div>", unsafe_allow_html=True)
-
-fig_battery_vs_price = px.scatter(
-    data,
-    x='battery_capacity',
-    y='original_price',
-    color='brand',
-    title='Battery Capacity vs Price',
-    hover_data=['model'],
-    color_discrete_sequence=px.colors.qualitative.Dark24
-)
+def battery_vs_price_figure():
+    import plotly.express as px
+    from scatter import scatter_figure
+    fig_battery_vs_price = scatter_figure(
+        filtered_data(),
+        x='battery_capacity',
+        y='original_price',
+        color='brand',
+        title='Battery Capacity vs Price',
+        hover_data=['model'],
+        color_discrete_sequence=px.colors.qualitative.Dark24
+    )
 
-fig_battery_vs_price.update_layout(
-    paper_bgcolor='#121212',
-    plot_bgcolor='#121212',
-    font=dict(color='#E0E0E0'),
-    legend=dict(
-        font=dict(color='#FFFFFF'),
-        bgcolor='#1E1E1E',
-        bordercolor='#00ADB5',
-        borderwidth=1
+    fig_battery_vs_price.update_layout(
+        paper_bgcolor='#121212',
+        plot_bgcolor='#121212',
+        font=dict(color='#E0E0E0'),
+        legend=dict(
+            font=dict(color='#FFFFFF'),
+            bgcolor='#1E1E1E',
+            bordercolor='#00ADB5',
+            borderwidth=1
+        )
     )
-)
-st.plotly_chart(fig_battery_vs_price)
+    return fig_battery_vs_price
 
 # ---- Ratings Distribution ----
-st.markdown("<div class='section-header'>⭐ Ratings Distribution</div>", unsafe_allow_html=True)
-
-fig_ratings = px.histogram(
-    data,
-    x='ratings',
-    color='brand',
-    title='Ratings Distribution',
-    nbins=30,
-    color_discrete_sequence=px.colors.qualitative.Vivid
-)
+def ratings_figure():
+    import plotly.express as px
+    rating_counts = filtered_rollup().rating_histogram_by_brand()
+    fig_ratings = px.bar(
+        rating_counts,
+        x='rating_bucket',
+        y='count',
+        color='brand',
+        title='Ratings Distribution',
+        labels={'rating_bucket': 'ratings'},
+        color_discrete_sequence=px.colors.qualitative.Vivid
+    )
+    fig_ratings.update_layout(bargap=0)
 
-fig_ratings.update_layout(
-    paper_bgcolor='#121212',
-    plot_bgcolor='#121212',
-    font=dict(color='#E0E0E0'),
-    legend=dict(
-        font=dict(color='#FFFFFF'),
-        bgcolor='#1E1E1E',
-        bordercolor='#00ADB5',
-        borderwidth=1
+    fig_ratings.update_layout(
+        paper_bgcolor='#121212',
+        plot_bgcolor='#121212',
+        font=dict(color='#E0E0E0'),
+        legend=dict(
+            font=dict(color='#FFFFFF'),
+            bgcolor='#1E1E1E',
+            bordercolor='#00ADB5',
+            borderwidth=1
+        )
     )
-)
-st.plotly_chart(fig_ratings)
+    return fig_ratings
 
 # ---- Compare Smartphones ----
-st.markdown("<div class='section-header'>🆚 Compare Smartphones</div>", unsafe_allow_html=True)
-
-col1, col2 = st.columns(2)
-
-with col1:
-    model1 = st.selectbox("Select First Smartphone:", data['model'].unique())
-
-with col2:
-    model2 = st.selectbox("Select Second Smartphone:", data['model'].unique())
-
-if model1 and model2:
-    phone1 = data[data['model'] == model1].iloc[0]
-    phone2 = data[data['model'] == model2].iloc[0]
-
-    st.markdown(f"""
-    <table class='compare-table'>
-        <tr>
-            <th>Feature</th>
-            <th>{model1}</th>
-            <th>{model2}</th>
-        </tr>
-        <tr>
-            <td>Original Price</td>
-            <td>{phone1['original_price']}</td>
-            <td>{phone2['original_price']}</td>
-        </tr>
-        <tr>
-            <td>Discounted Price</td>
-            <td>{phone1['discounted_price']}</td>
-            <td>{phone2['discounted_price']}</td>
-        </tr>
-        <tr>
-            <td>Ratings</td>
-            <td>{phone1['ratings']}</td>
-            <td>{phone2['ratings']}</td>
-        </tr>
-        <tr>
-            <td>Battery Capacity</td>
-            <td>{phone1['battery_capacity']}</td>
-            <td>{phone2['battery_capacity']}</td>
-        </tr>
-        <tr>
-            <td>Memory</td>
-            <td>{phone1['memory']}</td>
-            <td>{phone2['memory']}</td>
-        </tr>
-        <tr>
-            <td>Rear Camera</td>
-            <td>{phone1['rear_camera']}</td>
-            <td>{phone2['rear_camera']}</td>
-        </tr>
-        <tr>
-            <td>Front Camera</td>
-            <td>{phone1['front_camera']}</td>
-            <td>{phone2['front_camera']}</td>
-        </tr>
-        <tr>
-            <td>Processor</td>
-            <td>{phone1['processor']}</td>
-            <td>{phone2['processor']}</td>
-        </tr>
-    </table>
-    """, unsafe_allow_html=True)
+def model_picker(label, key, model_search):
+    query = st.text_input(f"Search {label}:", key=f"{key}_query")
+    page = st.number_input("Results page", min_value=1, value=1, step=1, key=f"{key}_page")
+    matches, has_more = model_search.search(query, page=page - 1, limit=25)
+    if has_more:
+        st.caption("More matches on the next page, or refine the search.")
+    return st.selectbox(f"Select {label}:", matches, key=key)
+
+# Rows shown in the comparison table: (label, column)
+COMPARE_FEATURES = [
+    ('Original Price', 'original_price'),
+    ('Discounted Price', 'discounted_price'),
+    ('Ratings', 'ratings'),
+    ('Battery Capacity', 'battery_capacity'),
+    ('Memory', 'memory'),
+    ('Rear Camera', 'rear_camera'),
+    ('Front Camera', 'front_camera'),
+    ('Processor', 'processor'),
+]
+
+# A fragment: the pickers and table rerun on their own when their widgets change,
+# without the sidebar, data loading or charts of the full script
+@st.fragment
+def compare_section(version):
+    catalogue = load_catalogue(version)
+    model_search = load_model_search(version)
+
+    col1, col2 = st.columns(2)
+
+    with col1:
+        model1 = model_picker("First Smartphone", "model1", model_search)
+
+    with col2:
+        model2 = model_picker("Second Smartphone", "model2", model_search)
+
+    if model1 and model2:
+        # Works for any number of selected models, one column per phone
+        models = [model1, model2]
+        phones = [catalogue.record(model) for model in models]
+
+        header = "".join(f"<th>{model}</th>" for model in models)
+        body = "".join(
+            f"<tr><td>{label}</td>" + "".join(f"<td>{phone[column]}</td>" for phone in phones) + "</tr>"
+            for label, column in COMPARE_FEATURES
+        )
+        st.markdown(f"""
+        <table class='compare-table'>
+            <tr>
+                <th>Feature</th>
+                {header}
+            </tr>
+            {body}
+        </table>
+        """, unsafe_allow_html=True)
+
+    # ---- Similar Smartphones ----
+    if model1:
+        neighbours = load_similar(version).similar(model1, k=5)
+        if neighbours:
+            st.markdown(f"<div class='section-header'>🔍 Phones like {model1}</div>", unsafe_allow_html=True)
+            similar_table = catalogue.rows([model for model, _ in neighbours])
+            st.dataframe(similar_table[['brand', 'discounted_price', 'ratings', 'memory', 'storage', 'battery_capacity']])
+
+# ---- Selected Section ----
+st.markdown(f"<div class='section-header'>{section}</div>", unsafe_allow_html=True)
+CHARTS = {
+    SECTIONS[0]: ('brand_share', brand_share_figure),
+    SECTIONS[1]: ('price_vs_rating', price_vs_rating_figure),
+    SECTIONS[2]: ('battery_vs_price', battery_vs_price_figure),
+    SECTIONS[3]: ('ratings', ratings_figure),
+}
+if section in CHARTS:
+    st.plotly_chart(shared_figure(*CHARTS[section]))
+else:
+    compare_section(dataset_version)
 
 # ---- Completion Message ----
 st.success("✅ Dashboard Loaded Successfully!")
+
+# ---- Timings ----
+# This run, and the first complete render after the process started
+if "first_render_s" not in timings:
+    timings["first_render_s"] = time.time() - timings["started"]
+st.sidebar.caption("Rendered in %.0f ms; first render %.2fs after process start" % (
+    (time.perf_counter() - run_started) * 1000, timings["first_render_s"]))
@@ -0,0 +1,349 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+import numpy as np
+import pandas as pd
+
+# Benchmarks for loading, aggregation, figure building and Dash callbacks on
+# synthetic catalogues with the cleaned_data.csv schema.
+#
+#   python bench.py                              (1k, 100k, 1M and 10M rows)
+#   python bench.py --sizes 1k,100k --compare bench_results/<previous>.json
+#
+# Catalogues are generated once into bench_data/ and reused. Each size runs in a
+# fresh Python process with DASHBOARD_DATA pointing at it, so import-time work
+# and memory are measured per size. Results are written as JSON to
+# bench_results/; --compare prints each timing against a previous run.
+# Needs nothing beyond the dashboard's own dependencies and no network.
+
+SIZES = {"1k": 1000, "100k": 100000, "1m": 1000000, "10m": 10000000}
+TEMPLATE = "cleaned_data.csv"
+DATA_DIR = "bench_data"
+RESULTS_DIR = "bench_results"
+CHUNK_ROWS = 1000000
+REPEAT = 5
+
+# Synthetic models per row: the real catalogue lists each model ~3 times (colour/storage variants)
+ROWS_PER_MODEL = 3
+
+# Columns drawn independently per row from the real catalogue
+SAMPLED_COLUMNS = [
+    "colour", "ratings", "rating_count", "reviews", "memory", "storage", "processor", "rear_camera",
+    "front_camera", "display_size", "battery_capacity", "battery_type",
+]
+
+
+def write_catalogue(path, rows, template=TEMPLATE, seed=0):
+    # Values are drawn from the real catalogue's columns, so cardinalities and
+    # text lengths stay realistic; models and prices are synthetic
+    real = pd.read_csv(template)
+    rng = np.random.default_rng(seed)
+    brands = real["brand"].to_numpy()
+    model_count = max(rows // ROWS_PER_MODEL, 1)
+    model_brands = brands[rng.integers(0, len(brands), model_count)]
+    model_names = pd.Series(model_brands) + " SYN " + pd.Series(np.arange(model_count)).astype(str)
+    base_prices = np.exp(rng.normal(9.8, 0.7, model_count)).round(-2)
+    tmp = path + ".tmp"
+    for start in range(0, rows, CHUNK_ROWS):
+        size = min(CHUNK_ROWS, rows - start)
+        models = rng.integers(0, model_count, size)
+        original = base_prices[models]
+        chunk = pd.DataFrame({
+            "Column1": np.arange(start, start + size),
+            "brand": model_brands[models],
+            "model": model_names.to_numpy()[models],
+        })
+        chunk["original_price"] = original
+        chunk["discounted_price"] = (original * rng.uniform(0.6, 1.0, size)).round()
+        for column in SAMPLED_COLUMNS:
+            chunk[column] = real[column].to_numpy()[rng.integers(0, len(real), size)]
+        chunk["Column2"] = np.nan
+        chunk[real.columns].to_csv(tmp, mode="w" if start == 0 else "a", header=start == 0, index=False)
+    os.replace(tmp, path)
+
+
+def timed(fn, repeat=1):
+    # (last result, median seconds)
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - started)
+    return result, statistics.median(times)
+
+
+def callback_body(outputs, inputs, state=()):
+    # Request body of /_dash-update-component, as dash-renderer sends it
+    specs = [{"id": id, "property": prop} for id, prop in outputs]
+    if len(outputs) == 1:
+        output = "%s.%s" % outputs[0]
+        specs = specs[0]
+    else:
+        output = ".." + "...".join("%s.%s" % pair for pair in outputs) + ".."
+    return {
+        "output": output,
+        "outputs": specs,
+        "inputs": [{"id": id, "property": prop, "value": value} for id, prop, value in inputs],
+        "state": [{"id": id, "property": prop, "value": value} for id, prop, value in state],
+        "changedPropIds": ["%s.%s" % inputs[0][:2]],
+    }
+
+
+def time_callback(client, body):
+    response, seconds = timed(lambda: client.post("/_dash-update-component", json=body), REPEAT)
+    if response.status_code != 200:
+        raise RuntimeError("callback %s failed with %d" % (body["output"], response.status_code))
+    return {"ms": round(seconds * 1000, 2), "bytes": len(response.data)}
+
+
+def time_figure(client, url):
+    # A graph's figure GET: first request, repeats (compressed LRU), and 304 revalidation
+    gzip = {"Accept-Encoding": "gzip"}
+    response, cold = timed(lambda: client.get(url, headers=gzip))
+    if response.status_code != 200:
+        raise RuntimeError("%s failed with %d" % (url, response.status_code))
+    _, warm = timed(lambda: client.get(url, headers=gzip), REPEAT)
+    etag = dict(gzip, **{"If-None-Match": response.headers["ETag"]})
+    revalidated, revalidate = timed(lambda: client.get(url, headers=etag), REPEAT)
+    return {
+        "cold_ms": round(cold * 1000, 2),
+        "ms": round(warm * 1000, 2),
+        "revalidate_ms": round(revalidate * 1000, 2),
+        "bytes": len(client.get(url).data),
+        "gzip_bytes": len(response.data),
+        "not_modified": int(revalidated.status_code == 304),
+    }
+
+
+def query_urls(brands, count):
+    # A mix of /api queries: repeats of a few (LRU hits) and distinct filter states (misses)
+    aggregates = ["brand_counts", "rating_pivot", "mean_price_by_battery", "price_box", "rating_histogram"]
+    urls = []
+    for i in range(count):
+        if i % 2:
+            urls.append("/api/aggregates/%s" % aggregates[i % len(aggregates)])
+            continue
+        args = [("brand", brands[i % len(brands)]), ("price", "0,%d" % (10000 * (1 + i % 7))), ("rating", 3 + i % 20 / 10)]
+        if i % 4 == 0:
+            urls.append("/api/phones?" + urlencode(args + [("page", i % 3)]))
+        else:
+            urls.append("/api/aggregates/%s?%s" % (aggregates[i % len(aggregates)], urlencode(args)))
+    return urls
+
+
+def load_test(server, urls, clients=8):
+    # The urls split across `clients` concurrent threads; latency percentiles in ms
+    def run(chunk):
+        client = server.test_client()
+        latencies = []
+        for url in chunk:
+            started = time.perf_counter()
+            response = client.get(url)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                raise RuntimeError("%s failed with %d" % (url, response.status_code))
+        return latencies
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(clients) as pool:
+        latencies = np.concatenate(list(pool.map(run, [urls[i::clients] for i in range(clients)])))
+    seconds = time.perf_counter() - started
+    p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+    return {"requests": len(urls), "clients": clients, "p50_ms": round(float(p50), 2), "p99_ms": round(float(p99), 2),
+            "requests_per_sec": round(len(urls) / seconds, 1)}
+
+
+def measure(csv_path):
+    # Runs inside the per-size child process
+    from datastore import load_catalogue, store_path
+    from ingest import ingest
+    from rollup import Rollup, load_rollup
+
+    results = {}
+    shutil.rmtree(store_path(csv_path), ignore_errors=True)
+
+    import dashboard
+    columns = dashboard.DASHBOARD_COLUMNS
+    # First pass through the dashboard's loader, before any columnar store exists
+    data, results["load_csv_s"] = timed(lambda: load_catalogue(csv_path, columns))
+    results["rows"] = len(data)
+    results["frame_bytes"] = int(data.memory_usage(deep=True).sum())
+    del data
+
+    stats, results["ingest_s"] = timed(lambda: ingest(csv_path))
+    results["ingest_rows_per_sec"] = stats["rows_per_sec"]
+    data, results["load_store_s"] = timed(lambda: load_catalogue(csv_path, columns))
+    _, results["load_rollup_s"] = timed(lambda: load_rollup(csv_path))
+
+    # Aggregation: the rollup cube from scratch, and one cross-filtered selection
+    rollup, results["build_rollup_s"] = timed(lambda: Rollup.build(data))
+    _, results["snapshot_s"] = timed(lambda: dashboard.load_snapshot(csv_path))
+    snapshot = dashboard.live.current()
+    brands = snapshot.cross_filter.brands[:3]
+    price_range = [10000, 40000]
+    _, results["cross_filter_s"] = timed(lambda: snapshot.cross_filter.select(brands, tuple(price_range), 4.0), REPEAT)
+
+    # Filtered box statistics: exact (one pass per brand) and from the ingest-time sketches, whose
+    # worst errors against the exact statistics are recorded too
+    from sketches import check
+    _, results["price_box_exact_s"] = timed(lambda: snapshot.cross_filter.price_box(brands, (10000, 30000)))
+    sketches = load_rollup(csv_path).sketches
+    _, results["price_box_sketch_s"] = timed(lambda: sketches.price_box(brands, (10000, 30000)), REPEAT)
+    report, _ = check(csv_path)
+    results["sketch_rank_error"] = float(report["rank_error"].max())
+    results["sketch_distinct_error"] = float(report["distinct_error"].max())
+
+    from figures import build_graph_figures
+    figures, results["build_figures_s"] = timed(lambda: build_graph_figures(snapshot.data, snapshot.rollup))
+    filters = dashboard.filter_args(snapshot, brands, price_range, 4.0)
+    _, results["build_filtered_figures_s"] = timed(lambda: dashboard.build_filtered_figures(snapshot, *filters))
+    import plotly.io as pio
+    payloads, results["figures_to_json_s"] = timed(
+        lambda: {name: pio.to_json(fig, validate=False) for name, fig in figures.items()})
+    results["figure_json_bytes"] = {name: len(payload) for name, payload in payloads.items()}
+
+    # Round trips through the Flask test client, request parsing and JSON encoding included
+    client = dashboard.app.server.test_client()
+    models = snapshot.all_models
+    results["callbacks"] = {
+        "display_page_graph_analysis": time_callback(client, callback_body(
+            [("page-content", "children")], [("url", "pathname", "/graph_analysis")])),
+        "display_page_compare_phones": time_callback(client, callback_body(
+            [("page-content", "children")], [("url", "pathname", "/compare_phones")])),
+        "search_phone1": time_callback(client, callback_body(
+            [("phone1-dropdown", "options")], [("phone1-dropdown", "search_value", models[0][:4])],
+            [("phone1-dropdown", "value", None)])),
+        "update_comparison": time_callback(client, callback_body(
+            [("comparison-table", "columns"), ("comparison-table", "data"),
+             ("comparison-table-wrapper", "hidden"), ("comparison-hint", "hidden")],
+            [("phone1-dropdown", "value", models[0]), ("phone2-dropdown", "value", models[-1])])),
+    }
+    # Each graph fetches its own figure; one after another here, concurrently in a browser
+    query = urlencode([("brand", brand) for brand in brands] + [("price", "%d,%d" % tuple(price_range)), ("rating", 4.0)])
+    results["figures"] = {}
+    for name in dashboard.GRAPH_NAMES:
+        results["figures"][name] = time_figure(client, "/_figure/%s.json" % name)
+        results["figures"][name + "_filtered"] = time_figure(client, "/_figure/%s.json?%s" % (name, query))
+    # Query API under concurrent load (target in query_api.py), then one batch of the same queries
+    urls = query_urls(snapshot.cross_filter.brands, 800)
+    results["query_api"] = load_test(dashboard.app.server, urls)
+    batch = {"queries": urls[:50:3]}
+    _, batch_s = timed(lambda: client.post("/api/batch", json=batch), REPEAT)
+    results["query_api"]["batch_ms"] = round(batch_s * 1000, 2)
+    results["peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    return {key: round(value, 4) if isinstance(value, float) else value for key, value in results.items()}
+
+
+# Run as `python -c` in a fresh process, so nothing but the dashboard is imported:
+# seconds from interpreter start until the landing page answers, then until a data page does
+STARTUP_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+import dashboard
+results = {"import_s": time.perf_counter() - started}
+client = dashboard.app.server.test_client()
+client.get("/")
+assert client.post("/_dash-update-component", json=json.loads(sys.argv[1])).status_code == 200
+results["landing_s"] = time.perf_counter() - started
+assert client.post("/_dash-update-component", json=json.loads(sys.argv[2])).status_code == 200
+results["graph_analysis_s"] = time.perf_counter() - started
+print(json.dumps({key: round(value, 4) for key, value in results.items()}))
+"""
+
+
+def run_size(label, rows, regenerate=False):
+    os.makedirs(DATA_DIR, exist_ok=True)
+    csv_path = os.path.join(DATA_DIR, "catalogue_%s.csv" % label)
+    generate_s = None
+    if regenerate or not os.path.exists(csv_path):
+        _, generate_s = timed(lambda: write_catalogue(csv_path, rows))
+    with tempfile.NamedTemporaryFile(suffix=".json") as output:
+        env = dict(os.environ, DASHBOARD_DATA=csv_path, DATA_RELOAD_SECONDS="3600")
+        started = time.perf_counter()
+        subprocess.run([sys.executable, __file__, "--child", csv_path, output.name], env=env, check=True,
+                       stdout=subprocess.DEVNULL)
+        with open(output.name) as f:
+            results = json.load(f)
+    results["process_s"] = round(time.perf_counter() - started, 4)
+    results["generate_s"] = round(generate_s, 4) if generate_s is not None else None
+    # Cold process start to first responses, with the columnar store in place,
+    # loading the dataset up front (eager) or in the background (DASHBOARD_LAZY=1)
+    pages = [json.dumps(callback_body([("page-content", "children")], [("url", "pathname", path)]))
+             for path in ["/", "/graph_analysis"]]
+    results["startup"] = {}
+    for mode, lazy in [("eager", "0"), ("lazy", "1")]:
+        child_env = dict(env, DASHBOARD_LAZY=lazy, DASHBOARD_DATA=os.path.abspath(csv_path))
+        child = subprocess.run([sys.executable, "-c", STARTUP_SCRIPT] + pages, env=child_env, check=True,
+                               cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True)
+        results["startup"][mode] = json.loads(child.stdout.strip().splitlines()[-1])
+    return results
+
+
+def flatten(results, prefix=""):
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, prefix + key + "."))
+        elif isinstance(value, (int, float)):
+            flat[prefix + key] = value
+    return flat
+
+
+def compare(current, baseline):
+    # Every shared numeric metric, with the current/baseline ratio (> 1 means slower or bigger)
+    for size, results in current["sizes"].items():
+        if size not in baseline["sizes"]:
+            continue
+        before = flatten(baseline["sizes"][size])
+        print("\n%s rows" % size)
+        for key, value in flatten(results).items():
+            if before.get(key):
+                print("  %-45s %12.4f -> %12.4f  x%.2f" % (key, before[key], value, value / before[key]))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == "--child":
+        results = measure(sys.argv[2])
+        with open(sys.argv[3], "w") as f:
+            json.dump(results, f)
+        sys.exit(0)
+
+    parser = argparse.ArgumentParser(description="Benchmark the dashboards on synthetic catalogues")
+    parser.add_argument("--sizes", default=",".join(SIZES), help="comma-separated subset of %s" % ", ".join(SIZES))
+    parser.add_argument("--output", default=None, help="results file (default: bench_results/<timestamp>.json)")
+    parser.add_argument("--compare", default=None, help="previous results file to compare against")
+    parser.add_argument("--regenerate", action="store_true", help="rewrite the synthetic CSVs")
+    args = parser.parse_args()
+
+    report = {
+        "started": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "versions": {name: __import__(name).__version__ for name in ["pandas", "numpy", "dash", "plotly"]},
+        "sizes": {},
+    }
+    for label in args.sizes.lower().split(","):
+        print("benchmarking %s rows..." % label, flush=True)
+        report["sizes"][label] = run_size(label, SIZES[label], args.regenerate)
+        print(json.dumps(report["sizes"][label], indent=2), flush=True)
+
+    output = args.output or os.path.join(RESULTS_DIR, time.strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print("results written to %s" % output)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
@@ -0,0 +1,38 @@
+import pandas as pd
+
+from schema import display_value
+
+
+class CatalogueIndex:
+    # Hash index from model name to row position, built once at load.
+    # A model listed several times (colour/storage variants) resolves to its
+    # first listing, the same row the old data[data['model'] == m].iloc[0] gave.
+    def __init__(self, data, key="model"):
+        self.data = data
+        self.key = key
+        first = ~data[key].duplicated(keep="first")
+        self.positions = dict(zip(data.loc[first, key], first.to_numpy().nonzero()[0]))
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __contains__(self, model):
+        return model in self.positions
+
+    def models(self):
+        return list(self.positions)
+
+    def row(self, model):
+        # Raises KeyError for unknown models, like a dict lookup
+        return self.data.iloc[self.positions[model]]
+
+    def record(self, model):
+        # The model's row as a dict of plain display values
+        row = self.row(model)
+        return {column: display_value(value) for column, value in row.items()}
+
+    def rows(self, models):
+        # Rows for any number of models, in the order given; unknown or empty picks are skipped
+        picked = [model for model in models if model in self.positions]
+        frame = self.data.iloc[[self.positions[model] for model in picked]]
+        return frame.set_axis(pd.Index(picked, name=self.key))
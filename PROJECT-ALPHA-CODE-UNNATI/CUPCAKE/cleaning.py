@@ -0,0 +1,78 @@
+import functools
+import re
+
+import numpy as np
+import pandas as pd
+
+from specs import PARSE_CACHE_SIZE, add_specs, parse_table
+
+# Cleaning rules for raw Flipkart smartphone exports, applied chunk by chunk
+# by ingest.py and to whole frames by datastore.load_catalogue(). These are
+# the steps that produced cleaned_data.csv in DV2.ipynb / at1.ipynb, plus the
+# typed spec columns of specs.py.
+
+# Index columns left behind by spreadsheet/pandas round trips (Column1, Unnamed: 0, ...)
+JUNK_COLUMN = re.compile(r"^(column\d+|unnamed:_?\d+|index)$")
+
+PRICE_COLUMNS = ["original_price", "discounted_price"]
+NUMBER_COLUMNS = ["ratings", "rating_count", "reviews", "display_size", "battery_capacity"]
+SIZE_COLUMNS = ["memory", "storage"]
+TEXT_COLUMNS = ["brand", "model", "colour", "processor", "rear_camera", "front_camera", "battery_type"]
+
+_SIZE_UNITS = {"MB": 1 / 1024, "GB": 1, "TB": 1024}
+_SIZE = re.compile(r"([\d.]+)\s*(MB|GB|TB)?")
+
+
+def normalize_columns(data):
+    # snake_case names, junk index columns dropped
+    data.columns = data.columns.str.strip().str.lower().str.replace(r"[\s\-]+", "_", regex=True)
+    return data.drop(columns=[column for column in data.columns if JUNK_COLUMN.match(column)])
+
+
+def parse_number(values):
+    # "₹12,999" / "4.3" / "1,02,345 Ratings" -> float; the first number only,
+    # so "4.3 out of 5" is 4.3 and "16.51 cm (6.5 inch)" is 16.51
+    if pd.api.types.is_numeric_dtype(values.dtype):
+        return values.astype("float64")
+    number = values.astype(str).str.extract(r"(\d[\d,]*(?:\.\d+)?)", expand=False)
+    return pd.to_numeric(number.str.replace(",", "", regex=False), errors="coerce")
+
+
+@functools.lru_cache(maxsize=PARSE_CACHE_SIZE)
+def size_gb(text):
+    match = _SIZE.search(text.upper())
+    if match is None:
+        return np.nan
+    try:
+        return float(match.group(1)) * _SIZE_UNITS.get(match.group(2), 1)
+    except ValueError:
+        return np.nan
+
+
+def parse_size_gb(values):
+    # "4 GB" / "512 MB" / "1 TB" / plain numbers (already GB) -> GB as float
+    if pd.api.types.is_numeric_dtype(values.dtype):
+        return values.astype("float64")
+    return pd.Series(parse_table(values, size_gb), index=values.index)
+
+
+def tidy_text(values):
+    # Trim and collapse runs of whitespace. Values repeat heavily, so each
+    # distinct string is tidied once; missing values stay missing
+    codes, uniques = pd.factorize(values)
+    tidied = np.array([" ".join(str(value).split()) or None for value in uniques] + [None], dtype=object)
+    return pd.Series(tidied[codes], index=values.index, dtype=object)
+
+
+def clean(data):
+    data = normalize_columns(data)
+    for column in PRICE_COLUMNS + NUMBER_COLUMNS:
+        if column in data.columns:
+            data[column] = parse_number(data[column])
+    for column in SIZE_COLUMNS:
+        if column in data.columns:
+            data[column] = parse_size_gb(data[column])
+    for column in TEXT_COLUMNS:
+        if column in data.columns:
+            data[column] = tidy_text(data[column])
+    return add_specs(data)
@@ -0,0 +1,72 @@
+import threading
+from collections import OrderedDict
+
+# Rows of the dashboard's phone comparison table: (label, column)
+COMPARE_FEATURES = [
+    ("Brand", "brand"),
+    ("Model", "model"),
+    ("Colour", "colour"),
+    ("Original Price (INR)", "original_price"),
+    ("Discounted Price (INR)", "discounted_price"),
+    ("Ratings", "ratings"),
+    ("RAM (Memory)", "memory"),
+    ("Storage", "storage"),
+    ("Processor", "processor"),
+    ("Rear Camera", "rear_camera"),
+    ("Front Camera", "front_camera"),
+    ("Display Size (cm)", "display_size"),
+    ("Battery Capacity (mAh)", "battery_capacity"),
+    ("Battery Type", "battery_type"),
+]
+
+
+class ComparisonTable:
+    # DataTable payloads (columns + data) for the compare page of one catalogue version.
+    # Each model's spec values are looked up once and kept; whole tables are kept
+    # per (phone1, phone2) pair in a small LRU, so a repeated pick is a dict lookup.
+    # Shared by the Dash callback threads; lookups are built outside the lock.
+    def __init__(self, catalogue, cache_size=256):
+        self.catalogue = catalogue
+        self.cache_size = cache_size
+        self._lock = threading.Lock()
+        self._specs = {}
+        self._cache = OrderedDict()
+
+    def specs(self, model):
+        # The model's values in COMPARE_FEATURES order
+        with self._lock:
+            values = self._specs.get(model)
+        if values is None:
+            record = self.catalogue.record(model)
+            values = tuple(record.get(column) for _, column in COMPARE_FEATURES)
+            with self._lock:
+                values = self._specs.setdefault(model, values)
+        return values
+
+    def _build(self, phone1, phone2):
+        columns = [
+            {"name": "Feature", "id": "feature"},
+            {"name": phone1, "id": "phone1"},
+            {"name": phone2, "id": "phone2"},
+        ]
+        data = [
+            {"feature": label, "phone1": value1, "phone2": value2}
+            for (label, _), value1, value2 in zip(COMPARE_FEATURES, self.specs(phone1), self.specs(phone2))
+        ]
+        return columns, data
+
+    def table(self, phone1, phone2):
+        # Raises KeyError for models missing from the catalogue
+        key = (phone1, phone2)
+        with self._lock:
+            value = self._cache.get(key)
+            if value is not None:
+                self._cache.move_to_end(key)
+                return value
+        value = self._build(phone1, phone2)
+        with self._lock:
+            self._cache[key] = value
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return value
@@ -0,0 +1,153 @@
+import gzip
+import os
+import threading
+from collections import OrderedDict
+
+from flask import Response, request
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+# HTTP compression and revalidation for the Dash server.
+#
+# Compressor.install(server) gzips (or, with the brotli package installed and
+# a browser that accepts it, brotli-compresses) every text response: callback
+# JSON, the layout, the JS bundles, assets/*.css. Responses that carry an ETag
+# (assets, component bundles, the versioned figure JSON served by
+# dashboard.py) have the same bytes on every request, so:
+#
+#   - their compressed form is kept in an LRU keyed by (ETag, encoding) and
+#     compressed once, at a higher level than per-request responses;
+#   - a request whose If-None-Match matches gets a bodyless 304;
+#   - without a Cache-Control of their own they get "no-cache", so browsers
+#     keep the copy and revalidate it on the next visit instead of re-downloading.
+#
+# serve(etag, payload) answers a GET for such a payload without computing it
+# when the browser already has it; precompress() fills the LRU ahead of the
+# first request (dashboard.py does so for each new dataset version).
+
+MIN_SIZE = 1024
+COMPRESSIBLE = {
+    "application/json", "application/javascript", "text/javascript", "text/css", "text/html", "text/plain",
+    "image/svg+xml",
+}
+# (per-request level, cached level)
+GZIP_LEVELS = (6, 9)
+BROTLI_QUALITY = (4, 9)
+CACHE_BYTES = int(float(os.environ.get("COMPRESSED_CACHE_MB", 64)) * 2 ** 20)
+ENCODINGS = ["br", "gzip"] if brotli is not None else ["gzip"]
+
+
+def compress(data, encoding, cached=False):
+    if encoding == "br":
+        return brotli.compress(data, quality=BROTLI_QUALITY[cached])
+    return gzip.compress(data, compresslevel=GZIP_LEVELS[cached], mtime=0)
+
+
+def accepted_encoding():
+    # Best of ENCODINGS by the request's Accept-Encoding q-values; None for identity
+    return request.accept_encodings.best_match(ENCODINGS)
+
+
+class Compressor:
+    def __init__(self, max_bytes=CACHE_BYTES, min_size=MIN_SIZE):
+        self.max_bytes = max_bytes
+        self.min_size = min_size
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.size = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def cached(self, etag, encoding, data):
+        # data: bytes, or a callable returning them (only called on a miss)
+        key = (etag, encoding)
+        with self._lock:
+            body = self._entries.get(key)
+            if body is not None:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return body
+            self.misses += 1
+        raw = data() if callable(data) else data
+        body = raw if encoding is None else compress(raw, encoding, cached=True)
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = body
+                self.size += len(body)
+            while self.size > self.max_bytes and len(self._entries) > 1:
+                self.size -= len(self._entries.popitem(last=False)[1])
+        return body
+
+    def precompress(self, etag, payload):
+        # Every encoding of payload (bytes or callable), computed once
+        raw = payload() if callable(payload) else payload
+        for encoding in [None] + ENCODINGS:
+            self.cached(etag, encoding, raw)
+
+    def serve(self, etag, payload, mimetype="application/json"):
+        # GET response for a payload that only changes with its ETag; payload()
+        # only runs when neither the browser nor the LRU has it
+        if request.if_none_match.contains_weak(etag):
+            self.not_modified += 1
+            response = Response(status=304)
+        else:
+            encoding = accepted_encoding()
+            response = Response(self.cached(etag, encoding, payload), mimetype=mimetype)
+            if encoding is not None:
+                response.headers["Content-Encoding"] = encoding
+        # Weak: the compressed and identity bodies share one tag
+        response.set_etag(etag, weak=True)
+        response.vary.add("Accept-Encoding")
+        response.cache_control.no_cache = True
+        return response
+
+    def install(self, server):
+        server.after_request(self.after_request)
+        return self
+
+    def after_request(self, response):
+        if request.method not in ("GET", "POST") or "Content-Encoding" in response.headers:
+            return response
+        etag = response.get_etag()[0]
+        if etag is not None:
+            if not response.cache_control.max_age and not response.cache_control.no_store:
+                response.cache_control.no_cache = True
+            if response.status_code == 200 and request.method == "GET":
+                response = response.make_conditional(request)
+                if response.status_code == 304:
+                    self.not_modified += 1
+        if response.status_code != 200 or response.mimetype not in COMPRESSIBLE:
+            return response
+        if response.is_streamed and not response.direct_passthrough:
+            return response
+        response.vary.add("Accept-Encoding")
+        encoding = accepted_encoding()
+        if encoding is None:
+            return response
+        # Static files arrive as a file wrapper; read them like any other body
+        response.direct_passthrough = False
+        data = response.get_data()
+        if len(data) < self.min_size:
+            return response
+        if etag is not None:
+            body = self.cached(etag, encoding, data)
+            response.set_etag(etag, weak=True)
+        else:
+            body = compress(data, encoding)
+        response.set_data(body)
+        response.headers["Content-Encoding"] = encoding
+        return response
+
+    def stats(self):
+        return {
+            "encodings": ENCODINGS,
+            "entries": len(self._entries),
+            "bytes": self.size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified,
+        }
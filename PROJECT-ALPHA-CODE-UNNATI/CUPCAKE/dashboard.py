@@ -1,97 +1,164 @@
+import time
+
+STARTED = time.time()
+
+import hashlib
+import json
+import os
+
 import dash
-from dash import dcc, html
-from dash.dependencies import Input, Output
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
+from dash import dash_table, dcc, html
+from dash.dependencies import Input, Output, State
+import plotly.io as pio
+from flask import abort, jsonify, request
+
+from compression import Compressor
+from figure_cache import FigureCache
+from jobs import FigureJobs
+from live_data import LiveDataset
+import profiling
+from query_api import QueryAPI
+from shared_cache import SharedCache
+
+# pandas, plotly.express and the catalogue modules built on them (catalogue,
+# comparison, datastore, figures, filters, price_history, rollup, similar) are
+# imported where they are first used, so importing this module costs little
+# more than Dash itself. With DASHBOARD_LAZY=1 the dataset is also loaded,
+# indexed and its figures built on a background thread: the landing page is
+# served at once and only pages that need the data wait for it.
+DASHBOARD_LAZY = os.environ.get("DASHBOARD_LAZY") == "1"
+
+# APPROX_STATS=1: filtered box plots from the ingest-time price sketches (see sketches.py)
+APPROX_STATS = os.environ.get("APPROX_STATS") == "1"
 
 # Load your cleaned dataset
-data = pd.read_csv("cleaned_data.csv")
-
-# Get unique phone models for dropdown options
-all_models = sorted(data['model'].unique())
+# (memory-mapped from cleaned_data.columns/ once `python ingest.py` has been run)
+# DASHBOARD_DATA points the dashboard at another catalogue (bench.py uses it for synthetic ones)
+DATA_PATH = os.environ.get("DASHBOARD_DATA", "cleaned_data.csv")
+DASHBOARD_COLUMNS = [
+    "brand", "model", "colour", "original_price", "discounted_price", "ratings", "memory", "storage",
+    "processor", "rear_camera", "front_camera", "display_size", "battery_capacity", "battery_type",
+    "rear_mp_primary", "front_mp",
+]
+
+def load_snapshot(path):
+    # Everything derived from one version of the dataset; see live_data.LiveDataset
+    from catalogue import CatalogueIndex
+    from comparison import ComparisonTable
+    from datastore import load_catalogue
+    from filters import CrossFilter
+    from model_search import ModelSearchIndex
+    from rollup import PRICE_STEP, load_rollup
+    from similar import SimilarPhones
+
+    data = load_catalogue(path, DASHBOARD_COLUMNS)
+    rollup = load_rollup(path)
+
+    # Model -> row index used by the comparison callback
+    catalogue = CatalogueIndex(data)
+
+    # Get unique phone models for dropdown options
+    all_models = sorted(catalogue.models())
+
+    return {
+        "data": data,
+        "catalogue": catalogue,
+        "all_models": all_models,
+        # Typeahead index: dropdowns receive a page of matches per keystroke instead of every model
+        "model_search": ModelSearchIndex(all_models),
+        # Rollup cube and filter indexes behind the graph analysis filters
+        "rollup": rollup,
+        "cross_filter": CrossFilter(data, sketches=rollup.sketches if APPROX_STATS else None),
+        # Pre-shaped comparison table payloads for the compare page
+        "comparison": ComparisonTable(catalogue),
+        # Nearest-neighbour index behind "phones like this"
+        "similar": SimilarPhones(catalogue),
+        "price_max": int(data["discounted_price"].max() // PRICE_STEP + 1) * PRICE_STEP,
+    }
+
+# Figure JSON on disk, shared by all worker processes (see shared_cache.py)
+shared_cache = SharedCache()
+
+# Figures are built once per version of the dataset file and reused across visits
+figure_cache = FigureCache(shared=shared_cache)
+
+# The seven charts of /graph_analysis; figures.FIGURE_BUILDERS has one builder per name
+GRAPH_NAMES = ["bar_chart", "heatmap", "scatter_plot", "histogram", "line_chart", "pie_chart", "box_plot"]
+
+def figure_builder(snapshot):
+    # The unfiltered figures of a snapshot, for FigureCache
+    from figures import build_graph_figures
+    return lambda: build_graph_figures(snapshot.data, snapshot.rollup)
+
+# gzip/brotli for every response, plus ETag revalidation and precompressed
+# bodies for the figure JSON served at /_figure/<name>.json (see compression.py)
+compressor = Compressor()
+
+def figure_etag(fingerprint, name, filters=(None, None, None)):
+    # A figure's JSON only changes with the dataset version and the filters
+    return hashlib.sha1(repr((fingerprint, name, filters)).encode()).hexdigest()[:20]
+
+def warm_snapshot(snapshot):
+    # Build the unfiltered figures and compress them before the version goes live
+    payloads = figure_cache.warm(snapshot.fingerprint, figure_builder(snapshot))
+    for name in GRAPH_NAMES:
+        compressor.precompress(figure_etag(snapshot.fingerprint, name), payloads[name].encode())
+
+# The current dataset version. A background thread watches cleaned_data.csv and
+# swaps in a fully built new snapshot (indexes, rollup, figures) when it changes;
+# with DASHBOARD_LAZY=1 it also loads the first one.
+live = LiveDataset(DATA_PATH, load_snapshot, warm=warm_snapshot, lazy=DASHBOARD_LAZY,
+                   interval=float(os.environ.get("DATA_RELOAD_SECONDS", 10))).watch()
+
+# Coalesced, pool-bounded figure builds for /_figure/<name>.json
+figure_jobs = FigureJobs()
+
+def filter_args(snapshot, brands, price_range, min_rating):
+    # Controls left at their full range count as "no filter"
+    if price_range and list(price_range) == [0, snapshot.price_max]:
+        price_range = None
+    return brands or None, tuple(price_range) if price_range else None, min_rating or None
+
+def filtered_inputs(snapshot, brands, price_range, min_rating):
+    # Rows and rollup every filtered figure is built from
+    with profiling.stage("all", "filter"):
+        rows = snapshot.cross_filter.select(brands, price_range, min_rating)
+        price_box = snapshot.cross_filter.price_box(brands, price_range, min_rating)
+        rollup = snapshot.rollup.filtered(brands, price_range, min_rating, price_box)
+    return rows, rollup
+
+def build_filtered_figures(snapshot, brands, price_range, min_rating):
+    from figures import build_graph_figures
+    return build_graph_figures(*filtered_inputs(snapshot, brands, price_range, min_rating))
+
+def create_filter_controls(snapshot):
+    from rollup import PRICE_STEP
+    label_style = {"color": "#ddd", "font-family": "Verdana, sans-serif", "font-size": "1.1em"}
+    return html.Div([
+        html.Label("Brands", style=label_style),
+        dcc.Dropdown(
+            id="brand-filter",
+            options=[{"label": brand, "value": brand} for brand in snapshot.cross_filter.brands],
+            multi=True,
+            placeholder="All brands",
+            style={"color": "#333", "margin-bottom": "20px"}
+        ),
+        html.Label("Price range (INR)", style=label_style),
+        dcc.RangeSlider(
+            id="price-filter", min=0, max=snapshot.price_max, step=PRICE_STEP, value=[0, snapshot.price_max],
+            marks=None, tooltip={"placement": "bottom", "always_visible": True}
+        ),
+        html.Label("Minimum rating", style=label_style),
+        dcc.Slider(
+            id="rating-filter", min=0, max=5, step=0.1, value=0,
+            marks={i: str(i) for i in range(6)}, tooltip={"placement": "bottom"}
+        ),
+    ], style={"margin-bottom": "50px", "background-color": "#222", "padding": "20px", "border-radius": "5px"})
 
 # --- Graph Analysis Dashboard Layout ---
+# Returns at once: every graph starts empty under a spinner and fetches its own figure
 def create_graph_analysis_layout():
-    # Bar Chart: Smartphone Brand Popularity
-    brand_counts = data["brand"].value_counts()
-    bar_chart = px.bar(
-        x=brand_counts.index,
-        y=brand_counts.values,
-        title="Smartphone Brand Popularity",
-        labels={"x": "Brand", "y": "Number of Smartphones"},
-        color_discrete_sequence=["#636EFA"]
-    )
-
-    # Heatmap: Ratings by Brand and Battery Capacity
-    pivot_table = data.pivot_table(index="brand", columns="battery_capacity", values="ratings", aggfunc="mean")
-
-    # Create Heatmap
-    heatmap = go.Figure(data=go.Heatmap(
-        z=pivot_table.values,
-        x=pivot_table.columns,
-        y=pivot_table.index,
-        colorscale="Viridis",  # Use a valid Plotly colorscale
-        colorbar_title="Ratings"
-    ))
-    heatmap.update_layout(
-        title="Ratings by Brand and Battery Capacity",
-        xaxis_title="Battery Capacity (mAh)",
-        yaxis_title="Brand"
-    )
-
-
-    # Scatter Plot: Ratings vs Price
-    scatter_plot = px.scatter(
-        data,
-        x="discounted_price",
-        y="ratings",
-        title="Ratings vs Price",
-        labels={"discounted_price": "Price (INR)", "ratings": "Ratings"},
-        color="ratings",
-        color_continuous_scale=px.colors.sequential.Plasma
-    )
-
-    # Histogram: Price Distribution
-    histogram = px.histogram(
-        data,
-        x="discounted_price",
-        nbins=20,
-        title="Price Distribution of Smartphones",
-        labels={"discounted_price": "Price (INR)"},
-        color_discrete_sequence=["#FF851B"]
-    )
-
-    # Line Plot: Battery Capacity vs Price
-    avg_prices = data.groupby("battery_capacity")["discounted_price"].mean()
-    line_chart = px.line(
-        x=avg_prices.index,
-        y=avg_prices.values,
-        title="Battery Capacity vs Price",
-        labels={"x": "Battery Capacity (mAh)", "y": "Average Price (INR)"},
-        markers=True
-    )
-    line_chart.update_traces(line_color="#0074D9") # Setting line color using update_traces
-
-    # Pie Chart: Battery Type Distribution
-    battery_counts = data["battery_type"].value_counts()
-    pie_chart = px.pie(
-        values=battery_counts.values,
-        names=battery_counts.index,
-        title="Battery Type Distribution",
-        color_discrete_sequence=px.colors.qualitative.Prism
-    )
-
-    # Box Plot: Price Distribution by Brand
-    box_plot = px.box(
-        data,
-        x="brand",
-        y="discounted_price",
-        title="Price Distribution by Brand",
-        labels={"brand": "Brand", "discounted_price": "Price (INR)"},
-        color="brand",
-        color_discrete_sequence=px.colors.qualitative.Dark2
-    )
+    snapshot = live.current()
 
     go_back_button = html.Div(style={"text-align": "center", "margin-top": "30px", "margin-bottom": "30px"})
     go_back_button.children = dcc.Link(html.Button("Go to Previous Page", style={"padding": "10px 20px", "font-size": "1.1em", "background-color": "#555", "color": "#fff", "border": "none", "border-radius": "5px", "cursor": "pointer"}), href='/')
@@ -105,52 +172,54 @@ def create_graph_analysis_layout():
 
         go_back_button, # Go to previous page button right after the title
 
+        create_filter_controls(snapshot), # Brand / price / rating filters applied to every chart below
+
         html.Div([
             html.H2("1. Smartphone Brand Popularity", style={"font-family": "Georgia, serif", "font-size": "2.4em", "color": "#ddd"}), # Increased font size
             html.P("This graph shows the number of smartphones listed for each brand. It helps identify the most dominant and least represented brands in the dataset. Use case: Useful for understanding brand presence or market dominance on Flipkart.", style={"color": "#bbb", "font-family": "Verdana, sans-serif", "font-size": "1.2em", "padding-left": "40px"}), # Added more padding-left
-            dcc.Graph(figure=bar_chart, className="dash-graph"),
+            dcc.Loading(dcc.Graph(id="graph-bar_chart", className="dash-graph"), type="circle"),
             html.P("Insights: Xiaomi leads in popularity with the highest number of listings. Realme is a strong second, followed by Samsung. A long tail of less represented brands indicates a fragmented market share.", style={"color": "#bbb", "font-family": "Verdana, sans-serif", "font-size": "1.2em", "padding-left": "40px"}) # Added more padding-left
         ], style={"margin-bottom": "50px", "background-color": "#222", "padding": "20px", "border-radius": "5px"}),
 
         html.Div([
             html.H2("2. Ratings by Brand and Battery Capacity", style={"font-family": "Georgia, serif", "font-size": "2.4em", "color": "#ddd"}), # Increased font size
             html.P("The heatmap highlights the average ratings across brands and battery capacity ranges. It helps identify patterns and preferences.", style={"color": "#bbb", "font-family": "Verdana, sans-serif", "font-size": "1.2em", "padding-left": "40px"}), # Added more padding-left
-            dcc.Graph(figure=heatmap, className="dash-graph"),
+            dcc.Loading(dcc.Graph(id="graph-heatmap", className="dash-graph"), type="circle"),
             html.P("Insights: Some brands show higher average ratings for specific battery capacity ranges. Rating patterns vary across battery capacities for many brands. There might be 'sweet spots' for battery capacity that correlate with higher ratings.", style={"color": "#bbb", "font-family": "Verdana, sans-serif", "font-size": "1.2em", "padding-left": "40px"}) # Added more padding-left
         ], style={"margin-bottom": "50px", "background-color": "#222", "padding": "20px", "border-radius": "5px"}),
 
         html.Div([
             html.H2("3. Ratings vs Price", style={"font-family": "Georgia, serif", "font-size": "2.4em", "color": "#ddd"}), # Increased font size
             html.P("This plot shows how smartphone ratings vary with price. Patterns may reveal whether higher-priced phones consistently receive better ratings or if ratings are independent of cost.", style={"color": "#bbb", "font-family": "Verdana, sans-serif", "font-size": "1.2em", "padding-left": "40px"}), # Added more padding-left
-            dcc.Graph(figure=scatter_plot, className="dash-graph"),
+            dcc.Loading(dcc.Graph(id="graph-scatter_plot", className="dash-graph"), type="circle"),
             html.P("Insights: Higher concentration of high ratings is observed in lower price ranges (below INR 40,000). Fewer high-rated phones appear at higher prices. Lower ratings are scattered across all price ranges, suggesting potential value for money in the budget segment.", style={"color": "#bbb", "font-family": "Verdana, sans-serif", "font-size": "1.2em", "padding-left": "40px"}) # Added more padding-left
         ], style={"margin-bottom": "50px", "background-color": "#222", "padding": "20px", "border-radius": "5px"}),
 
         html.Div([
             html.H2("4. Price Distribution", style={"font-family": "Georgia, serif", "font-size": "2.4em", "color": "#ddd"}), # Increased font size
             html.P("This graph displays the distribution of smartphone prices. Peaks in the histogram can reveal popular price ranges, while gaps indicate underrepresented price points.", style={"color": "#bbb", "font-family": "Verdana, sans-serif", "font-size": "1.2em", "padding-left": "40px"}), # Added more padding-left
-            dcc.Graph(figure=histogram, className="dash-graph"),
+            dcc.Loading(dcc.Graph(id="graph-histogram", className="dash-graph"), type="circle"),
             html.P("Insights: The majority of smartphones are priced below INR 20,000. The number of listings decreases as the price increases, indicating a competitive budget market and fewer options for premium buyers.", style={"color": "#bbb", "font-family": "Verdana, sans-serif", "font-size": "1.2em", "padding-left": "40px"}) # Added more padding-left
         ], style={"margin-bottom": "50px", "background-color": "#222", "padding": "20px", "border-radius": "5px"}),
 
         html.Div([
             html.H2("5. Battery Capacity vs Price", style={"font-family": "Georgia, serif", "font-size": "2.4em", "color": "#ddd"}), # Increased font size
             html.P("This graph demonstrates how battery capacity affects average smartphone prices. A positive correlation may suggest that higher battery capacities are valued more.", style={"color": "#bbb", "font-family": "Verdana, sans-serif", "font-size": "1.2em", "padding-left": "40px"}), # Added more padding-left
-            dcc.Graph(figure=line_chart, className="dash-graph"),
+            dcc.Loading(dcc.Graph(id="graph-line_chart", className="dash-graph"), type="circle"),
             html.P("Insights: The average price fluctuates with increasing battery capacity, with a peak around 3500-4000 mAh. Prices stabilize for higher capacities, and lower average prices are observed for very low and very high battery capacities.", style={"color": "#bbb", "font-family": "Verdana, sans-serif", "font-size": "1.2em", "padding-left": "40px"}) # Added more padding-left
         ], style={"margin-bottom": "50px", "background-color": "#222", "padding": "20px", "border-radius": "5px"}),
 
         html.Div([
             html.H2("6. Battery Type Distribution", style={"font-family": "Georgia, serif", "font-size": "2.4em", "color": "#ddd"}), # Increased font size
             html.P("This chart breaks down the share of each type of battery in the dataset. It shows the prevalence of different battery types (e.g., Li-ion, Li-polymer).", style={"color": "#bbb", "font-family": "Verdana, sans-serif", "font-size": "1.2em", "padding-left": "40px"}), # Added more padding-left
-            dcc.Graph(figure=pie_chart, className="dash-graph"),
+            dcc.Loading(dcc.Graph(id="graph-pie_chart", className="dash-graph"), type="circle"),
             html.P("Insights: Lithium Ion is the most common battery type (42.9%), followed by Lithium Polymer (19.7%). A significant portion (23.7%) has an unknown battery type.", style={"color": "#bbb", "font-family": "Verdana, sans-serif", "font-size": "1.2em", "padding-left": "40px"}) # Added more padding-left
         ], style={"margin-bottom": "50px", "background-color": "#222", "padding": "20px", "border-radius": "5px"}),
 
         html.Div([
             html.H2("7. Price Distribution by Brand", style={"font-family": "Georgia, serif", "font-size": "2.4em", "color": "#ddd"}), # Increased font size
             html.P("This graph visualizes the price range (minimum, median, maximum) for each brand. It highlights pricing strategies and reveals outliers (e.g., exceptionally expensive or cheap models).", style={"color": "#bbb", "font-family": "Verdana, sans-serif", "font-size": "1.2em", "padding-left": "40px"}), # Added more padding-left
-            dcc.Graph(figure=box_plot, className="dash-graph"),
+            dcc.Loading(dcc.Graph(id="graph-box_plot", className="dash-graph"), type="circle"),
             html.P("Insights: Most brands show significant price variation. Apple has the highest median price and range. Xiaomi and Realme offer a wide price range. Brands like iKALL and Micromax generally have lower prices.", style={"color": "#bbb", "font-family": "Verdana, sans-serif", "font-size": "1.2em", "padding-left": "40px"}) # Added more padding-left
         ], style={"margin-bottom": "50px", "background-color": "#222", "padding": "20px", "border-radius": "5px"}),
 
@@ -213,6 +282,26 @@ initial_layout = html.Div([
                 href='/compare_phones',
                 id="compare-phones-button"
             ),
+            html.Br(),
+            dcc.Link(
+                html.Button("Price History", style={
+                    "padding": "20px 45px",
+                    "font-size": "1.6em",
+                    "margin-top": "30px",
+                    "background-color": "#333",
+                    "color": "#fff",
+                    "border": "none",
+                    "border-radius": "12px",
+                    "cursor": "pointer",
+                    "font-family": "Lato, sans-serif",
+                    "box-shadow": "0 0 22px 2px #2ecc71, 0 0 8px 1px #2ecc71",
+                    "transition": "box-shadow 0.3s ease-in-out",
+                    "width": "350px",
+                    "text-align": "center"
+                }),
+                href='/price_history',
+                id="price-history-button"
+            ),
         ], style={"display": "flex", "flex-direction": "column", "align-items": "center"})
     ], style={
         "display": "flex",
@@ -226,40 +315,118 @@ initial_layout = html.Div([
 ], style={"min-height": "100vh", "background-color": "#111"})
 
 # --- Compare Phones Layout ---
-compare_phones_layout = html.Div([
-    html.Div([
-        html.H1("Compare 2 Mobile Phones", style={"text-align": "center", "color": "#eee", "font-family": "Montserrat, sans-serif", "margin-bottom": "30px"}),
-        html.P("This section will allow you to compare the specifications of two different mobile phones.", style={"color": "#ddd", "font-size": "1.2em", "font-family": "Montserrat, sans-serif", "text-align": "center", "margin-bottom": "40px"}),
+def create_compare_phones_layout():
+    model_search = live.current().model_search
+    return html.Div([
         html.Div([
-            html.Label("Select Phone 1:", style={'color': '#fff', 'font-size': '1.1em', 'margin-right': '10px'}),
-            dcc.Dropdown(
-                id='phone1-dropdown',
-                options=[{'label': model, 'value': model} for model in all_models],
-                style={'width': '300px', 'margin-bottom': '20px', 'color': '#333'}
-            ),
-            html.Label("Select Phone 2:", style={'color': '#fff', 'font-size': '1.1em', 'margin-right': '10px'}),
-            dcc.Dropdown(
-                id='phone2-dropdown',
-                options=[{'label': model, 'value': model} for model in all_models],
-                style={'width': '300px', 'margin-bottom': '20px', 'color': '#333'}
-            ),
-            html.Div(id='comparison-output') # Placeholder for comparison table
-        ], style={'display': 'flex', 'flex-direction': 'column', 'align-items': 'center'}),
-        dcc.Link(html.Button("Go to Previous Page", style={"padding": "10px 20px", "font-size": "1.1em", "background-color": "#555", "color": "#fff", "border": "none", "border-radius": "5px", "cursor": "pointer"}), href='/')
-    ], style={
-        "display": "flex",
-        "flex-direction": "column",
-        "align-items": "center",
-        "justify-content": "center",
-        "min-height": "80vh",
-        "background-color": "#222",
-        "padding": "40px"
-    })
-], style={"min-height": "100vh", "background-color": "#111"})
+            html.H1("Compare 2 Mobile Phones", style={"text-align": "center", "color": "#eee", "font-family": "Montserrat, sans-serif", "margin-bottom": "30px"}),
+            html.P("This section will allow you to compare the specifications of two different mobile phones.", style={"color": "#ddd", "font-size": "1.2em", "font-family": "Montserrat, sans-serif", "text-align": "center", "margin-bottom": "40px"}),
+            html.Div([
+                html.Label("Select Phone 1:", style={'color': '#fff', 'font-size': '1.1em', 'margin-right': '10px'}),
+                dcc.Dropdown(
+                    id='phone1-dropdown',
+                    options=model_search.options(None),
+                    style={'width': '300px', 'margin-bottom': '20px', 'color': '#333'}
+                ),
+                html.Label("Select Phone 2:", style={'color': '#fff', 'font-size': '1.1em', 'margin-right': '10px'}),
+                dcc.Dropdown(
+                    id='phone2-dropdown',
+                    options=model_search.options(None),
+                    style={'width': '300px', 'margin-bottom': '20px', 'color': '#333'}
+                ),
+                html.Div(id='comparison-output', children=[ # Placeholder for comparison table
+                    html.P("Please select two phones to compare.", id='comparison-hint', style={"color": "#ccc", "font-size": "1.2em", "text-align": "center"}),
+                    # Styled once here; the callback only sends the header names and 14 rows of values
+                    html.Div(id='comparison-table-wrapper', hidden=True, children=dash_table.DataTable(
+                        id='comparison-table',
+                        columns=[],
+                        data=[],
+                        style_table={'width': '100%'},
+                        style_cell={'border': '1px solid #555', 'padding': '8px', 'textAlign': 'center',
+                                    'backgroundColor': '#222', 'color': '#eee', 'fontFamily': 'Arial, sans-serif'},
+                        style_header={'fontWeight': 'bold'},
+                        style_cell_conditional=[{'if': {'column_id': 'feature'}, 'textAlign': 'left'}],
+                    )),
+                ]),
+                # Nearest models to phone 1 by price, ratings, memory, storage, battery, display and cameras
+                html.Div(id='similar-output', hidden=True, style={'margin-top': '30px', 'width': '100%'}, children=[
+                    html.H2("Phones like Phone 1", style={"color": "#ddd", "text-align": "center"}),
+                    dash_table.DataTable(
+                        id='similar-table',
+                        columns=[{'name': 'Model', 'id': 'model'}, {'name': 'Discounted Price (INR)', 'id': 'discounted_price'},
+                                 {'name': 'Ratings', 'id': 'ratings'}, {'name': 'RAM (Memory)', 'id': 'memory'},
+                                 {'name': 'Storage', 'id': 'storage'}],
+                        data=[],
+                        style_cell={'border': '1px solid #555', 'padding': '8px', 'textAlign': 'center',
+                                    'backgroundColor': '#222', 'color': '#eee', 'fontFamily': 'Arial, sans-serif'},
+                        style_header={'fontWeight': 'bold'},
+                        style_cell_conditional=[{'if': {'column_id': 'model'}, 'textAlign': 'left'}],
+                    ),
+                ]),
+            ], style={'display': 'flex', 'flex-direction': 'column', 'align-items': 'center'}),
+            dcc.Link(html.Button("Go to Previous Page", style={"padding": "10px 20px", "font-size": "1.1em", "background-color": "#555", "color": "#fff", "border": "none", "border-radius": "5px", "cursor": "pointer"}), href='/')
+        ], style={
+            "display": "flex",
+            "flex-direction": "column",
+            "align-items": "center",
+            "justify-content": "center",
+            "min-height": "80vh",
+            "background-color": "#222",
+            "padding": "40px"
+        })
+    ], style={"min-height": "100vh", "background-color": "#111"})
+
+# --- Price History Layout ---
+# Daily snapshots ingested with `python price_history.py ingest ...` (see price_history.py)
+_price_history = []
+
+def price_history():
+    if not _price_history:
+        from price_history import PriceHistory
+        _price_history.append(PriceHistory())
+    return _price_history[0]
+
+def create_price_history_layout():
+    history = price_history()
+    go_back = dcc.Link(html.Button("Go to Previous Page", style={"padding": "10px 20px", "font-size": "1.1em", "background-color": "#555", "color": "#fff", "border": "none", "border-radius": "5px", "cursor": "pointer"}), href='/')
+    if not history:
+        return html.Div([
+            html.P("No price history yet: ingest daily snapshots with `python price_history.py ingest <csv>`.", style={"color": "#ccc", "font-size": "1.2em", "text-align": "center"}),
+            go_back,
+        ], style={"display": "flex", "flex-direction": "column", "align-items": "center", "min-height": "100vh", "background-color": "#111", "padding": "40px"})
+    dates = history.store.dates()
+    label_style = {'color': '#fff', 'font-size': '1.1em', 'margin-right': '10px'}
+    return html.Div([
+        html.H1("Price History", style={"text-align": "center", "color": "#eee", "font-family": "Montserrat, sans-serif", "margin-bottom": "10px"}),
+        html.P("Daily prices from %s to %s (%d snapshots)." % (dates[0], dates[-1], len(dates)), style={"color": "#ccc", "font-size": "1.2em", "text-align": "center"}),
+        html.Label("Dates:", style=label_style),
+        dcc.DatePickerRange(id='history-dates', min_date_allowed=dates[0], max_date_allowed=dates[-1],
+                            start_date=dates[0], end_date=dates[-1], display_format='YYYY-MM-DD'),
+        html.Div([
+            html.Label("Model:", style=label_style),
+            dcc.Dropdown(id='history-model', options=history.model_search().options(None),
+                         placeholder="Search a model", style={'width': '400px', 'color': '#333'}),
+            dcc.Loading(dcc.Graph(id='history-model-graph', className="dash-graph"), type="circle"),
+        ], style={"margin": "30px 0", "background-color": "#222", "padding": "20px", "border-radius": "5px", "width": "90%"}),
+        html.Div([
+            html.Label("Brands:", style=label_style),
+            dcc.Dropdown(id='history-brands', options=[{"label": brand, "value": brand} for brand in history.brands()],
+                         multi=True, placeholder="Top 8 brands", style={'color': '#333'}),
+            dcc.Loading(dcc.Graph(id='history-brands-graph', className="dash-graph"), type="circle"),
+        ], style={"margin-bottom": "30px", "background-color": "#222", "padding": "20px", "border-radius": "5px", "width": "90%"}),
+        go_back,
+    ], style={"display": "flex", "flex-direction": "column", "align-items": "center", "min-height": "100vh", "background-color": "#111", "padding": "40px"})
 
 # Initialize Dash app
 app = dash.Dash(__name__)
 app.config.suppress_callback_exceptions = True
+compressor.install(app.server)
+
+# JSON aggregates and lookups over the live dataset at /api (see query_api.py)
+query_api = QueryAPI(live, jobs=figure_jobs).install(app.server)
+
+# Seconds from the start of the import until the app could answer requests
+IMPORT_SECONDS = time.time() - STARTED
 
 # Define the app layout
 app.layout = html.Div([
@@ -267,120 +434,213 @@ app.layout = html.Div([
     html.Div(id='page-content')
 ])
 
+# Hit/miss counters of the graph analysis figure cache and the live dataset version
+@app.server.route('/_figure_cache')
+def figure_cache_stats():
+    startup = {"lazy": DASHBOARD_LAZY, "import_s": round(IMPORT_SECONDS, 3),
+               "data_ready_s": round(live.ready_at - STARTED, 3) if live.ready_at else None}
+    return jsonify(dict(figure_cache.stats(), dataset=live.stats(), jobs=figure_jobs.stats(), shared=shared_cache.stats(),
+                        compression=compressor.stats(), query_api=query_api.stats(), startup=startup))
+
+def collect_metrics(registry):
+    stats = figure_cache.stats()
+    registry.set("dashboard_figure_cache_hits", stats["hits"])
+    registry.set("dashboard_figure_cache_misses", stats["misses"])
+    if live.ready_at:
+        registry.set("dashboard_dataset_version", live.stats()["version"])
+
+# Prometheus metrics at /metrics, only with DASHBOARD_METRICS=1 (see profiling.py)
+profiling.register(app.server, collect_metrics)
+
 # Callback to render content based on the URL
 @app.callback(
     Output('page-content', 'children'),
     [Input('url', 'pathname')]
 )
+@profiling.instrument("display_page")
 def display_page(pathname):
     if pathname == '/':
         return initial_layout
     elif pathname == '/graph_analysis':
         return create_graph_analysis_layout()
     elif pathname == '/compare_phones':
-        return compare_phones_layout # This line will now find the defined variable
+        return create_compare_phones_layout()
+    elif pathname == '/price_history':
+        return create_price_history_layout()
     else:
         return '404: Page not found'
 
+# Server-side search for the phone dropdowns
+@app.callback(
+    Output('phone1-dropdown', 'options'),
+    [Input('phone1-dropdown', 'search_value')],
+    [State('phone1-dropdown', 'value')]
+)
+@profiling.instrument("search_phone1")
+def search_phone1(search_value, value):
+    return live.current().model_search.options(search_value, value)
+
+@app.callback(
+    Output('phone2-dropdown', 'options'),
+    [Input('phone2-dropdown', 'search_value')],
+    [State('phone2-dropdown', 'value')]
+)
+@profiling.instrument("search_phone2")
+def search_phone2(search_value, value):
+    return live.current().model_search.options(search_value, value)
+
+# Figure JSON for one graph and filter state, e.g.
+#   GET /_figure/bar_chart.json?brand=Apple&brand=Samsung&price=0,50000&rating=4
+# A plain GET, so it is compressed once per ETag and a browser that already has
+# it gets a 304. Requests for one filter state share a single cross-filter pass,
+# duplicate requests for the same figure share one build and figures already
+# built by another worker are read from the shared cache.
+@app.server.route("/_figure/<name>.json")
+def graph_figure(name):
+    if name not in GRAPH_NAMES:
+        abort(404)
+    snapshot = live.current()
+    price = request.args.get("price")
+    rating = request.args.get("rating")
+    try:
+        price_range = [float(value) for value in price.split(",")] if price else None
+        min_rating = float(rating) if rating else None
+    except ValueError:
+        abort(400)
+    brands, price_range, min_rating = filters = filter_args(
+        snapshot, request.args.getlist("brand"), price_range, min_rating)
+    key = (snapshot.fingerprint, tuple(sorted(brands)) if brands else None, price_range, min_rating)
+    etag = figure_etag(snapshot.fingerprint, name, key[1:])
+    if not any(filters):
+        # Counted as a figure cache hit (or a miss, rebuilding a version it no longer
+        # holds); the compressed body was precompressed by warm_snapshot
+        payload = figure_cache.get_json(snapshot.fingerprint, name, figure_builder(snapshot))
+        return compressor.serve(etag, lambda: payload.encode())
+
+    def build():
+        rows, rollup = figure_jobs.share(("filter",) + key, lambda: filtered_inputs(snapshot, *filters))
+        from figures import FIGURE_BUILDERS
+        fig = FIGURE_BUILDERS[name](rows, rollup)
+        with profiling.stage(name, "serialize"):
+            return pio.to_json(fig, validate=False).encode()
+    return compressor.serve(etag, lambda: figure_jobs.run(
+        (name,) + key, lambda: shared_cache.get_or_compute(snapshot.fingerprint, (name,) + key[1:], build)))
+
+# One clientside callback per graph, so each chart renders as soon as its own
+# figure arrives. They fire on page load and on every filter change, and fetch
+# /_figure/<name>.json through the browser's HTTP cache.
+GRAPH_FETCH = """
+function(brands, priceRange, minRating) {
+    var query = new URLSearchParams();
+    (brands || []).forEach(function(brand) { query.append("brand", brand); });
+    if (priceRange) { query.set("price", priceRange.join(",")); }
+    if (minRating) { query.set("rating", minRating); }
+    return fetch(%s + "?" + query.toString()).then(function(response) {
+        if (!response.ok) { throw new Error("figure request failed: " + response.status); }
+        return response.json();
+    });
+}
+"""
+
+for name in GRAPH_NAMES:
+    app.clientside_callback(
+        GRAPH_FETCH % json.dumps(app.get_relative_path(f"/_figure/{name}.json")),
+        Output(f"graph-{name}", "figure"),
+        [Input("brand-filter", "value"),
+         Input("price-filter", "value"),
+         Input("rating-filter", "value")]
+    )
+
 # Callback to update comparison output
 @app.callback(
-    Output('comparison-output', 'children'),
+    [Output('comparison-table', 'columns'),
+     Output('comparison-table', 'data'),
+     Output('comparison-table-wrapper', 'hidden'),
+     Output('comparison-hint', 'hidden')],
     [Input('phone1-dropdown', 'value'),
      Input('phone2-dropdown', 'value')]
 )
+@profiling.instrument("update_comparison")
 def update_comparison(phone1, phone2):
-    if phone1 and phone2:
-        phone1_data = data[data['model'] == phone1].iloc[0]
-        phone2_data = data[data['model'] == phone2].iloc[0]
-
-        comparison_table = html.Table(
-            style={'width': '100%', 'borderCollapse': 'collapse'},
-            children=[
-                html.Thead(
-                    html.Tr([
-                        html.Th("Feature", style={'border': '1px solid #555', 'padding': '8px', 'text-align': 'left'}),
-                        html.Th(phone1, style={'border': '1px solid #555', 'padding': '8px', 'text-align': 'center'}),
-                        html.Th(phone2, style={'border': '1px solid #555', 'padding': '8px', 'text-align': 'center'}),
-                    ])
-                ),
-                html.Tbody([
-                    html.Tr([
-                        html.Td("Brand", style={'border': '1px solid #555', 'padding': '8px'}),
-                        html.Td(phone1_data['brand'], style={'border': '1px solid #555', 'padding': '8px', 'text-align': 'center'}),
-                        html.Td(phone2_data['brand'], style={'border': '1px solid #555', 'padding': '8px', 'text-align': 'center'}),
-                    ]),
-                    html.Tr([
-                        html.Td("Model", style={'border': '1px solid #555', 'padding': '8px'}),
-                        html.Td(phone1_data['model'], style={'border': '1px solid #555', 'padding': '8px', 'text-align': 'center'}),
-                        html.Td(phone2_data['model'], style={'border': '1px solid #555', 'padding': '8px', 'text-align': 'center'}),
-                    ]),
-                    html.Tr([
-                        html.Td("Colour", style={'border': '1px solid #555', 'padding': '8px'}),
-                        html.Td(phone1_data['colour'], style={'border': '1px solid #555', 'padding': '8px', 'text-align': 'center'}),
-                        html.Td(phone2_data['colour'], style={'border': '1px solid #555', 'padding': '8px', 'text-align': 'center'}),
-                    ]),
-                    html.Tr([
-                        html.Td("Original Price (INR)", style={'border': '1px solid #555', 'padding': '8px'}),
-                        html.Td(phone1_data['original_price'], style={'border': '1px solid #555', 'padding': '8px', 'text-align': 'center'}),
-                        html.Td(phone2_data['original_price'], style={'border': '1px solid #555', 'padding': '8px', 'text-align': 'center'}),
-                    ]),
-                    html.Tr([
-                        html.Td("Discounted Price (INR)", style={'border': '1px solid #555', 'padding': '8px'}),
-                        html.Td(phone1_data['discounted_price'], style={'border': '1px solid #555', 'padding': '8px', 'text-align': 'center'}),
-                        html.Td(phone2_data['discounted_price'], style={'border': '1px solid #555', 'padding': '8px', 'text-align': 'center'}),
-                    ]),
-                    html.Tr([
-                        html.Td("Ratings", style={'border': '1px solid #555', 'padding': '8px'}),
-                        html.Td(phone1_data['ratings'], style={'border': '1px solid #555', 'padding': '8px', 'text-align': 'center'}),
-                        html.Td(phone2_data['ratings'], style={'border': '1px solid #555', 'padding': '8px', 'text-align': 'center'}),
-                    ]),
-                    html.Tr([
-                        html.Td("RAM (Memory)", style={'border': '1px solid #555', 'padding': '8px'}),
-                        html.Td(phone1_data['memory'], style={'border': '1px solid #555', 'padding': '8px', 'text-align': 'center'}),
-                        html.Td(phone2_data['memory'], style={'border': '1px solid #555', 'padding': '8px', 'text-align': 'center'}),
-                    ]),
-                    html.Tr([
-                        html.Td("Storage", style={'border': '1px solid #555', 'padding': '8px'}),
-                        html.Td(phone1_data['storage'], style={'border': '1px solid #555', 'padding': '8px', 'text-align': 'center'}),
-                        html.Td(phone2_data['storage'], style={'border': '1px solid #555', 'padding': '8px', 'text-align': 'center'}),
-                    ]),
-                    html.Tr([
-                        html.Td("Processor", style={'border': '1px solid #555', 'padding': '8px'}),
-                        html.Td(phone1_data['processor'], style={'border': '1px solid #555', 'padding': '8px', 'text-align': 'center'}),
-                        html.Td(phone2_data['processor'], style={'border': '1px solid #555', 'padding': '8px', 'text-align': 'center'}),
-                    ]),
-                    html.Tr([
-                        html.Td("Rear Camera", style={'border': '1px solid #555', 'padding': '8px'}),
-                        html.Td(phone1_data['rear_camera'], style={'border': '1px solid #555', 'padding': '8px', 'text-align': 'center'}),
-                        html.Td(phone2_data['rear_camera'], style={'border': '1px solid #555', 'padding': '8px', 'text-align': 'center'}),
-                    ]),
-                    html.Tr([
-                        html.Td("Front Camera", style={'border': '1px solid #555', 'padding': '8px'}),
-                        html.Td(phone1_data['front_camera'], style={'border': '1px solid #555', 'padding': '8px', 'text-align': 'center'}),
-                        html.Td(phone2_data['front_camera'], style={'border': '1px solid #555', 'padding': '8px', 'text-align': 'center'}),
-                    ]),
-                    html.Tr([
-                        html.Td("Display Size (cm)", style={'border': '1px solid #555', 'padding': '8px'}),
-                        html.Td(phone1_data['display_size'], style={'border': '1px solid #555', 'padding': '8px', 'text-align': 'center'}),
-                        html.Td(phone2_data['display_size'], style={'border': '1px solid #555', 'padding': '8px', 'text-align': 'center'}),
-                    ]),
-                    html.Tr([
-                        html.Td("Battery Capacity (mAh)", style={'border': '1px solid #555', 'padding': '8px'}),
-                        html.Td(phone1_data['battery_capacity'], style={'border': '1px solid #555', 'padding': '8px', 'text-align': 'center'}),
-                        html.Td(phone2_data['battery_capacity'], style={'border': '1px solid #555', 'padding': '8px', 'text-align': 'center'}),
-                    ]),
-                    html.Tr([
-                        html.Td("Battery Type", style={'border': '1px solid #555', 'padding': '8px'}),
-                        html.Td(phone1_data['battery_type'], style={'border': '1px solid #555', 'padding': '8px', 'text-align': 'center'}),
-                        html.Td(phone2_data['battery_type'], style={'border': '1px solid #555', 'padding': '8px', 'text-align': 'center'}),
-                    ]),
-                ])
-            ]
-        )
-        return comparison_table
+    snapshot = live.current()
+    # A reload may have dropped a model that is still selected in the browser
+    if phone1 in snapshot.catalogue and phone2 in snapshot.catalogue:
+        columns, data = snapshot.comparison.table(phone1, phone2)
+        return columns, data, False, True
     else:
-        return html.P("Please select two phones to compare.", style={"color": "#ccc", "font-size": "1.2em", "text-align": "center"})
+        return [], [], True, False
+
+# Callback to list the phones most similar to phone 1
+@app.callback(
+    [Output('similar-table', 'data'),
+     Output('similar-output', 'hidden')],
+    [Input('phone1-dropdown', 'value')]
+)
+@profiling.instrument("update_similar")
+def update_similar(phone1):
+    snapshot = live.current()
+    neighbours = snapshot.similar.similar(phone1, k=5)
+    if not neighbours:
+        return [], True
+    columns = ['model', 'discounted_price', 'ratings', 'memory', 'storage']
+    rows = []
+    for model, _ in neighbours:
+        record = snapshot.catalogue.record(model)
+        rows.append({column: record.get(column) for column in columns})
+    return rows, False
+
+@app.callback(
+    Output('history-model', 'options'),
+    [Input('history-model', 'search_value')],
+    [State('history-model', 'value')]
+)
+@profiling.instrument("search_history_model")
+def search_history_model(search_value, value):
+    return price_history().model_search().options(search_value, value)
+
+def _date_range(start_date, end_date):
+    # DatePickerRange may send a full ISO timestamp
+    return (start_date or None) and start_date[:10], (end_date or None) and end_date[:10]
+
+# One line per colour/RAM/storage variant, each price held until it next changes
+@app.callback(
+    Output('history-model-graph', 'figure'),
+    [Input('history-model', 'value'),
+     Input('history-dates', 'start_date'),
+     Input('history-dates', 'end_date')]
+)
+@profiling.instrument("update_history_model")
+def update_history_model(model, start_date, end_date):
+    import plotly.express as px
+    import plotly.graph_objects as go
+    if not model:
+        return go.Figure(layout={"title": "Select a model to see its price history"})
+    history = price_history().model_history(model, *_date_range(start_date, end_date))
+    fig = px.line(history, x="date", y="discounted_price", color="variant", line_shape="hv",
+                  title="%s: Discounted Price" % model,
+                  labels={"date": "Date", "discounted_price": "Price (INR)", "variant": "Variant"},
+                  hover_data=["original_price", "ratings"])
+    return fig
+
+# Mean discount per brand and day, from the daily rollups
+@app.callback(
+    Output('history-brands-graph', 'figure'),
+    [Input('history-brands', 'value'),
+     Input('history-dates', 'start_date'),
+     Input('history-dates', 'end_date')]
+)
+@profiling.instrument("update_history_brands")
+def update_history_brands(brands, start_date, end_date):
+    import plotly.express as px
+    history = price_history()
+    brands = brands or history.brands()[:8]
+    trends = history.brand_trends(*_date_range(start_date, end_date), brands=brands)
+    fig = px.line(trends, x="date", y="discount_pct", color="brand", markers=len(trends) < 500,
+                  title="Average Discount by Brand",
+                  labels={"date": "Date", "discount_pct": "Discount (%)", "brand": "Brand"},
+                  hover_data=["price_mean", "listings", "changed"])
+    return fig
 
 # Run the app
 if __name__ == "__main__":
-    app.run_server(debug=True)
\ No newline at end of file
+    app.run_server(debug=True)
\ No newline at end of file
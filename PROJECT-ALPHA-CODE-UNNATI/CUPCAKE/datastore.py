@@ -0,0 +1,250 @@
+import glob
+import hashlib
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from cleaning import clean
+from schema import CATEGORY_COLUMNS, SCHEMA_VERSION, compact
+
+# Columnar on-disk copy of a catalogue CSV, or of a directory / glob of CSV shards.
+#
+# <name>.columns/
+#     meta.json     row count, per-column dtype, text labels, source CSV stat
+#     <column>.bin  raw little-endian values, memory-mapped on load
+#
+# Numeric columns are stored as typed arrays (schema.STORAGE_DTYPES). Text columns are dictionary encoded: int32 codes on disk
+# (-1 for missing) and the distinct labels in meta.json; the schema's
+# category columns load straight back as pandas categoricals.
+#
+# The store is written once by `python ingest.py <csv>`, together with the
+# chart rollup (rollup.py), and is used by load_catalogue() for as long as the
+# source files are unchanged.
+
+META_FILE = "meta.json"
+
+# A listing scraped into several shards is kept once, from the first shard in sorted order
+DEDUPE_COLUMNS = ["brand", "model", "colour", "memory", "storage"]
+
+
+def expand_source(source):
+    # A CSV file, a directory of *.csv shards, or a glob such as "scrapes/2024-*.csv"
+    if os.path.isdir(source):
+        return sorted(glob.glob(os.path.join(source, "*.csv")))
+    if any(char in source for char in "*?["):
+        return sorted(glob.glob(source))
+    return [source]
+
+
+def store_path(source):
+    if os.path.isdir(source):
+        return source.rstrip("/\\") + ".columns"
+    if any(char in source for char in "*?["):
+        # One store per pattern, in the deepest directory the pattern names literally
+        directory = os.path.dirname(source)
+        while any(char in directory for char in "*?["):
+            directory = os.path.dirname(directory)
+        return os.path.join(directory, "catalogue-%s.columns" % hashlib.sha1(source.encode()).hexdigest()[:12])
+    return os.path.splitext(source)[0] + ".columns"
+
+
+def source_stat(source):
+    files = expand_source(source)
+    if files == [source]:
+        stat = os.stat(source)
+        return {"path": source, "mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+    stats = {}
+    for path in files:
+        stat = os.stat(path)
+        stats[path] = [stat.st_mtime_ns, stat.st_size]
+    return {"path": source, "files": stats}
+
+
+def clean_shard(csv_path):
+    # Runs in a worker process; returns the cleaned shard and its parse time
+    started = time.perf_counter()
+    data = clean(pd.read_csv(csv_path))
+    return data, time.perf_counter() - started
+
+
+def dedupe_key(data):
+    return [column for column in DEDUPE_COLUMNS if column in data.columns]
+
+
+class SeenListings:
+    # De-duplicates a stream of chunks the way read_shards de-duplicates shards:
+    # a listing is kept from the first chunk it appears in. Only a 64-bit hash
+    # of each kept listing's key is remembered.
+    def __init__(self):
+        self.hashes = np.empty(0, dtype=np.uint64)
+
+    def new(self, data):
+        key = dedupe_key(data)
+        if not key:
+            return data
+        hashes = pd.util.hash_pandas_object(data[key], index=False).to_numpy()
+        keep = ~pd.Series(hashes).duplicated().to_numpy() & ~np.isin(hashes, self.hashes)
+        self.hashes = np.union1d(self.hashes, hashes[keep])
+        return data[keep].reset_index(drop=True)
+
+
+def read_shards(source, workers=None, log=print):
+    # Parses and cleans shards across cores, then merges them in sorted file
+    # order so the result does not depend on which worker finished first.
+    # A single CSV goes through the same de-duplication as a set of shards.
+    files = expand_source(source)
+    if not files:
+        raise FileNotFoundError("no CSV files in %s" % source)
+    if len(files) == 1:
+        results = [clean_shard(files[0])]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(clean_shard, files))
+    for path, (shard, seconds) in zip(files, results):
+        log("  %s: %d rows in %.2fs" % (path, len(shard), seconds))
+    data = pd.concat([shard for shard, _ in results], ignore_index=True)
+    merged = data.drop_duplicates(subset=dedupe_key(data), keep="first", ignore_index=True)
+    log("  %d shards: %d rows parsed, %d after de-duplication" % (len(files), len(data), len(merged)))
+    return merged
+
+
+class ColumnStoreWriter:
+    # Appends DataFrame chunks column by column, so a store can be written
+    # without holding the whole catalogue in memory. Nothing is visible at
+    # `path` until close() moves the finished directory into place.
+    def __init__(self, path, source=None, meta=None):
+        self.path = path
+        self.tmp_path = path + ".tmp"
+        self.source = source
+        # Extra meta.json entries, e.g. the day of a price_history partition
+        self.meta = meta or {}
+        self.rows = 0
+        self.columns = {}
+        shutil.rmtree(self.tmp_path, ignore_errors=True)
+        os.makedirs(self.tmp_path)
+
+    def _column_file(self, column):
+        return os.path.join(self.tmp_path, column + ".bin")
+
+    def _encode(self, column, values):
+        spec = self.columns.get(column)
+        if spec is None:
+            if pd.api.types.is_numeric_dtype(values.dtype) and not pd.api.types.is_bool_dtype(values.dtype):
+                spec = {"kind": "numeric", "dtype": np.dtype(values.dtype).newbyteorder("<").str}
+            else:
+                spec = {"kind": "text", "dtype": "<i4", "labels": []}
+            self.columns[column] = spec
+        if spec["kind"] == "numeric":
+            return values.to_numpy(dtype=spec["dtype"])
+        # Map this chunk's distinct strings onto the store-wide label list
+        codes, uniques = pd.factorize(values.astype(object), use_na_sentinel=True)
+        lookup = spec.setdefault("_lookup", {label: i for i, label in enumerate(spec["labels"])})
+        remap = np.empty(len(uniques), dtype="<i4")
+        for i, label in enumerate(uniques):
+            label = str(label)
+            if label not in lookup:
+                lookup[label] = len(spec["labels"])
+                spec["labels"].append(label)
+            remap[i] = lookup[label]
+        encoded = np.full(len(codes), -1, dtype="<i4")
+        present = codes >= 0
+        encoded[present] = remap[codes[present]]
+        return encoded
+
+    def append(self, data):
+        if self.rows and list(data.columns) != list(self.columns):
+            raise ValueError("chunk columns do not match the store: %r" % list(data.columns))
+        for column in data.columns:
+            values = self._encode(column, data[column])
+            with open(self._column_file(column), "ab") as f:
+                values.tofile(f)
+        self.rows += len(data)
+
+    def close(self):
+        columns = {
+            column: {key: value for key, value in spec.items() if not key.startswith("_")}
+            for column, spec in self.columns.items()
+        }
+        meta = dict(self.meta, rows=self.rows, columns=columns, source=self.source, schema=SCHEMA_VERSION)
+        with open(os.path.join(self.tmp_path, META_FILE), "w") as f:
+            json.dump(meta, f)
+        # Swap the finished store in; readers never see a half-written directory.
+        # Until the new one is in place the previous store stays at <path>.old
+        # (see committed_store), also when an earlier swap died half way.
+        old_path = self.path + ".old"
+        if os.path.exists(self.path):
+            shutil.rmtree(old_path, ignore_errors=True)
+            os.replace(self.path, old_path)
+        os.replace(self.tmp_path, self.path)
+        shutil.rmtree(old_path, ignore_errors=True)
+        return self.path
+
+
+def write_store(data, path, source=None, meta=None):
+    writer = ColumnStoreWriter(path, source=source, meta=meta)
+    writer.append(data)
+    return writer.close()
+
+
+def read_meta(path):
+    with open(os.path.join(path, META_FILE)) as f:
+        return json.load(f)
+
+
+def committed_store(path):
+    # The store at `path`, or the one a swap in ColumnStoreWriter.close has
+    # moved aside but not yet replaced; None when there is neither
+    for candidate in (path, path + ".old"):
+        if os.path.exists(os.path.join(candidate, META_FILE)):
+            return candidate
+    return None
+
+
+def read_store(path, columns=None):
+    meta = read_meta(path)
+    rows = meta["rows"]
+    frame = {}
+    for column in columns or list(meta["columns"]):
+        spec = meta["columns"][column]
+        dtype = np.dtype(spec["dtype"])
+        if rows:
+            values = np.memmap(os.path.join(path, column + ".bin"), dtype=dtype, mode="r", shape=(rows,))
+        else:
+            values = np.empty(0, dtype=dtype)
+        if spec["kind"] == "text" and column in CATEGORY_COLUMNS:
+            values = pd.Categorical.from_codes(values, categories=spec["labels"])
+        elif spec["kind"] == "text":
+            labels = np.array(spec["labels"] + [np.nan], dtype=object)
+            # -1 (missing) indexes the trailing NaN; label strings are shared, not copied per row
+            values = labels.take(values)
+        frame[column] = pd.Series(values, copy=False)
+    return pd.DataFrame(frame, copy=False)
+
+
+def is_fresh(path, source):
+    if not os.path.exists(os.path.join(path, META_FILE)):
+        return False
+    meta = read_meta(path)
+    if meta.get("schema") != SCHEMA_VERSION:
+        return False
+    if not any(os.path.exists(f) for f in expand_source(source)):
+        # Deployed with the store only, which must have been built from this same source
+        recorded = (meta.get("source") or {}).get("path")
+        return recorded is not None and os.path.normpath(recorded) == os.path.normpath(source)
+    return meta.get("source") == source_stat(source)
+
+
+def load_catalogue(source, columns=None):
+    # Memory-mapped load from the columnar store when it matches the source
+    # files, otherwise the CSV parse it replaces (shards in parallel)
+    path = store_path(source)
+    if is_fresh(path, source):
+        return read_store(path, columns)
+    data = read_shards(source)
+    return compact(data[columns] if columns else data)
+
@@ -0,0 +1,92 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import plotly.io as pio
+
+import profiling
+
+
+# Fingerprint of a dataset file: mtime + content hash.
+# The hash is only recomputed when the file's stat (mtime/size) changes,
+# so checking the fingerprint on every request costs a single os.stat().
+_hash_memo = {}
+
+
+def dataset_fingerprint(path):
+    stat = os.stat(path)
+    stat_key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+    digest = _hash_memo.get(stat_key)
+    if digest is None:
+        sha = hashlib.sha1()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                sha.update(block)
+        digest = sha.hexdigest()[:16]
+        _hash_memo[stat_key] = digest
+    return f"{stat.st_mtime_ns}-{digest}"
+
+
+class FigureCache:
+    # Figures of the most recent dataset versions, keyed by dataset fingerprint
+    # and serialized once to JSON. `keep` versions are held so requests still
+    # running against the previous version after a reload find their figures.
+    # With a shared_cache.SharedCache, the JSON is built by one worker process
+    # and read from disk by the others.
+    def __init__(self, keep=2, shared=None):
+        self.keep = keep
+        self.shared = shared
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def _entry(self, fingerprint, build, count=True):
+        # (payloads, figures) of a version; build() must return a dict of {name: plotly Figure}
+        with self._lock:
+            entry = self._entries.get(fingerprint)
+            if entry is not None:
+                self.hits += count
+                self._entries.move_to_end(fingerprint)
+                return entry
+            self.misses += count
+        # Built outside the lock so a reload never blocks requests for the current version
+        def serialize():
+            payloads = {}
+            for name, fig in build().items():
+                with profiling.stage(name, "serialize"):
+                    payloads[name] = pio.to_json(fig, validate=False)
+                profiling.figure_payload(name, payloads[name])
+            return json.dumps(payloads).encode()
+        if self.shared is not None:
+            payloads = json.loads(self.shared.get_or_compute(fingerprint, "graph_analysis", serialize))
+        else:
+            payloads = json.loads(serialize())
+        # Plain dicts are what dcc.Graph receives, so decode the JSON once here
+        figures = {name: json.loads(payload) for name, payload in payloads.items()}
+        entry = (payloads, figures)
+        with self._lock:
+            self._entries[fingerprint] = entry
+            while len(self._entries) > self.keep:
+                self._entries.popitem(last=False)
+        return entry
+
+    # get() and get_json() count one hit or miss per request served
+    def get(self, fingerprint, build):
+        return self._entry(fingerprint, build)[1]
+
+    def get_json(self, fingerprint, name, build):
+        return self._entry(fingerprint, build)[0][name]
+
+    def warm(self, fingerprint, build):
+        # Builds a version ahead of its first request, without counting; returns {name: JSON}
+        return self._entry(fingerprint, build, count=False)[0]
+
+    def stats(self):
+        return {
+            "versions": list(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
@@ -0,0 +1,164 @@
+import plotly.express as px
+import plotly.graph_objects as go
+
+import profiling
+from rollup import PRICE_STEP
+from scatter import scatter_figure
+
+# The seven /graph_analysis charts as functions of (rows, rollup), shared by
+# dashboard.py and the headless report export (report.py).
+#
+# Everything except the scatter plot reads the pre-aggregated rollup (see rollup.py).
+# profiling.stage() times each figure's aggregation and Plotly construction when
+# DASHBOARD_METRICS=1; the scatter plot's sampling/binning counts as "figure".
+
+# Filters matching no rows leave nothing to plot; px cannot build a figure from
+# empty x/y arrays, so those charts get an empty figure with the same titles
+def empty_figure(title, xaxis_title, yaxis_title):
+    figure = go.Figure()
+    figure.update_layout(title=title, xaxis_title=xaxis_title, yaxis_title=yaxis_title)
+    return figure
+
+# Bar Chart: Smartphone Brand Popularity
+def bar_chart_figure(data, rollup):
+    with profiling.stage("bar_chart", "aggregate"):
+        brand_counts = rollup.brand_counts()
+    if brand_counts.empty:
+        return empty_figure("Smartphone Brand Popularity", "Brand", "Number of Smartphones")
+    with profiling.stage("bar_chart", "figure"):
+        bar_chart = px.bar(
+            x=brand_counts.index,
+            y=brand_counts.values,
+            title="Smartphone Brand Popularity",
+            labels={"x": "Brand", "y": "Number of Smartphones"},
+            color_discrete_sequence=["#636EFA"]
+        )
+    return bar_chart
+
+# Heatmap: Ratings by Brand and Battery Capacity
+def heatmap_figure(data, rollup):
+    with profiling.stage("heatmap", "aggregate"):
+        pivot_table = rollup.rating_pivot()
+
+    # Create Heatmap
+    with profiling.stage("heatmap", "figure"):
+        heatmap = go.Figure(data=go.Heatmap(
+            z=pivot_table.values,
+            x=pivot_table.columns,
+            y=pivot_table.index,
+            colorscale="Viridis",  # Use a valid Plotly colorscale
+            colorbar_title="Ratings"
+        ))
+        heatmap.update_layout(
+            title="Ratings by Brand and Battery Capacity",
+            xaxis_title="Battery Capacity (mAh)",
+            yaxis_title="Brand"
+        )
+    return heatmap
+
+# Scatter Plot: Ratings vs Price (WebGL / server-side bins on large catalogues)
+def scatter_plot_figure(data, rollup):
+    if data.empty:
+        return empty_figure("Ratings vs Price", "Price (INR)", "Ratings")
+    with profiling.stage("scatter_plot", "figure"):
+        scatter_plot = scatter_figure(
+            data,
+            x="discounted_price",
+            y="ratings",
+            title="Ratings vs Price",
+            labels={"discounted_price": "Price (INR)", "ratings": "Ratings"},
+            color="ratings",
+            discrete_color=False,
+            color_continuous_scale=px.colors.sequential.Plasma
+        )
+    return scatter_plot
+
+# Histogram: Price Distribution (one bar per PRICE_STEP bucket of the rollup)
+def histogram_figure(data, rollup):
+    with profiling.stage("histogram", "aggregate"):
+        price_hist = rollup.price_histogram()
+    if price_hist.empty:
+        return empty_figure("Price Distribution of Smartphones", "Price (INR)", "count")
+    with profiling.stage("histogram", "figure"):
+        histogram = px.bar(
+            x=price_hist.index + PRICE_STEP / 2,
+            y=price_hist.values,
+            title="Price Distribution of Smartphones",
+            labels={"x": "Price (INR)", "y": "count"},
+            color_discrete_sequence=["#FF851B"]
+        )
+        histogram.update_layout(bargap=0.05)
+    return histogram
+
+# Line Plot: Battery Capacity vs Price
+def line_chart_figure(data, rollup):
+    with profiling.stage("line_chart", "aggregate"):
+        avg_prices = rollup.mean_price_by_battery()
+    if avg_prices.dropna().empty:
+        return empty_figure("Battery Capacity vs Price", "Battery Capacity (mAh)", "Average Price (INR)")
+    with profiling.stage("line_chart", "figure"):
+        line_chart = px.line(
+            x=avg_prices.index,
+            y=avg_prices.values,
+            title="Battery Capacity vs Price",
+            labels={"x": "Battery Capacity (mAh)", "y": "Average Price (INR)"},
+            markers=True
+        )
+        line_chart.update_traces(line_color="#0074D9") # Setting line color using update_traces
+    return line_chart
+
+# Pie Chart: Battery Type Distribution
+def pie_chart_figure(data, rollup):
+    with profiling.stage("pie_chart", "aggregate"):
+        battery_counts = rollup.battery_type_counts()
+    if battery_counts.empty:
+        return empty_figure("Battery Type Distribution", None, None)
+    with profiling.stage("pie_chart", "figure"):
+        pie_chart = px.pie(
+            values=battery_counts.values,
+            names=battery_counts.index,
+            title="Battery Type Distribution",
+            color_discrete_sequence=px.colors.qualitative.Prism
+        )
+    return pie_chart
+
+# Box Plot: Price Distribution by Brand (from precomputed quartiles and fences)
+def box_plot_figure(data, rollup):
+    if rollup.price_box.empty:
+        return empty_figure("Price Distribution by Brand", "Brand", "Price (INR)")
+    with profiling.stage("box_plot", "figure"):
+        colors = px.colors.qualitative.Dark2
+        box_plot = go.Figure([
+            go.Box(
+                name=box.brand, x=[box.brand], q1=[box.q1], median=[box.median], q3=[box.q3],
+                lowerfence=[box.lowerfence], upperfence=[box.upperfence], marker_color=colors[i % len(colors)]
+            )
+            for i, box in enumerate(rollup.price_box.itertuples())
+        ])
+        box_plot.update_layout(title="Price Distribution by Brand", xaxis_title="Brand", yaxis_title="Price (INR)", legend_title_text="brand")
+    return box_plot
+
+# One builder per graph; each graph on /graph_analysis fetches its own figure
+FIGURE_BUILDERS = {
+    "bar_chart": bar_chart_figure,
+    "heatmap": heatmap_figure,
+    "scatter_plot": scatter_plot_figure,
+    "histogram": histogram_figure,
+    "line_chart": line_chart_figure,
+    "pie_chart": pie_chart_figure,
+    "box_plot": box_plot_figure,
+}
+
+# Section headings of /graph_analysis, reused by report.py
+FIGURE_TITLES = {
+    "bar_chart": "1. Smartphone Brand Popularity",
+    "heatmap": "2. Ratings by Brand and Battery Capacity",
+    "scatter_plot": "3. Ratings vs Price",
+    "histogram": "4. Price Distribution",
+    "line_chart": "5. Battery Capacity vs Price",
+    "pie_chart": "6. Battery Type Distribution",
+    "box_plot": "7. Price Distribution by Brand",
+}
+
+def build_graph_figures(data, rollup):
+    return {name: build(data, rollup) for name, build in FIGURE_BUILDERS.items()}
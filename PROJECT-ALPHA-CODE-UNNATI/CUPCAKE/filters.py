@@ -0,0 +1,115 @@
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from rollup import box_stats
+
+
+class CrossFilter:
+    # Row selection for the brand / price range / minimum rating filters.
+    #
+    # Built once per dataset: a packed bitmap and a row-position partition per
+    # brand, and the row order sorted by price and by rating, so a range
+    # filter is two binary searches. Each control's bitmap is cached on its own,
+    # so moving one control recomputes one bitmap and the final AND.
+    # Ranges are half-open: price_range=(low, high) keeps low <= price < high.
+    # Given the catalogue's sketches (approximate mode), price boxes filtered
+    # by brand and price come from them instead of the brand's rows.
+    def __init__(self, data, cache_size=64, sketches=None):
+        self.data = data
+        self.sketches = sketches
+        self.rows = len(data)
+        brands = data["brand"].astype("category")
+        codes = brands.cat.codes.to_numpy()
+        self.brands = list(brands.cat.categories)
+        self.partitions = {brand: np.flatnonzero(codes == i) for i, brand in enumerate(self.brands)}
+        self.bitmaps = {brand: np.packbits(codes == i) for i, brand in enumerate(self.brands)}
+        self.prices = data["discounted_price"].to_numpy(dtype="float64")
+        self.ratings = data["ratings"].to_numpy(dtype="float64")
+        self.price_order = np.argsort(self.prices, kind="stable")
+        self.sorted_prices = self.prices[self.price_order]
+        self.rating_order = np.argsort(self.ratings, kind="stable")
+        self.sorted_ratings = self.ratings[self.rating_order]
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+
+    def _cached(self, key, compute):
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+        value = self._cache[key] = compute()
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return value
+
+    def _range_bitmap(self, order, sorted_values, low, high):
+        # NaNs sort last, so they never fall inside a finite range
+        start = np.searchsorted(sorted_values, low, side="left")
+        stop = np.searchsorted(sorted_values, high, side="left")
+        mask = np.zeros(self.rows, dtype=bool)
+        mask[order[start:stop]] = True
+        return np.packbits(mask)
+
+    def brand_bitmap(self, brands):
+        def compute():
+            bitmap = np.zeros((self.rows + 7) // 8, dtype=np.uint8)
+            for brand in brands:
+                if brand in self.bitmaps:
+                    bitmap |= self.bitmaps[brand]
+            return bitmap
+        return self._cached(("brand", frozenset(brands)), compute)
+
+    def price_bitmap(self, low, high):
+        return self._cached(("price", low, high), lambda: self._range_bitmap(self.price_order, self.sorted_prices, low, high))
+
+    def rating_bitmap(self, min_rating):
+        # Ratings are stored as float32; the epsilon keeps e.g. 4.3 >= 4.3
+        return self._cached(
+            ("rating", min_rating),
+            lambda: self._range_bitmap(self.rating_order, self.sorted_ratings, min_rating - 1e-6, np.inf),
+        )
+
+    def mask(self, brands=None, price_range=None, min_rating=None):
+        # Boolean row mask for the active filters, or None when nothing is filtered
+        bitmaps = []
+        if brands:
+            bitmaps.append(self.brand_bitmap(brands))
+        if price_range:
+            bitmaps.append(self.price_bitmap(*price_range))
+        if min_rating:
+            bitmaps.append(self.rating_bitmap(min_rating))
+        if not bitmaps:
+            return None
+        combined = np.bitwise_and.reduce(bitmaps) if len(bitmaps) > 1 else bitmaps[0]
+        return np.unpackbits(combined, count=self.rows).astype(bool)
+
+    def select(self, brands=None, price_range=None, min_rating=None):
+        mask = self.mask(brands, price_range, min_rating)
+        return self.data if mask is None else self.data[mask]
+
+    def price_box(self, brands=None, price_range=None, min_rating=None):
+        # Per-brand box statistics under the filters; each brand partition is
+        # computed on its own and cached, so adding a brand only computes that brand
+        if self.sketches is not None and not min_rating:
+            return self._cached(("box", brands and tuple(brands), price_range),
+                                lambda: self.sketches.price_box(brands or self.brands, price_range))
+        mask = None
+        rows = []
+        for brand in brands or self.brands:
+            if brand not in self.partitions:
+                continue
+
+            def compute(brand=brand):
+                nonlocal mask
+                if mask is None:
+                    mask = self.mask(None, price_range, min_rating)
+                positions = self.partitions[brand]
+                if mask is not None:
+                    positions = positions[mask[positions]]
+                return box_stats(self.prices[positions])
+
+            stats = self._cached(("box", brand, price_range, min_rating), compute)
+            if stats is not None:
+                rows.append(dict(stats, brand=brand))
+        return pd.DataFrame(rows, columns=["brand", "q1", "median", "q3", "lowerfence", "upperfence", "count"])
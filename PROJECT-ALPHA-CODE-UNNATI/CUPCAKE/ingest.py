@@ -0,0 +1,105 @@
+import argparse
+import time
+
+import pandas as pd
+
+from cleaning import clean
+from datastore import ColumnStoreWriter, SeenListings, expand_source, read_shards, read_store, source_stat, store_path, write_store
+from rollup import Rollup, build_cube, combine_cubes
+from schema import to_storage
+from sketches import APPROXIMATE, CatalogueSketches
+
+# Streaming ingest: raw Flipkart export CSV -> cleaned columnar store + chart rollup.
+#
+#   python ingest.py flipkart_smartphones.csv [--chunksize 100000]
+#   python ingest.py scrapes/ [--workers 8]          (directory or glob of CSV shards)
+#
+# A single CSV is streamed: only one chunk of raw rows is in memory at a time,
+# each chunk is cleaned, stripped of listings an earlier chunk already had,
+# appended to the store's column files and folded into the rollup cube and the
+# price/model sketches. Shards are cleaned in parallel in a process pool,
+# merged in sorted order and de-duplicated the same way, on
+# datastore.DEDUPE_COLUMNS.
+#
+# With --approx (or APPROX_STATS=1) the box-plot quartiles come from the
+# sketches, so a single CSV is never read back after streaming it.
+
+CHUNK_ROWS = 100000
+
+
+def read_chunks(csv_path, chunksize=CHUNK_ROWS):
+    with pd.read_csv(csv_path, chunksize=chunksize) as reader:
+        for chunk in reader:
+            yield chunk
+
+
+def clean_chunks(chunks):
+    for chunk in chunks:
+        yield to_storage(clean(chunk))
+
+
+def ingest(csv_path, path=None, chunksize=CHUNK_ROWS, approx=APPROXIMATE):
+    path = path or store_path(csv_path)
+    started = time.perf_counter()
+    writer = ColumnStoreWriter(path, source=source_stat(csv_path))
+    cube = None
+    sketches = CatalogueSketches()
+    seen = SeenListings()
+    chunks = 0
+    for chunk in clean_chunks(read_chunks(csv_path, chunksize)):
+        chunk = seen.new(chunk)
+        writer.append(chunk)
+        chunk_cube = build_cube(chunk)
+        cube = chunk_cube if cube is None else combine_cubes([cube, chunk_cube])
+        sketches.update(chunk)
+        chunks += 1
+    writer.close()
+    if approx:
+        Rollup(cube, sketches.price_box(), sketches).save(path)
+    else:
+        # Exact box-plot quartiles need every price of a brand at once; read them back memory-mapped
+        Rollup.build(read_store(path, ["brand", "discounted_price"]), cube=cube, sketches=sketches).save(path)
+    seconds = time.perf_counter() - started
+    return {
+        "source": csv_path,
+        "store": path,
+        "rows": writer.rows,
+        "chunks": chunks,
+        "seconds": round(seconds, 3),
+        "rows_per_sec": round(writer.rows / seconds) if seconds else None,
+    }
+
+
+def ingest_shards(source, path=None, workers=None):
+    path = path or store_path(source)
+    started = time.perf_counter()
+    files = expand_source(source)
+    data = to_storage(read_shards(source, workers))
+    write_store(data, path, source=source_stat(source))
+    Rollup.build(data, sketches=CatalogueSketches.build(data)).save(path)
+    seconds = time.perf_counter() - started
+    return {
+        "source": source,
+        "store": path,
+        "rows": len(data),
+        "chunks": len(files),
+        "seconds": round(seconds, 3),
+        "rows_per_sec": round(len(data) / seconds) if seconds else None,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Clean raw Flipkart exports into columnar stores")
+    parser.add_argument("csv", nargs="*", default=["cleaned_data.csv"])
+    parser.add_argument("--chunksize", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--workers", type=int, default=None, help="processes for shard parsing (default: all cores)")
+    parser.add_argument("--approx", action="store_true", default=APPROXIMATE,
+                        help="box-plot quartiles from the price sketches instead of a second pass")
+    args = parser.parse_args()
+    for source in args.csv:
+        if expand_source(source) == [source]:
+            stats = ingest(source, chunksize=args.chunksize, approx=args.approx)
+        else:
+            stats = ingest_shards(source, workers=args.workers)
+        print("%(source)s -> %(store)s: %(rows)d rows in %(chunks)d chunks/shards, "
+              "%(seconds).2fs (%(rows_per_sec)s rows/sec)" % stats)
@@ -0,0 +1,59 @@
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+# Background figure work for the per-graph figure requests of /graph_analysis.
+#
+# Concurrent requests for the same key are coalesced: the first caller starts
+# the work and everyone else waits on the same Future. run() computes in a
+# bounded thread pool, so a burst of users changing filters cannot start more
+# figure builds than there are workers; share() computes in the caller's
+# thread, for work other jobs depend on (a pool job waiting on another pool
+# job could starve the pool). Threads rather than processes: the figures read
+# the in-memory snapshot, which would otherwise be pickled per job.
+
+FIGURE_WORKERS = int(os.environ.get("FIGURE_WORKERS", os.cpu_count() or 4))
+
+
+class FigureJobs:
+    def __init__(self, workers=FIGURE_WORKERS):
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix="figure-job")
+        self.started = 0
+        self.coalesced = 0
+        self._lock = threading.Lock()
+        self._in_flight = {}
+
+    def _claim(self, key):
+        # (future, True) for the caller that must do the work, (future, False) for the rest
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+            future = self._in_flight[key] = Future()
+            self.started += 1
+            return future, True
+
+    def _finish(self, key, future, compute):
+        try:
+            future.set_result(compute())
+        except BaseException as exc:
+            future.set_exception(exc)
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    def share(self, key, compute):
+        future, owner = self._claim(key)
+        if owner:
+            self._finish(key, future, compute)
+        return future.result()
+
+    def run(self, key, compute):
+        future, owner = self._claim(key)
+        if owner:
+            self.executor.submit(self._finish, key, future, compute)
+        return future.result()
+
+    def stats(self):
+        return {"started": self.started, "coalesced": self.coalesced, "in_flight": len(self._in_flight)}
@@ -0,0 +1,135 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+from figure_cache import dataset_fingerprint
+
+
+def source_fingerprint(source):
+    # Changes whenever the source CSV(s) or their columnar store are rewritten
+    # (datastore pulls in pandas; imported here so a lazy start does that on the watcher thread)
+    from datastore import META_FILE, expand_source, source_stat, store_path
+    files = expand_source(source)
+    if files == [source] and os.path.exists(source):
+        return dataset_fingerprint(source)
+    parts = []
+    if any(os.path.exists(f) for f in files):
+        parts.append(json.dumps(source_stat(source), sort_keys=True))
+    meta = os.path.join(store_path(source), META_FILE)
+    if os.path.exists(meta):
+        parts.append(str(os.stat(meta).st_mtime_ns))
+    return hashlib.sha1("|".join(parts).encode()).hexdigest()[:16]
+
+
+class Snapshot:
+    # One dataset version and everything derived from it (frame, indexes, rollup...).
+    # Never mutated after it is published; a reload publishes a new one.
+    def __init__(self, version, fingerprint, **parts):
+        self.version = version
+        self.fingerprint = fingerprint
+        self.loaded_at = time.time()
+        self.__dict__.update(parts)
+
+
+class LiveDataset:
+    # Keeps the current Snapshot of a dataset and swaps in a new one when the
+    # source changes.
+    #
+    # loader(source) returns the snapshot's parts as a dict; warm(snapshot), if
+    # given, runs before the swap (e.g. to build figures). Both run on the watcher
+    # thread, off the request path. Callbacks take `live.current()` once and use
+    # that snapshot throughout, so a swap mid-request never mixes versions.
+    #
+    # With lazy=True even the first version is loaded on the watcher thread:
+    # the constructor returns at once and current() blocks until it is ready.
+    def __init__(self, source, loader, warm=None, interval=10.0, log=print, lazy=False):
+        self.source = source
+        self.loader = loader
+        self.warm = warm
+        self.interval = interval
+        self.log = log
+        self.failures = 0
+        self.load_error = None
+        self.created_at = time.time()
+        self.ready_at = None
+        self._reload_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._ready = threading.Event()
+        self._thread = None
+        self._snapshot = None
+        if not lazy:
+            self.refresh()
+
+    def _load(self, fingerprint, version):
+        snapshot = Snapshot(version, fingerprint, **self.loader(self.source))
+        if self.warm is not None:
+            self.warm(snapshot)
+        return snapshot
+
+    def current(self):
+        if self._snapshot is None:
+            self._ready.wait()
+            if self._snapshot is None:
+                raise RuntimeError("dataset %s failed to load: %s" % (self.source, self.load_error))
+        return self._snapshot
+
+    def refresh(self):
+        fingerprint = source_fingerprint(self.source)
+        current = self._snapshot
+        if current is not None and fingerprint == current.fingerprint:
+            return False
+        with self._reload_lock:
+            current = self._snapshot
+            if current is not None and fingerprint == current.fingerprint:
+                return False
+            snapshot = self._load(fingerprint, current.version + 1 if current else 1)
+            # A single reference assignment: readers see the old or the new snapshot, never a mix
+            self._snapshot = snapshot
+        if current is None:
+            self.ready_at = time.time()
+            self.load_error = None
+            self._ready.set()
+        else:
+            self.log("dataset %s reloaded as version %d" % (self.source, snapshot.version))
+        return True
+
+    def _watch(self):
+        # A lazy start's first load happens here, right away
+        wait = 0 if self._snapshot is None else self.interval
+        while not self._stop.wait(wait):
+            wait = self.interval
+            try:
+                self.refresh()
+            except Exception as exc:
+                self.failures += 1
+                if self._snapshot is None:
+                    # Waiting requests fail instead of hanging; the next poll tries again
+                    self.load_error = exc
+                    self._ready.set()
+                    self.log("dataset %s failed to load, retrying: %s" % (self.source, exc))
+                else:
+                    # Half-written files and the like: keep serving the current version and retry
+                    self.log("dataset reload failed, still serving version %d: %s" % (self._snapshot.version, exc))
+
+    def watch(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._watch, name="dataset-watcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self):
+        snapshot = self._snapshot
+        return {
+            "source": self.source,
+            "version": snapshot.version if snapshot else None,
+            "fingerprint": snapshot.fingerprint if snapshot else None,
+            "loaded_at": snapshot.loaded_at if snapshot else None,
+            # Seconds from construction until the first version was ready
+            "startup_s": round(self.ready_at - self.created_at, 3) if self.ready_at else None,
+            "reload_failures": self.failures,
+        }
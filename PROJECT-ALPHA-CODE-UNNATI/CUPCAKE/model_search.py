@@ -0,0 +1,63 @@
+import bisect
+
+# Upper bound on matches returned for one keystroke, whatever page size is asked for
+MAX_RESULTS = 50
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class ModelSearchIndex:
+    # Server-side typeahead over model names.
+    # Prefix matches come from a bisect over the sorted lower-cased names;
+    # queries of three or more characters also match anywhere in the name
+    # through a trigram -> name-id posting index.
+    def __init__(self, models):
+        pairs = sorted({(str(model).strip().lower(), model) for model in models})
+        self.keys = [key for key, _ in pairs]
+        self.names = [name for _, name in pairs]
+        self.trigrams = {}
+        for i, key in enumerate(self.keys):
+            for gram in _trigrams(key):
+                self.trigrams.setdefault(gram, set()).add(i)
+
+    def __len__(self):
+        return len(self.names)
+
+    def _prefix_range(self, query):
+        start = bisect.bisect_left(self.keys, query)
+        stop = bisect.bisect_left(self.keys, query + "\uffff", lo=start)
+        return range(start, stop)
+
+    def _substring_ids(self, query):
+        postings = sorted((self.trigrams.get(gram, set()) for gram in _trigrams(query)), key=len)
+        if not postings or not postings[0]:
+            return []
+        candidates = set(postings[0]).intersection(*postings[1:])
+        # Trigrams only narrow the candidates; confirm the actual substring
+        return sorted(i for i in candidates if query in self.keys[i])
+
+    def _match_ids(self, query):
+        if not query:
+            return range(len(self.keys))
+        prefix = self._prefix_range(query)
+        if len(query) < 3:
+            return prefix
+        # Names starting with the query rank ahead of names that only contain it
+        return list(prefix) + [i for i in self._substring_ids(query) if i not in prefix]
+
+    def search(self, query, page=0, limit=20):
+        # Returns (names on the requested page, whether more pages follow)
+        limit = max(1, min(int(limit), MAX_RESULTS))
+        ids = self._match_ids((query or "").strip().lower())
+        start = max(0, int(page)) * limit
+        return [self.names[i] for i in ids[start:start + limit]], len(ids) > start + limit
+
+    def options(self, query, selected=None, limit=20):
+        # dcc.Dropdown options for the first page of matches; the current
+        # selection is kept so the dropdown can still display it
+        names, _ = self.search(query, limit=limit)
+        if selected and selected not in names:
+            names = [selected] + names
+        return [{'label': name, 'value': name} for name in names]
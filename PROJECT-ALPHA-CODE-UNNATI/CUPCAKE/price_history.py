@@ -0,0 +1,324 @@
+import argparse
+import datetime
+import os
+import re
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from datastore import DEDUPE_COLUMNS, committed_store, load_catalogue, read_meta, read_store, write_store
+from model_search import ModelSearchIndex
+
+# Price history across daily catalogue snapshots.
+#
+#   python price_history.py ingest scrapes/2024-05-01.csv scrapes/2024-05-02.csv ...
+#   python price_history.py ingest today.csv --date 2024-05-03
+#   python price_history.py stats
+#
+# Append-only store, one columnar partition (datastore.py format) per day:
+#
+# price_history/
+#     days/<YYYY-MM-DD>.columns/    the listings that changed that day: new, repriced,
+#                                   re-rated or delisted (removed=1, values missing)
+#     rollups/<YYYY>.columns/       per brand and day: listings, mean/min price, mean discount...
+#     latest.columns/               every listing's current values; its meta "date" is
+#                                   the last ingested day
+#
+# A listing is one DEDUPE_COLUMNS key (brand, model, colour, memory, storage).
+# Ingesting a snapshot diffs it against latest.columns and writes only the
+# delta, so history is never rewritten. latest.columns is swapped in last and
+# is the commit point: a day is ingested once it is there, and an ingest that
+# died before that is simply redone. While the swap is under way the previous
+# latest.columns is read from latest.columns.old, so readers and a redone
+# ingest always see the last committed day. Days must be ingested in order.
+#
+# PriceHistory answers range queries: brand trends from the yearly rollups
+# (a few hundred rows per brand and year), a model's history from all day
+# partitions, loaded once into a model-sorted frame and extended as new days
+# arrive.
+
+HISTORY_PATH = os.environ.get("PRICE_HISTORY", "price_history")
+KEY_COLUMNS = DEDUPE_COLUMNS
+VALUE_COLUMNS = ["original_price", "discounted_price", "ratings", "rating_count"]
+DATE_PATTERN = re.compile(r"\d{4}-\d{2}-\d{2}")
+
+
+def _day(date):
+    # Days since 1970-01-01; stored as int32
+    return (datetime.date.fromisoformat(str(date)) - datetime.date(1970, 1, 1)).days
+
+
+def snapshot_date(source):
+    # The YYYY-MM-DD in a snapshot's file name, else today
+    match = DATE_PATTERN.search(os.path.basename(source.rstrip("/\\")))
+    return match.group(0) if match else datetime.date.today().isoformat()
+
+
+def _read(path, columns=None):
+    # A partition as a plain in-memory frame (text columns as str, not categorical)
+    data = read_store(path, columns)
+    for column in data.columns:
+        if isinstance(data[column].dtype, pd.CategoricalDtype):
+            data[column] = data[column].astype(object)
+    return data
+
+
+def _listings(data):
+    listings = data[KEY_COLUMNS + VALUE_COLUMNS].copy()
+    for column in KEY_COLUMNS:
+        # memory/storage stay numeric (GB); text keys lose any categorical dtype
+        numeric = pd.api.types.is_numeric_dtype(listings[column].dtype)
+        listings[column] = listings[column].astype("float64" if numeric else object)
+    for column in VALUE_COLUMNS:
+        listings[column] = pd.to_numeric(listings[column], errors="coerce").astype("float64")
+    return listings.drop_duplicates(subset=KEY_COLUMNS, keep="first", ignore_index=True)
+
+
+def diff_listings(previous, current):
+    # Rows of `current` that are new or changed, plus delisted rows of `previous`
+    merged = current.merge(previous, on=KEY_COLUMNS, how="outer", suffixes=("", "_old"), indicator=True)
+    changed = merged["_merge"] == "left_only"
+    for column in VALUE_COLUMNS:
+        new, old = merged[column], merged[column + "_old"]
+        changed |= (merged["_merge"] == "both") & ~((new == old) | (new.isna() & old.isna()))
+    removed = merged["_merge"] == "right_only"
+    delta = merged.loc[changed | removed, KEY_COLUMNS + VALUE_COLUMNS].copy()
+    delta.loc[removed[changed | removed].to_numpy(), VALUE_COLUMNS] = np.nan
+    delta["removed"] = removed[changed | removed].to_numpy().astype("int8")
+    return delta.reset_index(drop=True)
+
+
+def daily_rollup(listings, day, delta):
+    # One row per brand for the state of the catalogue on `day`
+    priced = listings.assign(
+        discount_pct=(listings["original_price"] - listings["discounted_price"]) / listings["original_price"] * 100)
+    grouped = priced.groupby("brand", sort=True)
+    rollup = pd.DataFrame({
+        "listings": grouped.size(),
+        "price_mean": grouped["discounted_price"].mean(),
+        "price_min": grouped["discounted_price"].min(),
+        "original_mean": grouped["original_price"].mean(),
+        "discount_pct": grouped["discount_pct"].mean(),
+        "rating_mean": grouped["ratings"].mean(),
+    })
+    rollup["changed"] = delta.groupby("brand").size().reindex(rollup.index, fill_value=0)
+    rollup = rollup.reset_index()
+    rollup.insert(0, "day", np.int32(day))
+    rollup["listings"] = rollup["listings"].astype("int32")
+    rollup["changed"] = rollup["changed"].astype("int32")
+    return rollup
+
+
+class HistoryStore:
+    def __init__(self, path=HISTORY_PATH):
+        self.path = path
+        self.days_path = os.path.join(path, "days")
+        self.rollups_path = os.path.join(path, "rollups")
+        self.latest_path = os.path.join(path, "latest.columns")
+
+    def latest(self):
+        # latest.columns, or latest.columns.old mid-swap; None before the first ingest
+        return committed_store(self.latest_path)
+
+    def last_date(self):
+        latest = self.latest()
+        if latest is None:
+            return None
+        return read_meta(latest).get("date")
+
+    def dates(self):
+        # Committed days, oldest first
+        last = self.last_date()
+        if last is None or not os.path.isdir(self.days_path):
+            return []
+        names = sorted(name[:-len(".columns")] for name in os.listdir(self.days_path) if name.endswith(".columns"))
+        return [name for name in names if name <= last]
+
+    def day_path(self, date):
+        return os.path.join(self.days_path, date + ".columns")
+
+    def rollup_path(self, year):
+        return os.path.join(self.rollups_path, "%s.columns" % year)
+
+    def ingest(self, source, date=None, log=print):
+        started = time.perf_counter()
+        date = date or snapshot_date(source)
+        day = _day(date)
+        latest = self.latest()
+        last = read_meta(latest).get("date") if latest is not None else None
+        if last is not None and date <= last:
+            raise ValueError("%s is not after the last ingested day %s; history is append-only" % (date, last))
+
+        current = _listings(load_catalogue(source, KEY_COLUMNS + VALUE_COLUMNS))
+        previous = _read(latest) if latest is not None else current.iloc[:0]
+        delta = diff_listings(previous[KEY_COLUMNS + VALUE_COLUMNS], current)
+
+        os.makedirs(self.days_path, exist_ok=True)
+        write_store(delta, self.day_path(date))
+        # Rewrites this year's rollup only (at most 366 days x brands); rows a
+        # crashed ingest of the same day may have left behind are replaced
+        os.makedirs(self.rollups_path, exist_ok=True)
+        year_path = self.rollup_path(date[:4])
+        rollup = daily_rollup(current, day, delta)
+        existing_path = committed_store(year_path)
+        if existing_path is not None:
+            existing = _read(existing_path)
+            rollup = pd.concat([existing[existing["day"] < day], rollup], ignore_index=True)
+        write_store(rollup, year_path)
+
+        write_store(current, self.latest_path, meta={"date": date})
+
+        stats = {
+            "source": source, "date": date, "listings": len(current), "changed": int((delta["removed"] == 0).sum()),
+            "removed": int(delta["removed"].sum()), "seconds": time.perf_counter() - started,
+        }
+        log("%(source)s @ %(date)s: %(listings)d listings, %(changed)d new/changed, %(removed)d delisted, "
+            "%(seconds).2fs" % stats)
+        return stats
+
+
+class PriceHistory:
+    # Read side, shared by the dashboard's /price_history page
+    def __init__(self, path=HISTORY_PATH):
+        self.store = HistoryStore(path)
+        self._lock = threading.Lock()
+        self._loaded = None
+        self._changes = None
+        self._models = {}
+        self._rollups = {}
+        self._search = None
+
+    def __bool__(self):
+        return self.store.last_date() is not None
+
+    def _refresh(self):
+        # Appends day partitions committed since the last call
+        last = self.store.last_date()
+        with self._lock:
+            if last == self._loaded:
+                return
+            dates = [date for date in self.store.dates() if self._loaded is None or date > self._loaded]
+            parts = [] if self._changes is None else [self._changes]
+            for date in dates:
+                part = _read(self.store.day_path(date))
+                part.insert(0, "day", np.int32(_day(date)))
+                parts.append(part)
+            changes = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(
+                columns=["day"] + KEY_COLUMNS + VALUE_COLUMNS + ["removed"])
+            # Model-sorted, so one model's history is a contiguous slice
+            changes = changes.sort_values(["model", "day"], kind="stable", ignore_index=True)
+            models = changes["model"].to_numpy()
+            bounds = np.flatnonzero(models[1:] != models[:-1]) + 1 if len(models) else np.array([], dtype=int)
+            starts = np.concatenate([[0], bounds]) if len(models) else bounds
+            stops = np.concatenate([bounds, [len(models)]]) if len(models) else bounds
+            self._models = {models[start]: (start, stop) for start, stop in zip(starts, stops)}
+            self._changes = changes
+            self._loaded = last
+            self._rollups = {}
+            self._search = None
+
+    def models(self):
+        self._refresh()
+        return sorted(self._models)
+
+    def model_search(self):
+        # Typeahead over every model with history, delisted ones included
+        self._refresh()
+        if self._search is None:
+            self._search = ModelSearchIndex(list(self._models))
+        return self._search
+
+    def brands(self):
+        # Brands listed on the last day, most listings first
+        last = self.store.last_date()
+        trends = self.brand_trends(last, last) if last else pd.DataFrame()
+        return [] if trends.empty else list(trends.sort_values("listings", ascending=False)["brand"])
+
+    def model_history(self, model, start=None, end=None):
+        # Daily series per listing of `model` (colour/memory/storage variant) from
+        # start to end (ISO dates), each value carried forward from its last change
+        self._refresh()
+        bounds = self._models.get(model)
+        if bounds is None:
+            return pd.DataFrame(columns=["date", "variant"] + VALUE_COLUMNS)
+        changes = self._changes.iloc[bounds[0]:bounds[1]]
+        first_day = _day(start) if start else int(changes["day"].min())
+        last_day = _day(end) if end else _day(self._loaded)
+        days = np.arange(first_day, last_day + 1, dtype="int32")
+        if not len(days):
+            return pd.DataFrame(columns=["date", "variant"] + VALUE_COLUMNS)
+        variant = (changes["colour"].astype(str) + " " + changes["memory"].map("{:g}".format) + "/"
+                   + changes["storage"].map("{:g}".format) + " GB")
+        series = []
+        for name, rows in changes.assign(variant=variant).groupby("variant", sort=True):
+            # Last change on or before each day; changes before `start` seed the first value
+            positions = np.searchsorted(rows["day"].to_numpy(), days, side="right") - 1
+            known = positions >= 0
+            values = rows[VALUE_COLUMNS].to_numpy()[np.where(known, positions, 0)]
+            values[~known] = np.nan
+            frame = pd.DataFrame(values, columns=VALUE_COLUMNS)
+            frame.insert(0, "variant", name)
+            frame.insert(0, "date", pd.to_datetime(days, unit="D"))
+            series.append(frame.dropna(subset=["discounted_price"]))
+        return pd.concat(series, ignore_index=True)
+
+    def _year_rollup(self, year):
+        rollup = self._rollups.get(year)
+        if rollup is None:
+            path = committed_store(self.store.rollup_path(year))
+            rollup = _read(path) if path is not None else None
+            self._rollups[year] = rollup
+        return rollup
+
+    def brand_trends(self, start=None, end=None, brands=None):
+        # Rollup rows (one per brand and day) in [start, end], read from the
+        # yearly partitions the range touches
+        self._refresh()
+        dates = self.store.dates()
+        if not dates:
+            return pd.DataFrame()
+        start, end = start or dates[0], end or dates[-1]
+        parts = []
+        for year in range(int(start[:4]), int(end[:4]) + 1):
+            rollup = self._year_rollup(year)
+            if rollup is None:
+                continue
+            days = rollup["day"].to_numpy()
+            parts.append(rollup.iloc[np.searchsorted(days, _day(start)):np.searchsorted(days, _day(end), side="right")])
+        if not parts:
+            return pd.DataFrame()
+        trends = pd.concat(parts, ignore_index=True)
+        if brands:
+            trends = trends[trends["brand"].isin(brands)]
+        trends.insert(0, "date", pd.to_datetime(trends.pop("day"), unit="D"))
+        return trends
+
+    def stats(self):
+        dates = self.store.dates()
+        return {"path": self.store.path, "days": len(dates), "first": dates[0] if dates else None,
+                "last": dates[-1] if dates else None}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Daily price history of the Flipkart catalogue")
+    parser.add_argument("--path", default=HISTORY_PATH)
+    commands = parser.add_subparsers(dest="command", required=True)
+    ingest = commands.add_parser("ingest", help="append snapshots, oldest first")
+    ingest.add_argument("sources", nargs="+")
+    ingest.add_argument("--date", help="snapshot date (YYYY-MM-DD); default: from the file name, else today")
+    commands.add_parser("stats", help="ingested days")
+    args = parser.parse_args()
+
+    store = HistoryStore(args.path)
+    if args.command == "ingest":
+        if args.date and len(args.sources) > 1:
+            parser.error("--date applies to a single snapshot")
+        for source in sorted(args.sources, key=lambda source: args.date or snapshot_date(source)):
+            try:
+                store.ingest(source, args.date)
+            except ValueError as exc:
+                parser.error(str(exc))
+    else:
+        print(PriceHistory(args.path).stats())
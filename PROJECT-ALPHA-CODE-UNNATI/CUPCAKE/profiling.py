@@ -0,0 +1,204 @@
+import cProfile
+import contextlib
+import functools
+import os
+import threading
+import time
+import tracemalloc
+
+from plotly.io.json import to_json_plotly
+
+# Opt-in instrumentation for the Dash dashboard, off unless DASHBOARD_METRICS=1.
+#
+#   DASHBOARD_METRICS=1                  time callbacks and figure stages, serve /metrics
+#   DASHBOARD_METRICS_MEMORY=1           also track allocation peaks with tracemalloc (slower)
+#   DASHBOARD_PROFILE_SLOW_MS=500        cProfile requests and keep the ones slower than this
+#   DASHBOARD_PROFILE_DIR=profiles       where the .prof dumps go (open with snakeviz / pstats)
+#
+# When disabled, instrument() returns the callback unchanged and stage() is a
+# shared no-op context, so the dashboard pays nothing for it.
+
+ENABLED = os.environ.get("DASHBOARD_METRICS") == "1"
+TRACE_MEMORY = ENABLED and os.environ.get("DASHBOARD_METRICS_MEMORY") == "1"
+SLOW_MS = float(os.environ.get("DASHBOARD_PROFILE_SLOW_MS", 0)) if ENABLED else 0
+PROFILE_DIR = os.environ.get("DASHBOARD_PROFILE_DIR", "profiles")
+
+SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BYTES_BUCKETS = (1e3, 1e4, 1e5, 1e6, 1e7, 1e8)
+
+HELP = {
+    "dashboard_callback_seconds": "Time spent inside a Dash callback",
+    "dashboard_callback_serialize_seconds": "Time to JSON-encode a callback's response",
+    "dashboard_callback_payload_bytes": "Size of a callback's JSON response",
+    "dashboard_callback_alloc_peak_bytes": "Peak Python allocations during a callback (tracemalloc)",
+    "dashboard_figure_stage_seconds": "Time per figure and stage (aggregate, figure, serialize)",
+    "dashboard_figure_payload_bytes": "Size of a figure's JSON as last serialized",
+    "dashboard_slow_profiles_total": "cProfile dumps written for slow callbacks",
+    "dashboard_figure_cache_hits": "Figure cache hits since start",
+    "dashboard_figure_cache_misses": "Figure cache misses (figure builds) since start",
+    "dashboard_dataset_version": "Version of the dataset currently served",
+}
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+
+def _labels(labels, extra=None):
+    pairs = sorted(labels.items()) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{%s}" % ",".join('%s="%s"' % (key, str(value).replace('"', '\\"')) for key, value in pairs)
+
+
+class Registry:
+    # Histograms, gauges and counters keyed by (name, labels), rendered in the
+    # Prometheus text exposition format
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms = {}
+        self.gauges = {}
+        self.counters = {}
+
+    def observe(self, name, value, buckets=SECONDS_BUCKETS, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self.histograms.setdefault(name, {})
+            if key not in series:
+                series[key] = Histogram(buckets)
+            series[key].observe(value)
+
+    def set(self, name, value, **labels):
+        with self._lock:
+            self.gauges.setdefault(name, {})[tuple(sorted(labels.items()))] = value
+
+    def inc(self, name, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + 1
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for kind, metrics in [("histogram", self.histograms), ("gauge", self.gauges), ("counter", self.counters)]:
+                for name, series in sorted(metrics.items()):
+                    lines.append("# HELP %s %s" % (name, HELP.get(name, name)))
+                    lines.append("# TYPE %s %s" % (name, kind))
+                    for key, value in sorted(series.items()):
+                        labels = dict(key)
+                        if kind != "histogram":
+                            lines.append("%s%s %s" % (name, _labels(labels), value))
+                            continue
+                        for bound, count in zip(value.buckets, value.counts):
+                            lines.append("%s_bucket%s %d" % (name, _labels(labels, ("le", bound)), count))
+                        lines.append("%s_bucket%s %d" % (name, _labels(labels, ("le", "+Inf")), value.count))
+                        lines.append("%s_sum%s %s" % (name, _labels(labels), value.sum))
+                        lines.append("%s_count%s %d" % (name, _labels(labels), value.count))
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+_NO_OP = contextlib.nullcontext()
+# cProfile can only watch one thread at a time; concurrent requests skip profiling
+_profile_lock = threading.Lock()
+
+
+class _Stage:
+    def __init__(self, figure, stage):
+        self.figure = figure
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc):
+        REGISTRY.observe("dashboard_figure_stage_seconds", time.perf_counter() - self.started,
+                         figure=self.figure, stage=self.stage)
+
+
+def stage(figure, name):
+    # with stage("bar_chart", "aggregate"): ...
+    return _Stage(figure, name) if ENABLED else _NO_OP
+
+
+def figure_payload(figure, payload):
+    if ENABLED:
+        REGISTRY.set("dashboard_figure_payload_bytes", len(payload), figure=figure)
+
+
+def _dump_profile(profile, name, elapsed):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    path = os.path.join(PROFILE_DIR, "%s-%d-%dms.prof" % (name, time.time() * 1000, elapsed * 1000))
+    profile.dump_stats(path)
+    REGISTRY.inc("dashboard_slow_profiles_total", callback=name)
+
+
+def instrument(name):
+    # Decorator for Dash callbacks; goes below @app.callback(...)
+    def decorate(fn):
+        if not ENABLED:
+            return fn
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            profile = None
+            if SLOW_MS and _profile_lock.acquire(blocking=False):
+                profile = cProfile.Profile()
+            if TRACE_MEMORY:
+                # Process-wide peak: concurrent requests inflate each other's numbers
+                tracemalloc.reset_peak()
+                baseline = tracemalloc.get_traced_memory()[0]
+            started = time.perf_counter()
+            try:
+                if profile is not None:
+                    profile.enable()
+                result = fn(*args, **kwargs)
+            finally:
+                if profile is not None:
+                    profile.disable()
+                elapsed = time.perf_counter() - started
+                if profile is not None:
+                    if elapsed * 1000 >= SLOW_MS:
+                        _dump_profile(profile, name, elapsed)
+                    _profile_lock.release()
+            REGISTRY.observe("dashboard_callback_seconds", elapsed, callback=name)
+            if TRACE_MEMORY:
+                peak = tracemalloc.get_traced_memory()[1] - baseline
+                REGISTRY.observe("dashboard_callback_alloc_peak_bytes", peak, BYTES_BUCKETS, callback=name)
+            # Dash encodes the response again after this; the second encode is the price of the size metric
+            started = time.perf_counter()
+            payload = to_json_plotly(result)
+            REGISTRY.observe("dashboard_callback_serialize_seconds", time.perf_counter() - started, callback=name)
+            REGISTRY.observe("dashboard_callback_payload_bytes", len(payload), BYTES_BUCKETS, callback=name)
+            return result
+        return wrapper
+    return decorate
+
+
+def register(server, collect=None):
+    # Adds /metrics to the Flask server when instrumentation is on. collect(registry),
+    # if given, refreshes point-in-time gauges just before each scrape.
+    if not ENABLED:
+        return
+    from flask import Response
+
+    if TRACE_MEMORY and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+    @server.route("/metrics")
+    def metrics():
+        if collect is not None:
+            collect(REGISTRY)
+        return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
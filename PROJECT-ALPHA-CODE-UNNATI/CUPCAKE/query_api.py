@@ -0,0 +1,285 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from urllib.parse import parse_qsl, urlsplit
+
+from flask import Blueprint, Response, abort, request
+from werkzeug.datastructures import MultiDict
+from werkzeug.exceptions import HTTPException
+
+# JSON query API over the live catalogue, for tools that need the numbers
+# behind the dashboards rather than the charts. QueryAPI(live).install(server)
+# mounts it at /api on the Dash server:
+#
+#   GET  /api/aggregates                  names of the aggregates below
+#   GET  /api/aggregates/<name>           one aggregate under the filters
+#                                         (distinct_models: brand filter only, from sketches)
+#   GET  /api/phones                      filtered listings; fields=brand,model,...
+#   GET  /api/phones/<model>              one model's row (its first listing)
+#   GET  /api/models?q=<text>             model names matching a search
+#   POST /api/batch                       {"queries": ["aggregates/brand_counts?brand=APPLE", ...]}
+#
+# Filters, as on /_figure/<name>.json: brand (repeatable), price=<low>,<high>
+# and rating=<minimum>. Aggregates come from the rollup cube, so their price
+# range applies to whole PRICE_STEP buckets; listings are filtered exactly.
+# Every list is paginated with page (from 0) and limit (at most MAX_LIMIT);
+# responses carry the total and the next page, or null after the last one.
+#
+# Each response body is kept in an LRU keyed by dataset version and query, and
+# concurrent misses for one query are computed once. GET responses carry an
+# ETag, so with the Compressor installed a client that already has the answer
+# gets a 304. A batch answers up to MAX_BATCH queries from one dataset version
+# in one round trip, and its queries share each filter state's rollup.
+#
+# Latency target, 1M-row catalogue, 8 concurrent clients: p99 under 150 ms
+# when half the queries miss the LRU, under 50 ms once they are cached. An
+# uncached query takes 0.5-15 ms on its own, so the tail is mostly queueing
+# behind other requests (on one core: p99 about 100 ms and 35 ms). bench.py
+# measures it ("query_api" in its results).
+
+CACHE_ENTRIES = int(os.environ.get("QUERY_CACHE_ENTRIES", 2048))
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+MAX_BATCH = 50
+PHONE_FIELDS = [
+    "brand", "model", "colour", "original_price", "discounted_price", "ratings", "memory", "storage",
+    "battery_capacity",
+]
+
+
+AGGREGATES = {
+    "brand_counts": lambda rollup: rollup.brand_counts().rename("count").reset_index(),
+    "battery_type_counts": lambda rollup: rollup.battery_type_counts().rename("count").reset_index(),
+    "mean_price_by_battery": lambda rollup: rollup.mean_price_by_battery().rename("mean_price").dropna().reset_index(),
+    # Long form: one row per (brand, battery_capacity) with a mean rating
+    "rating_pivot": lambda rollup: rollup.rating_pivot().stack().dropna().rename("mean_rating").reset_index(),
+    "price_histogram": lambda rollup: rollup.price_histogram().rename("count").reset_index(),
+    "rating_histogram": lambda rollup: rollup.rating_histogram_by_brand(),
+    # Filtered in QueryAPI.aggregate: quantiles need the listings, not the cube
+    "price_box": lambda rollup: rollup.price_box,
+    # Answered in QueryAPI.aggregate from the catalogue's sketches
+    "distinct_models": None,
+}
+
+
+def parse_filters(args):
+    # (brands, price_range, min_rating) from query arguments; aborts with 400 on bad values
+    price = args.get("price")
+    rating = args.get("rating")
+    try:
+        price_range = tuple(float(value) for value in price.split(",")) if price else None
+        min_rating = float(rating) if rating else None
+    except ValueError:
+        abort(400, "price must be <low>,<high> and rating a number")
+    if price_range is not None and len(price_range) != 2:
+        abort(400, "price must be <low>,<high>")
+    brands = tuple(sorted(args.getlist("brand"))) or None
+    return brands, price_range, min_rating
+
+
+def parse_page(args):
+    try:
+        page = int(args.get("page", 0))
+        limit = int(args.get("limit", DEFAULT_LIMIT))
+    except ValueError:
+        abort(400, "page and limit must be integers")
+    if page < 0 or not 1 <= limit <= MAX_LIMIT:
+        abort(400, "page must be >= 0 and limit between 1 and %d" % MAX_LIMIT)
+    return page, limit
+
+
+def records(frame):
+    # Rows of a frame as plain JSON values (NaN as null, whole floats as ints)
+    from schema import display_value
+    columns = list(frame.columns)
+    return [dict(zip(columns, map(display_value, row))) for row in frame.itertuples(index=False, name=None)]
+
+
+def paginated(frame, page, limit):
+    start = page * limit
+    return {
+        "total": len(frame),
+        "page": page,
+        "limit": limit,
+        "next_page": page + 1 if start + limit < len(frame) else None,
+        "rows": records(frame.iloc[start:start + limit]),
+    }
+
+
+class LRU:
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class QueryAPI:
+    def __init__(self, live, jobs=None, cache_entries=CACHE_ENTRIES):
+        from jobs import FigureJobs
+        self.live = live
+        # Only share() is used: misses are computed in the request's own thread
+        self.jobs = jobs if jobs is not None else FigureJobs(workers=1)
+        self.responses = LRU(cache_entries)
+        self.rollups = LRU(64)
+        self.batches = 0
+        self.blueprint = Blueprint("query_api", __name__)
+        self.blueprint.add_url_rule("/batch", "batch", self.batch, methods=["POST"])
+        self.blueprint.add_url_rule("/<path:path>", "query", self.get)
+        self.blueprint.register_error_handler(HTTPException, lambda exc: error_response(exc.code, exc.description))
+
+    def install(self, server, url_prefix="/api"):
+        server.register_blueprint(self.blueprint, url_prefix=url_prefix)
+        return self
+
+    # --- Queries ---
+    def filtered_rollup(self, snapshot, filters):
+        # The cube cells under one filter state, shared by every aggregate asking for them
+        if not any(filters):
+            return snapshot.rollup
+        key = (snapshot.fingerprint,) + filters
+        rollup = self.rollups.get(key)
+        if rollup is None:
+            rollup = self.jobs.share(("query-rollup",) + key, lambda: snapshot.rollup.filtered(*filters))
+            self.rollups.put(key, rollup)
+        return rollup
+
+    def aggregate(self, snapshot, name, args):
+        if name not in AGGREGATES:
+            abort(404, "unknown aggregate %r" % name)
+        filters = parse_filters(args)
+        page, limit = parse_page(args)
+        if name == "price_box" and any(filters):
+            return paginated(snapshot.cross_filter.price_box(*filters), page, limit)
+        if name == "distinct_models":
+            # HyperLogLog estimates per brand; the catalogue must have been ingested
+            if snapshot.rollup.sketches is None:
+                abort(404, "no sketches for this dataset; run ingest.py")
+            return paginated(snapshot.rollup.sketches.distinct_models("brand", filters[0]), page, limit)
+        return paginated(AGGREGATES[name](self.filtered_rollup(snapshot, filters)), page, limit)
+
+    def phones(self, snapshot, args):
+        filters = parse_filters(args)
+        page, limit = parse_page(args)
+        fields = args.get("fields")
+        fields = fields.split(",") if fields else PHONE_FIELDS
+        unknown = [field for field in fields if field not in snapshot.data.columns]
+        if unknown:
+            abort(400, "unknown fields: %s" % ", ".join(unknown))
+        # Only the requested page of rows is copied out of the catalogue
+        mask = snapshot.cross_filter.mask(*filters)
+        total = len(snapshot.data) if mask is None else int(mask.sum())
+        start = page * limit
+        if mask is None:
+            rows = snapshot.data.iloc[start:start + limit]
+        else:
+            rows = snapshot.data.iloc[mask.nonzero()[0][start:start + limit]]
+        return {
+            "total": total,
+            "page": page,
+            "limit": limit,
+            "next_page": page + 1 if start + limit < total else None,
+            "rows": records(rows[fields]),
+        }
+
+    def phone(self, snapshot, model):
+        if model not in snapshot.catalogue:
+            abort(404, "unknown model %r" % model)
+        return {"row": snapshot.catalogue.record(model)}
+
+    def models(self, snapshot, args):
+        page, limit = parse_page(args)
+        limit = min(limit, 50)
+        names, has_more = snapshot.model_search.search(args.get("q", ""), page=page, limit=limit)
+        return {"page": page, "limit": limit, "next_page": page + 1 if has_more else None, "rows": names}
+
+    def answer(self, snapshot, path, args):
+        # Response body for one query, as JSON bytes
+        parts = path.strip("/").split("/", 1)
+        if parts == ["aggregates"]:
+            payload = {"rows": sorted(AGGREGATES)}
+        elif parts[0] == "aggregates":
+            payload = self.aggregate(snapshot, parts[1], args)
+        elif parts == ["phones"]:
+            payload = self.phones(snapshot, args)
+        elif parts[0] == "phones":
+            payload = self.phone(snapshot, parts[1])
+        elif parts == ["models"]:
+            payload = self.models(snapshot, args)
+        else:
+            abort(404)
+        payload["dataset"] = {"version": snapshot.version, "fingerprint": snapshot.fingerprint}
+        return json.dumps(payload, separators=(",", ":")).encode()
+
+    def cached(self, snapshot, path, args):
+        # (etag, body); concurrent misses for the same query are computed once
+        key = (snapshot.fingerprint, path.strip("/"), tuple(sorted(args.items(multi=True))))
+        body = self.responses.get(key)
+        if body is None:
+            body = self.jobs.share(("query",) + key, lambda: self.answer(snapshot, path, args))
+            self.responses.put(key, body)
+        return hashlib.sha1(repr(key).encode()).hexdigest()[:20], body
+
+    # --- Routes ---
+    def get(self, path):
+        etag, body = self.cached(self.live.current(), path, request.args)
+        response = Response(body, mimetype="application/json")
+        response.set_etag(etag)
+        return response
+
+    def batch(self):
+        queries = (request.get_json(silent=True) or {}).get("queries")
+        if not isinstance(queries, list) or not 1 <= len(queries) <= MAX_BATCH:
+            return error_response(400, "expected {\"queries\": [...]} with 1 to %d queries" % MAX_BATCH)
+        self.batches += 1
+        snapshot = self.live.current()
+        results = []
+        for query in queries:
+            try:
+                if not isinstance(query, str):
+                    abort(400, "each query must be a path such as aggregates/brand_counts?brand=APPLE")
+                url = urlsplit(query)
+                path = url.path.split("/api/", 1)[-1]
+                _, body = self.cached(snapshot, path, MultiDict(parse_qsl(url.query)))
+                results.append(b'{"status":200,"body":' + body + b"}")
+            except HTTPException as exc:
+                results.append(json.dumps({"status": exc.code, "error": exc.description}).encode())
+        dataset = json.dumps({"version": snapshot.version, "fingerprint": snapshot.fingerprint},
+                             separators=(",", ":")).encode()
+        return Response(b'{"dataset":' + dataset + b',"results":[' + b",".join(results) + b"]}",
+                        mimetype="application/json")
+
+    def stats(self):
+        return {
+            "cached": len(self.responses),
+            "hits": self.responses.hits,
+            "misses": self.responses.misses,
+            "batches": self.batches,
+        }
+
+
+def error_response(status, message):
+    return Response(json.dumps({"error": message}), status=status, mimetype="application/json")
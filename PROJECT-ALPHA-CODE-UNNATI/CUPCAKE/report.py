@@ -0,0 +1,297 @@
+import argparse
+import hashlib
+import html
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import plotly.io as pio
+import plotly.offline
+
+from datastore import load_catalogue
+from figures import FIGURE_BUILDERS, FIGURE_TITLES, build_graph_figures
+from live_data import source_fingerprint
+from rollup import PRICE_STEP, load_rollup
+
+try:
+    import kaleido  # noqa: F401  (plotly's static image engine)
+except ImportError:  # optional: no PNG export
+    kaleido = None
+
+# Headless export of the /graph_analysis charts and their insight statistics.
+#
+#   python report.py cleaned_data.csv
+#   python report.py snapshots/*.csv --output reports --formats html,json,png --workers 8
+#
+# Each argument is one dataset snapshot (a CSV, a directory of shards or a
+# glob, as for ingest.py); snapshots are rendered in parallel, one process
+# each. A snapshot's report goes to <output>/<snapshot name>/:
+#
+#   index.html        the seven charts with their insights (plotly.js shared from <output>/)
+#   <chart>.json      figure JSON, loadable with plotly.io.from_json
+#   <chart>.png       only with the kaleido package installed
+#   insights.json     the statistics behind the insight texts
+#   manifest.json     content hashes of all of the above
+#
+# Reruns are incremental. A snapshot whose data fingerprint and code (see code_version) are
+# unchanged is skipped without being loaded; otherwise each chart's figure
+# JSON is hashed and its files are only rewritten when the hash changed.
+
+REPORT_COLUMNS = ["brand", "discounted_price", "ratings", "battery_capacity", "battery_type"]
+FORMATS = ["html", "json", "png"]
+MANIFEST = "manifest.json"
+
+
+def code_version():
+    # Source of every module from this directory that is imported here: the data
+    # path (datastore, cleaning, specs, schema, rollup) as well as the figures and
+    # this file. Changes to any of them re-render every snapshot.
+    here = os.path.dirname(os.path.abspath(__file__))
+    files = sorted({
+        os.path.abspath(module.__file__) for module in list(sys.modules.values())
+        if getattr(module, "__file__", None) and module.__file__.endswith(".py")
+        and os.path.dirname(os.path.abspath(module.__file__)) == here
+    })
+    sha = hashlib.sha1()
+    for path in files:
+        sha.update(os.path.basename(path).encode())
+        with open(path, "rb") as f:
+            sha.update(f.read())
+    return sha.hexdigest()[:16]
+
+
+def snapshot_name(source):
+    return os.path.splitext(os.path.basename(source.rstrip("/\\")))[0].replace("*", "_")
+
+
+def _share(part, total):
+    return round(100.0 * part / total, 1) if total else None
+
+
+def insight_stats(data, rollup):
+    # Per chart: the numbers the dashboard's "Insights" paragraphs talk about
+    brands = rollup.brand_counts()
+    listings = int(brands.sum())
+    top = [{"brand": brand, "listings": int(count), "share_pct": _share(count, listings)}
+           for brand, count in brands.head(3).items()]
+
+    pivot = rollup.rating_pivot().stack()
+    best = pivot.idxmax() if len(pivot) else None
+
+    prices = data["discounted_price"].to_numpy(dtype="float64", na_value=np.nan)
+    ratings = data["ratings"].to_numpy(dtype="float64", na_value=np.nan)
+    rated = ~np.isnan(prices) & ~np.isnan(ratings)
+    high = rated & (ratings >= 4.5)
+    correlation = np.corrcoef(prices[rated], ratings[rated])[0, 1] if rated.sum() > 1 else np.nan
+
+    histogram = rollup.price_histogram()
+    priced = int(histogram.sum())
+    below = int(histogram[histogram.index < 20000].sum())
+
+    battery_prices = rollup.mean_price_by_battery().dropna()
+    battery_types = rollup.battery_type_counts()
+    boxes = rollup.price_box.sort_values("median")
+
+    return {
+        "bar_chart": {
+            "listings": listings,
+            "brands": int(len(brands)),
+            "top_brands": top,
+            "brands_under_1pct": int((brands < 0.01 * listings).sum()),
+        },
+        "heatmap": {
+            "mean_rating": round(float(np.nanmean(ratings)), 2) if rated.any() else None,
+            "best_cell": None if best is None else {
+                "brand": best[0], "battery_capacity": float(best[1]), "mean_rating": round(float(pivot[best]), 2)},
+        },
+        "scatter_plot": {
+            "price_rating_correlation": None if np.isnan(correlation) else round(float(correlation), 3),
+            "rated_4_5_plus": int(high.sum()),
+            "rated_4_5_plus_below_40000_pct": _share((high & (prices < 40000)).sum(), high.sum()),
+        },
+        "histogram": {
+            "priced_listings": priced,
+            "below_20000_pct": _share(below, priced),
+            "busiest_price_bucket": None if histogram.empty else [
+                float(histogram.idxmax()), float(histogram.idxmax() + PRICE_STEP)],
+        },
+        "line_chart": {
+            "highest_avg_price_battery": None if battery_prices.empty else float(battery_prices.idxmax()),
+            "highest_avg_price": None if battery_prices.empty else round(float(battery_prices.max()), 2),
+        },
+        "pie_chart": {
+            "battery_types": {str(kind): _share(count, battery_types.sum()) for kind, count in battery_types.items()},
+        },
+        "box_plot": {
+            "highest_median_price": None if boxes.empty else {
+                "brand": boxes.iloc[-1]["brand"], "median": float(boxes.iloc[-1]["median"])},
+            "lowest_median_price": None if boxes.empty else {
+                "brand": boxes.iloc[0]["brand"], "median": float(boxes.iloc[0]["median"])},
+        },
+    }
+
+
+def insight_text(name, stats):
+    # One line per chart, in the tone of the dashboard's insight paragraphs
+    if name == "bar_chart" and stats["top_brands"]:
+        leaders = ", ".join("%s (%.1f%%)" % (b["brand"], b["share_pct"]) for b in stats["top_brands"])
+        return "%d listings across %d brands; the largest are %s. %d brands hold under 1%% each." % (
+            stats["listings"], stats["brands"], leaders, stats["brands_under_1pct"])
+    if name == "heatmap" and stats["best_cell"]:
+        cell = stats["best_cell"]
+        return "Mean rating %.2f. Best brand/battery combination: %s at %d mAh (%.2f)." % (
+            stats["mean_rating"], cell["brand"], cell["battery_capacity"], cell["mean_rating"])
+    if name == "scatter_plot" and stats["price_rating_correlation"] is not None:
+        return "Price/rating correlation %.3f; %s%% of the phones rated 4.5+ cost under INR 40,000." % (
+            stats["price_rating_correlation"], stats["rated_4_5_plus_below_40000_pct"])
+    if name == "histogram" and stats["busiest_price_bucket"]:
+        return "%s%% of listings are priced below INR 20,000; the busiest range is INR %d-%d." % (
+            stats["below_20000_pct"], *stats["busiest_price_bucket"])
+    if name == "line_chart" and stats["highest_avg_price_battery"] is not None:
+        return "Average price peaks at %d mAh (INR %.0f)." % (
+            stats["highest_avg_price_battery"], stats["highest_avg_price"])
+    if name == "pie_chart" and stats["battery_types"]:
+        return "; ".join("%s %s%%" % item for item in stats["battery_types"].items()) + "."
+    if name == "box_plot" and stats["highest_median_price"]:
+        return "Highest median price: %s (INR %.0f); lowest: %s (INR %.0f)." % (
+            stats["highest_median_price"]["brand"], stats["highest_median_price"]["median"],
+            stats["lowest_median_price"]["brand"], stats["lowest_median_price"]["median"])
+    return ""
+
+
+def _write(path, content):
+    # Atomic, so an interrupted run never leaves a half-written file behind a valid manifest
+    tmp = "%s.%d.tmp" % (path, os.getpid())
+    with open(tmp, "wb" if isinstance(content, bytes) else "w") as f:
+        f.write(content)
+    os.replace(tmp, path)
+
+
+def _read_manifest(directory):
+    try:
+        with open(os.path.join(directory, MANIFEST)) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def chart_files(name, formats):
+    return ["%s.%s" % (name, ext) for ext in formats if ext != "html"]
+
+
+def index_html(name, fingerprint, figures, insights, plotlyjs):
+    sections = []
+    for chart, fig in figures.items():
+        sections.append("<section><h2>%s</h2>%s<p>Insights: %s</p></section>" % (
+            html.escape(FIGURE_TITLES[chart]),
+            pio.to_html(fig, full_html=False, include_plotlyjs=False, div_id=chart),
+            html.escape(insight_text(chart, insights[chart]))))
+    return (
+        "<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\"><title>%s</title>"
+        "<script src=\"../%s\"></script></head>\n<body><h1>Flipkart Smartphone Dashboard: %s</h1>"
+        "<p>Dataset version %s</p>\n%s\n</body></html>\n" % (
+            html.escape(name), plotlyjs, html.escape(name), html.escape(fingerprint), "\n".join(sections)))
+
+
+def render_snapshot(source, output, formats, code, plotlyjs, force=False):
+    # Runs in a worker process; returns a summary for the log
+    started = time.perf_counter()
+    name = snapshot_name(source)
+    directory = os.path.join(output, name)
+    fingerprint = source_fingerprint(source)
+    manifest = _read_manifest(directory)
+    expected = ["index.html"] if "html" in formats else []
+    expected += [f for chart in FIGURE_BUILDERS for f in chart_files(chart, formats)] + ["insights.json"]
+    if (not force and manifest.get("fingerprint") == fingerprint and manifest.get("code") == code
+            and set(formats) <= set(manifest.get("formats", []))
+            and all(os.path.exists(os.path.join(directory, f)) for f in expected)):
+        return {"source": source, "status": "unchanged", "written": 0, "seconds": time.perf_counter() - started}
+
+    os.makedirs(directory, exist_ok=True)
+    data = load_catalogue(source, REPORT_COLUMNS)
+    rollup = load_rollup(source)
+    figures = build_graph_figures(data, rollup)
+    insights = insight_stats(data, rollup)
+
+    old_hashes = manifest.get("charts", {}) if manifest.get("code") == code else {}
+    hashes, written = {}, 0
+    for chart, fig in figures.items():
+        payload = pio.to_json(fig, validate=False)
+        hashes[chart] = hashlib.sha1(payload.encode()).hexdigest()
+        files = chart_files(chart, formats)
+        if not force and old_hashes.get(chart) == hashes[chart] and all(
+                os.path.exists(os.path.join(directory, f)) for f in files):
+            continue
+        if "json" in formats:
+            _write(os.path.join(directory, chart + ".json"), payload)
+        if "png" in formats:
+            fig.write_image(os.path.join(directory, chart + ".png"), width=1200, height=600)
+        written += 1
+
+    insights_json = json.dumps(insights, indent=2, sort_keys=True, default=str)
+    insights_hash = hashlib.sha1(insights_json.encode()).hexdigest()
+    page_changed = force or written or insights_hash != manifest.get("insights") or hashes != old_hashes
+    _write(os.path.join(directory, "insights.json"), insights_json)
+    if "html" in formats and (page_changed or not os.path.exists(os.path.join(directory, "index.html"))):
+        _write(os.path.join(directory, "index.html"), index_html(name, fingerprint, figures, insights, plotlyjs))
+    _write(os.path.join(directory, MANIFEST), json.dumps({
+        "source": source, "fingerprint": fingerprint, "code": code, "formats": formats,
+        "charts": hashes, "insights": insights_hash,
+    }, indent=2))
+    return {"source": source, "status": "rendered", "written": written, "seconds": time.perf_counter() - started}
+
+
+def write_plotlyjs(output):
+    # One copy of plotly.js shared by every snapshot's index.html
+    name = "plotly-%s.min.js" % plotly.offline.get_plotlyjs_version()
+    path = os.path.join(output, name)
+    if not os.path.exists(path):
+        _write(path, plotly.offline.get_plotlyjs())
+    return name
+
+
+def export(sources, output="reports", formats=("html", "json"), workers=None, force=False, log=print):
+    formats = [f for f in FORMATS if f in formats]
+    if "png" in formats and kaleido is None:
+        log("kaleido is not installed; skipping PNG export")
+        formats.remove("png")
+    names = [snapshot_name(source) for source in sources]
+    if len(set(names)) != len(names):
+        raise ValueError("snapshots must have distinct file/directory names: %s" % ", ".join(sources))
+    os.makedirs(output, exist_ok=True)
+    plotlyjs = write_plotlyjs(output)
+    code = code_version()
+
+    started = time.perf_counter()
+    results = []
+    with ProcessPoolExecutor(workers) as pool:
+        jobs = {pool.submit(render_snapshot, source, output, formats, code, plotlyjs, force): source
+                for source in sources}
+        for job in as_completed(jobs):
+            result = job.result()
+            results.append(result)
+            log("%(source)s: %(status)s, %(written)d charts written, %(seconds).2fs" % result)
+    log("%d snapshots (%d unchanged) in %.2fs -> %s" % (
+        len(results), sum(r["status"] == "unchanged" for r in results), time.perf_counter() - started, output))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the graph analysis charts and insights of dataset snapshots")
+    parser.add_argument("sources", nargs="*", default=["cleaned_data.csv"])
+    parser.add_argument("--output", default="reports")
+    parser.add_argument("--formats", default="html,json", help="comma-separated subset of %s" % ",".join(FORMATS))
+    parser.add_argument("--workers", type=int, default=None, help="processes (default: all cores)")
+    parser.add_argument("--force", action="store_true", help="re-render even unchanged snapshots and charts")
+    args = parser.parse_args()
+    formats = args.formats.split(",")
+    unknown = set(formats) - set(FORMATS)
+    if unknown:
+        parser.error("unknown format(s): %s" % ", ".join(sorted(unknown)))
+    try:
+        export(args.sources, args.output, formats, args.workers, args.force)
+    except ValueError as exc:
+        parser.error(str(exc))
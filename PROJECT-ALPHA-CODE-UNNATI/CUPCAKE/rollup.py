@@ -0,0 +1,152 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from datastore import is_fresh, load_catalogue, read_store, store_path, write_store
+from sketches import CatalogueSketches
+
+# Pre-aggregated rollup of the catalogue, computed once per dataset version.
+#
+# The cube has one row per non-empty (brand, battery_capacity, price_bucket,
+# battery_type, rating_bucket) cell with additive statistics (row count,
+# price/rating sums and non-missing counts), so any chart grouping by a subset
+# of those dimensions is a small groupby over cells instead of over listings.
+# Quantiles do not add up across cells, so the per-brand price box statistics
+# are kept in a second table next to the cube; ingest also saves quantile and
+# distinct-count sketches (sketches.py) for the approximate statistics mode.
+
+PRICE_STEP = 5000
+RATING_STEP = 0.1
+DIMENSIONS = ["brand", "battery_capacity", "price_bucket", "battery_type", "rating_bucket"]
+ROLLUP_COLUMNS = ["brand", "battery_capacity", "battery_type", "discounted_price", "ratings"]
+
+
+def _cells(data):
+    price = data["discounted_price"].astype("float64")
+    rating = data["ratings"].astype("float64")
+    return pd.DataFrame({
+        "brand": data["brand"],
+        "battery_capacity": data["battery_capacity"],
+        "price_bucket": price // PRICE_STEP * PRICE_STEP,
+        "battery_type": data["battery_type"],
+        "rating_bucket": (rating / RATING_STEP).round() * RATING_STEP,
+        "price": price,
+        "rating": rating,
+    })
+
+
+def build_cube(data):
+    return _cells(data).groupby(DIMENSIONS, observed=True, dropna=False).agg(
+        count=("price", "size"),
+        price_sum=("price", "sum"),
+        price_n=("price", "count"),
+        rating_sum=("rating", "sum"),
+        rating_n=("rating", "count"),
+    ).reset_index()
+
+
+def combine_cubes(cubes):
+    # Cube cells are additive, so cubes of separate chunks merge by summing matching cells
+    cubes = [cube.astype({"brand": object, "battery_type": object}) for cube in cubes]
+    return pd.concat(cubes, ignore_index=True).groupby(DIMENSIONS, dropna=False).sum().reset_index()
+
+
+def box_stats(values):
+    # Tukey box statistics of one array of prices (used for filtered per-brand boxes)
+    values = values[~np.isnan(values)]
+    if not len(values):
+        return None
+    q1, median, q3 = np.quantile(values, [0.25, 0.5, 0.75])
+    iqr = q3 - q1
+    inside = values[(values >= q1 - 1.5 * iqr) & (values <= q3 + 1.5 * iqr)]
+    return {"q1": q1, "median": median, "q3": q3, "lowerfence": inside.min(), "upperfence": inside.max(), "count": len(values)}
+
+
+def _price_box(data):
+    # Tukey box statistics of discounted_price per brand
+    prices = data[["brand", "discounted_price"]].dropna().astype({"discounted_price": "float64"})
+    grouped = prices.groupby("brand", observed=True)["discounted_price"]
+    box = grouped.quantile([0.25, 0.5, 0.75]).unstack()
+    box.columns = ["q1", "median", "q3"]
+    iqr = box["q3"] - box["q1"]
+    low = prices["brand"].map(box["q1"] - 1.5 * iqr).astype("float64")
+    high = prices["brand"].map(box["q3"] + 1.5 * iqr).astype("float64")
+    inside = prices[(prices["discounted_price"] >= low) & (prices["discounted_price"] <= high)]
+    fences = inside.groupby("brand", observed=True)["discounted_price"].agg(["min", "max"])
+    box["lowerfence"] = fences["min"]
+    box["upperfence"] = fences["max"]
+    box["count"] = grouped.size()
+    return box.reset_index()
+
+
+class Rollup:
+    def __init__(self, cube, price_box, sketches=None):
+        self.cube = cube
+        self.price_box = price_box
+        self.sketches = sketches
+
+    @classmethod
+    def build(cls, data, cube=None, sketches=None):
+        # `cube` may be passed in when it was already accumulated chunk by chunk
+        return cls(build_cube(data) if cube is None else cube, _price_box(data), sketches)
+
+    def save(self, path):
+        write_store(self.cube, os.path.join(path, "rollup"))
+        write_store(self.price_box, os.path.join(path, "price_box"))
+        if self.sketches is not None:
+            self.sketches.save(os.path.join(path, "sketches"))
+
+    @classmethod
+    def load(cls, path):
+        sketches_path = os.path.join(path, "sketches")
+        sketches = CatalogueSketches.load(sketches_path) if os.path.exists(sketches_path) else None
+        return cls(read_store(os.path.join(path, "rollup")), read_store(os.path.join(path, "price_box")), sketches)
+
+    def filtered(self, brands=None, price_range=None, min_rating=None, price_box=None):
+        # Cells matching the dashboard filters. Exact as long as the price range
+        # is a half-open [low, high) on PRICE_STEP boundaries and ratings have one decimal.
+        keep = np.ones(len(self.cube), dtype=bool)
+        if brands:
+            keep &= self.cube["brand"].isin(brands).to_numpy()
+        if price_range:
+            low, high = price_range
+            buckets = self.cube["price_bucket"].to_numpy()
+            keep &= (buckets >= low) & (buckets < high)
+        if min_rating:
+            keep &= self.cube["rating_bucket"].to_numpy() >= min_rating - 1e-6
+        return Rollup(self.cube[keep], self.price_box if price_box is None else price_box, self.sketches)
+
+    # --- Queries used by the charts ---
+    def _sum(self, by, columns):
+        return self.cube.groupby(by, observed=True)[columns].sum()
+
+    def brand_counts(self):
+        return self._sum("brand", "count").sort_values(ascending=False)
+
+    def battery_type_counts(self):
+        return self._sum("battery_type", "count").sort_values(ascending=False)
+
+    def mean_price_by_battery(self):
+        sums = self._sum("battery_capacity", ["price_sum", "price_n"])
+        return sums["price_sum"] / sums["price_n"].replace(0, np.nan)
+
+    def rating_pivot(self):
+        # Mean rating, brand x battery_capacity
+        sums = self._sum(["brand", "battery_capacity"], ["rating_sum", "rating_n"])
+        return (sums["rating_sum"] / sums["rating_n"].replace(0, np.nan)).unstack("battery_capacity")
+
+    def price_histogram(self):
+        return self._sum("price_bucket", "count").sort_index()
+
+    def rating_histogram_by_brand(self):
+        counts = self._sum(["rating_bucket", "brand"], "count")
+        return counts[counts > 0].reset_index()
+
+
+def load_rollup(csv_path):
+    # Reads the rollup saved with the columnar store, or builds it from the catalogue
+    path = store_path(csv_path)
+    if is_fresh(path, csv_path) and os.path.exists(os.path.join(path, "rollup")):
+        return Rollup.load(path)
+    return Rollup.build(load_catalogue(csv_path, ROLLUP_COLUMNS))
@@ -0,0 +1,62 @@
+import os
+
+import numpy as np
+import plotly.express as px
+import plotly.graph_objects as go
+
+# Row-count thresholds for scatter rendering, overridable per call or through the environment:
+#   up to WEBGL_ROWS       plain SVG markers, as before
+#   up to DENSITY_ROWS     the same points drawn as a WebGL (scattergl) trace
+#   above DENSITY_ROWS     a stratified sample per colour group (brand) drawn with WebGL,
+#                          or, for a continuous colour, 2D bins computed on the server
+WEBGL_ROWS = int(os.environ.get("SCATTER_WEBGL_ROWS", 5000))
+DENSITY_ROWS = int(os.environ.get("SCATTER_DENSITY_ROWS", 200000))
+SAMPLE_ROWS = int(os.environ.get("SCATTER_SAMPLE_ROWS", 20000))
+DENSITY_BINS = 80
+
+
+def stratified_sample(data, group, budget, min_per_group=50, seed=0):
+    # Up to `budget` rows, split across groups in proportion to their size;
+    # small groups keep up to `min_per_group` rows so they stay visible
+    counts = data[group].value_counts()
+    counts = counts[counts > 0]
+    quota = np.maximum(np.ceil(counts * budget / len(data)), np.minimum(counts, min_per_group))
+    shuffled = data.iloc[np.random.default_rng(seed).permutation(len(data))]
+    rank = shuffled.groupby(group, observed=True).cumcount()
+    return shuffled[rank < shuffled[group].map(quota).astype(float)]
+
+
+def density_figure(data, x, y, title=None, labels=None, colorscale="Viridis", bins=DENSITY_BINS):
+    labels = labels or {}
+    points = data[[x, y]].dropna()
+    counts, x_edges, y_edges = np.histogram2d(points[x], points[y], bins=bins)
+    z = np.where(counts > 0, counts, np.nan).T
+    fig = go.Figure(data=go.Heatmap(
+        z=z,
+        x=(x_edges[:-1] + x_edges[1:]) / 2,
+        y=(y_edges[:-1] + y_edges[1:]) / 2,
+        colorscale=colorscale,
+        colorbar_title="Listings"
+    ))
+    fig.update_layout(title=title, xaxis_title=labels.get(x, x), yaxis_title=labels.get(y, y))
+    return fig
+
+
+def scatter_figure(data, x, y, color=None, discrete_color=True, webgl_rows=None, density_rows=None,
+                   sample_rows=None, **kwargs):
+    # Drop-in for px.scatter(data, x, y, color=..., **kwargs) that picks the rendering mode by row count
+    webgl_rows = WEBGL_ROWS if webgl_rows is None else webgl_rows
+    density_rows = DENSITY_ROWS if density_rows is None else density_rows
+    sample_rows = SAMPLE_ROWS if sample_rows is None else sample_rows
+    rows = len(data)
+
+    if rows <= webgl_rows:
+        return px.scatter(data, x=x, y=y, color=color, **kwargs)
+    if rows <= density_rows:
+        return px.scatter(data, x=x, y=y, color=color, render_mode="webgl", **kwargs)
+    if color is not None and discrete_color:
+        sample = stratified_sample(data, color, sample_rows)
+        title = "%s (sample of %s / %s listings)" % (kwargs.pop("title", ""), f"{len(sample):,}", f"{rows:,}")
+        return px.scatter(sample, x=x, y=y, color=color, render_mode="webgl", title=title, **kwargs)
+    colorscale = kwargs.get("color_continuous_scale") or "Viridis"
+    return density_figure(data, x, y, title=kwargs.get("title"), labels=kwargs.get("labels"), colorscale=colorscale)
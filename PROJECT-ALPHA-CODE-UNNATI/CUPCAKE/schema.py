@@ -0,0 +1,117 @@
+import math
+import sys
+
+import numpy as np
+import pandas as pd
+
+# Shared catalogue schema used by both dashboards.
+#
+# Text columns with few distinct values are held as pandas categoricals
+# (one small integer code per row instead of one Python string per row).
+# Numeric columns are downcast to the narrowest dtype that holds them:
+# integer columns with missing values fall back to float32.
+
+CATEGORY_COLUMNS = [
+    "brand", "colour", "battery_type", "memory", "storage", "processor", "rear_camera", "front_camera",
+    "processor_family",
+]
+
+NUMERIC_COLUMNS = {
+    "original_price": "integer",
+    "discounted_price": "integer",
+    "rating_count": "integer",
+    "reviews": "integer",
+    "battery_capacity": "integer",
+    "ratings": "float",
+    "display_size": "float",
+    # Parsed from the camera strings by specs.py
+    "rear_mp_total": "float",
+    "rear_mp_primary": "float",
+    "rear_lens_count": "integer",
+    "front_mp": "float",
+}
+
+# Fixed on-disk dtypes for stores written chunk by chunk (ingest.py), where the
+# narrowest dtype is not known until the last chunk has been read. float32 keeps
+# whole prices exact up to 16.7M; counts stay float64.
+STORAGE_DTYPES = {
+    "original_price": "float32",
+    "discounted_price": "float32",
+    "ratings": "float32",
+    "rating_count": "float64",
+    "reviews": "float64",
+    "display_size": "float32",
+    "battery_capacity": "float32",
+    "memory": "float32",
+    "storage": "float32",
+    "rear_mp_total": "float32",
+    "rear_mp_primary": "float32",
+    "rear_lens_count": "float32",
+    "front_mp": "float32",
+}
+
+# Bumped whenever cleaning adds or changes columns; stores written under an
+# older version are treated as stale (datastore.is_fresh)
+SCHEMA_VERSION = 2
+
+
+def _downcast(values, kind):
+    values = pd.to_numeric(values, errors="coerce", downcast=kind)
+    if kind == "integer" and pd.api.types.is_float_dtype(values.dtype):
+        values = pd.to_numeric(values, downcast="float")
+    return values
+
+
+def compact(data):
+    for column in data.columns:
+        if column in NUMERIC_COLUMNS:
+            data[column] = _downcast(data[column], NUMERIC_COLUMNS[column])
+        elif column in CATEGORY_COLUMNS:
+            if pd.api.types.is_numeric_dtype(data[column].dtype):
+                # e.g. memory/storage in cleaned_data.csv are already plain numbers
+                data[column] = _downcast(data[column], "integer")
+            else:
+                data[column] = data[column].astype("category")
+    return data
+
+
+def to_storage(data):
+    # Numeric columns to their STORAGE_DTYPES, everything else to text
+    for column in data.columns:
+        if column in STORAGE_DTYPES:
+            data[column] = data[column].astype(STORAGE_DTYPES[column])
+        else:
+            data[column] = data[column].astype(object)
+    return data
+
+
+def display_value(value):
+    # Plain Python value for tables: float32 noise rounded off, whole floats shown as ints
+    if isinstance(value, (float, np.floating)):
+        if math.isnan(value):
+            return None
+        value = round(float(value), 6)
+        return int(value) if value.is_integer() else value
+    if isinstance(value, np.integer):
+        return int(value)
+    return value
+
+
+def memory_report(before, after):
+    # Bytes per column before and after compaction, with the totals as a last row
+    report = pd.DataFrame({
+        "dtype_before": before.dtypes.astype(str),
+        "bytes_before": before.memory_usage(deep=True, index=False),
+        "dtype_after": after.dtypes.astype(str),
+        "bytes_after": after.memory_usage(deep=True, index=False),
+    })
+    report.loc["TOTAL"] = ["", report["bytes_before"].sum(), "", report["bytes_after"].sum()]
+    report["saved_%"] = (100 * (1 - report["bytes_after"] / report["bytes_before"])).round(1)
+    return report
+
+
+if __name__ == "__main__":
+    from cleaning import clean
+
+    raw = clean(pd.read_csv(sys.argv[1] if len(sys.argv) > 1 else "cleaned_data.csv"))
+    print(memory_report(raw, compact(raw.copy())).to_string())
@@ -0,0 +1,142 @@
+import hashlib
+import json
+import os
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process compute lock, entries are still shared
+    fcntl = None
+
+# Disk cache shared by every worker process of both apps (gunicorn workers of
+# dashboard.py, Streamlit sessions of app.py) on one machine.
+#
+# The catalogue itself needs no copy here: the columnar store (datastore.py) is
+# memory-mapped, so all workers read the same page-cache pages, and the rollup
+# is saved next to it. What workers used to recompute each is figure JSON; it
+# lives here as one file per entry:
+#
+#   <SHARED_CACHE_DIR>/<dataset version>/<sha1 of key>
+#
+# Keys always include the dataset version, so a reload never serves stale
+# figures. Entries expire SHARED_CACHE_TTL seconds after being written and the
+# least recently read ones are dropped once the cache exceeds
+# SHARED_CACHE_MAX_MB. Writes go through a temp file and os.replace(), so a
+# reader never sees a partial entry; a per-key flock makes concurrent misses
+# across processes compute once.
+
+CACHE_DIR = os.environ.get("SHARED_CACHE_DIR", ".shared_cache")
+TTL = float(os.environ.get("SHARED_CACHE_TTL", 6 * 3600))
+MAX_BYTES = int(float(os.environ.get("SHARED_CACHE_MAX_MB", 512)) * 2 ** 20)
+EVICT_INTERVAL = 60
+
+
+class SharedCache:
+    def __init__(self, path=CACHE_DIR, ttl=TTL, max_bytes=MAX_BYTES):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._last_evict = 0
+
+    def _entry_path(self, version, key):
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()
+        safe_version = "".join(char if char.isalnum() or char in "-_." else "_" for char in str(version))
+        return os.path.join(self.path, safe_version, digest)
+
+    def _read(self, path):
+        try:
+            stat = os.stat(path)
+            if time.time() - stat.st_mtime > self.ttl:
+                return None
+            with open(path, "rb") as f:
+                value = f.read()
+            # atime is the LRU clock (set explicitly: many filesystems mount noatime)
+            os.utime(path, (time.time(), stat.st_mtime))
+            return value
+        except FileNotFoundError:
+            return None
+
+    def get(self, version, key):
+        value = self._read(self._entry_path(version, key))
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def put(self, version, key, value):
+        path = self._entry_path(version, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = "%s.%d.tmp" % (path, os.getpid())
+        with open(tmp, "wb") as f:
+            f.write(value)
+        os.replace(tmp, path)
+        if time.time() - self._last_evict > EVICT_INTERVAL:
+            self.evict()
+
+    def get_or_compute(self, version, key, compute):
+        # compute() returns bytes; runs at most once per key across processes (where flock exists)
+        value = self.get(version, key)
+        if value is not None:
+            return value
+        path = self._entry_path(version, key)
+        if fcntl is None:
+            value = compute()
+            self.put(version, key, value)
+            return value
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                # Another process may have filled it while we waited for the lock
+                value = self._read(path)
+                if value is None:
+                    value = compute()
+                    self.put(version, key, value)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+        return value
+
+    def figure(self, version, key, build):
+        # A Plotly figure as the plain dict dcc.Graph / st.plotly_chart accept
+        import plotly.io as pio
+        payload = self.get_or_compute(version, key, lambda: pio.to_json(build(), validate=False).encode())
+        return json.loads(payload)
+
+    def evict(self):
+        # Expired entries first, then least recently read until under max_bytes
+        self._last_evict = time.time()
+        entries = []
+        for root, _, files in os.walk(self.path):
+            for name in files:
+                if name.endswith(".lock") or name.endswith(".tmp"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_atime, stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, _, size, _ in entries)
+        for atime, mtime, size, path in sorted(entries):
+            if self._last_evict - mtime <= self.ttl and total <= self.max_bytes:
+                continue
+            for stale in (path, path + ".lock"):
+                try:
+                    os.remove(stale)
+                except FileNotFoundError:
+                    pass
+            total -= size
+        # Version directories left empty by the above
+        for root, dirs, files in os.walk(self.path, topdown=False):
+            if root != self.path and not dirs and not files:
+                try:
+                    os.rmdir(root)
+                except OSError:
+                    pass
+        return total
+
+    def stats(self):
+        return {"path": self.path, "hits": self.hits, "misses": self.misses}
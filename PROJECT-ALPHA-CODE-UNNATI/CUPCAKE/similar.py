@@ -0,0 +1,52 @@
+import numpy as np
+
+# "Phones like this": k nearest models over normalized spec vectors.
+#
+# One vector per model (its first listing, as in CatalogueIndex), camera
+# megapixels from the parsed spec columns (specs.py). Features are
+# z-scored so a 1,000 INR price gap and a 1 GB RAM gap are weighed on the same
+# scale; prices are log-scaled first so budget and flagship phones spread
+# evenly. Missing values sit at the mean (0 after scaling). A query is one
+# float32 matrix-vector product plus an argpartition, a few milliseconds for a
+# million-listing catalogue.
+
+FEATURE_COLUMNS = [
+    "discounted_price", "ratings", "memory", "storage", "battery_capacity", "display_size",
+    "rear_mp_primary", "front_mp",
+]
+LOG_COLUMNS = ["discounted_price"]
+
+
+class SimilarPhones:
+    def __init__(self, catalogue, columns=FEATURE_COLUMNS):
+        self.models = np.array(catalogue.models(), dtype=object)
+        rows = catalogue.data.iloc[list(catalogue.positions.values())]
+        self.columns = [column for column in columns if column in rows.columns]
+        features = []
+        for column in self.columns:
+            values = rows[column].to_numpy(dtype="float64", na_value=np.nan)
+            if column in LOG_COLUMNS:
+                values = np.log1p(values)
+            std = np.nanstd(values)
+            values = (values - np.nanmean(values)) / (std if std > 0 else 1)
+            features.append(np.nan_to_num(values, nan=0.0))
+        self.vectors = np.column_stack(features).astype("float32") if features else np.zeros((len(self.models), 0), "float32")
+        # |a - b|^2 = |a|^2 - 2 a.b + |b|^2: one matrix-vector product per query
+        self.norms = np.einsum("ij,ij->i", self.vectors, self.vectors)
+        self.positions = {model: i for i, model in enumerate(self.models)}
+
+    def __len__(self):
+        return len(self.models)
+
+    def similar(self, model, k=5):
+        # [(model, distance)] of the k nearest other models, closest first; [] for unknown models
+        position = self.positions.get(model)
+        if position is None or len(self.models) < 2:
+            return []
+        query = self.vectors[position]
+        distances = self.norms - 2 * (self.vectors @ query) + self.norms[position]
+        distances[position] = np.inf
+        k = min(k, len(self.models) - 1)
+        nearest = np.argpartition(distances, k - 1)[:k]
+        nearest = nearest[np.argsort(distances[nearest], kind="stable")]
+        return [(self.models[i], float(np.sqrt(max(distances[i], 0)))) for i in nearest]
@@ -0,0 +1,356 @@
+import argparse
+import math
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+from datastore import read_store, write_store
+
+# Mergeable sketches of the catalogue, for an approximate statistics mode on
+# very large catalogues (APPROX_STATS=1).
+#
+# Means and counts need no sketch: the rollup cube (rollup.py) already holds
+# additive sums per brand x battery x price bucket x rating bucket, i.e. a
+# fixed-bin histogram that merges by addition. What does not add up across
+# cells are quantiles and distinct counts, so per brand and per battery
+# capacity this keeps:
+#
+#   KLL        price quantiles; normalized rank error about 2/SKETCH_K
+#   HyperLogLog distinct models; relative error about 1.04/sqrt(2**SKETCH_HLL_BITS)
+#
+# ingest.py folds each chunk into them as it streams, so the box plot's
+# quartiles no longer need every price of a brand read back after ingest,
+# and filtered boxes come from a few hundred weighted items per brand instead
+# of a pass over the brand's rows. Both sketches merge, so shards or new rows
+# can be sketched on their own and combined.
+#
+#   python sketches.py check cleaned_data.csv [--rank-error 0.01 --distinct-error 0.03]
+#
+# compares the stored sketches with exact results and exits non-zero when an
+# error bound is exceeded (by default RANK_ERROR_BOUND and DISTINCT_ERROR_BOUND);
+# test_sketches.py asserts the same bounds.
+
+SKETCH_K = int(os.environ.get("SKETCH_K", 200))
+HLL_BITS = int(os.environ.get("SKETCH_HLL_BITS", 14))
+MIN_HLL_BITS = 12
+MAX_HLL_BITS = 18
+# Error bounds checked by `sketches.py check` and test_sketches.py: worst rank
+# error of a quartile, and four standard errors of a distinct count
+RANK_ERROR_BOUND = 2 / SKETCH_K
+DISTINCT_ERROR_BOUND = 4 * 1.04 / math.sqrt(2 ** HLL_BITS)
+APPROXIMATE = os.environ.get("APPROX_STATS") == "1"
+SKETCH_DIMENSIONS = ["brand", "battery_capacity"]
+BOX_COLUMNS = ["brand", "q1", "median", "q3", "lowerfence", "upperfence", "count"]
+
+
+def weighted_quantiles(values, weights, qs):
+    # Smallest value whose cumulative weight reaches q of the total, for each q
+    order = np.argsort(values, kind="stable")
+    values = values[order]
+    cumulative = np.cumsum(weights[order])
+    positions = np.searchsorted(cumulative, np.asarray(qs) * cumulative[-1], side="left")
+    return values[np.minimum(positions, len(values) - 1)]
+
+
+class KLL:
+    # Karnin-Lang-Liberty quantile sketch: compactors of decreasing capacity,
+    # where an item at level h stands for 2**h inputs. A full level is sorted
+    # and every other item, from a random offset, moves up a level.
+    def __init__(self, k=SKETCH_K, seed=0):
+        self.k = k
+        self.levels = [np.empty(0)]
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+        self._rng = np.random.default_rng(seed)
+
+    def capacity(self, level):
+        return max(2, int(math.ceil(self.k * (2 / 3) ** (len(self.levels) - 1 - level))))
+
+    def update(self, values):
+        values = np.asarray(values, dtype="float64")
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return self
+        self.count += len(values)
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+        return self
+
+    def merge(self, other):
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress()
+        return self
+
+    def _compress(self):
+        while sum(map(len, self.levels)) > sum(self.capacity(level) for level in range(len(self.levels))):
+            level = next(level for level, items in enumerate(self.levels) if len(items) >= self.capacity(level))
+            if level == len(self.levels) - 1:
+                self.levels.append(np.empty(0))
+            items = np.sort(self.levels[level])
+            # An odd item out stays behind
+            keep = items[:1] if len(items) % 2 else items[:0]
+            items = items[len(keep):]
+            promoted = items[self._rng.integers(2)::2]
+            self.levels[level] = keep
+            self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+
+    def items(self):
+        # (values, weights) of everything retained
+        values = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(items), 2.0 ** level) for level, items in enumerate(self.levels)])
+        return values, weights
+
+    def quantiles(self, qs):
+        values, weights = self.items()
+        if not len(values):
+            return np.full(len(qs), np.nan)
+        return weighted_quantiles(values, weights, qs)
+
+
+def _sigma(x):
+    if x == 1:
+        return math.inf
+    y, z = 1.0, x
+    while True:
+        x *= x
+        previous, z = z, z + x * y
+        y += y
+        if z == previous:
+            return z
+
+
+def _tau(x):
+    if x == 0 or x == 1:
+        return 0.0
+    y, z = 1.0, 1 - x
+    while True:
+        x = math.sqrt(x)
+        y *= 0.5
+        previous, z = z, z - (1 - x) ** 2 * y
+        if z == previous:
+            return z / 3
+
+
+class HyperLogLog:
+    # Distinct count from 2**bits registers, each holding the longest run of
+    # leading zeros seen among the hashes routed to it
+    def __init__(self, bits=HLL_BITS, registers=None):
+        if not MIN_HLL_BITS <= bits <= MAX_HLL_BITS:
+            # At least 12: update() takes the rank from the float64 exponent of the
+            # 64 - bits hash tail, exact only up to 52 bits. At most 18: 256 KB per group.
+            raise ValueError("HyperLogLog bits must be between %d and %d" % (MIN_HLL_BITS, MAX_HLL_BITS))
+        self.bits = bits
+        self.registers = np.zeros(2 ** bits, dtype=np.uint8) if registers is None else registers
+
+    def update(self, values):
+        hashes = pd.util.hash_array(np.asarray(values, dtype=object))
+        tail_bits = 64 - self.bits
+        index = (hashes >> np.uint64(tail_bits)).astype(np.intp)
+        # Below 2**52 the float exponent is the exact bit length (0 for 0)
+        tail = (hashes & np.uint64((1 << tail_bits) - 1)).astype("float64")
+        rank = (tail_bits - np.frexp(tail)[1] + 1).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+        return self
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def estimate(self):
+        # Ertl's improved estimator (arXiv:1702.01284): unbiased from a few
+        # distinct values up, without the raw estimator's bump where it hands
+        # over from linear counting
+        m = len(self.registers)
+        q = 64 - self.bits
+        counts = np.bincount(self.registers, minlength=q + 2)
+        z = m * _tau(1 - counts[q + 1] / m)
+        for rank in range(q, 0, -1):
+            z = 0.5 * (z + counts[rank])
+        z += m * _sigma(counts[0] / m)
+        return int(round(m * m / (2 * math.log(2) * z)))
+
+
+class CatalogueSketches:
+    # A KLL of discounted_price and a HyperLogLog of model per brand and per battery capacity
+    def __init__(self, k=SKETCH_K, bits=HLL_BITS):
+        self.k = k
+        self.bits = bits
+        self.groups = {dimension: {} for dimension in SKETCH_DIMENSIONS}
+
+    @classmethod
+    def build(cls, data, **kwargs):
+        return cls(**kwargs).update(data)
+
+    def _group(self, dimension, key):
+        group = self.groups[dimension].get(key)
+        if group is None:
+            group = self.groups[dimension][key] = (KLL(self.k), HyperLogLog(self.bits))
+        return group
+
+    def update(self, data):
+        prices = data["discounted_price"].to_numpy(dtype="float64")
+        models = data["model"].to_numpy(dtype=object)
+        for dimension in SKETCH_DIMENSIONS:
+            for key, positions in data.groupby(dimension, observed=True, sort=False).indices.items():
+                prices_sketch, models_sketch = self._group(dimension, key)
+                prices_sketch.update(prices[positions])
+                models_sketch.update(models[positions])
+        return self
+
+    def merge(self, other):
+        for dimension, groups in other.groups.items():
+            for key, (prices_sketch, models_sketch) in groups.items():
+                mine = self._group(dimension, key)
+                mine[0].merge(prices_sketch)
+                mine[1].merge(models_sketch)
+        return self
+
+    # --- Queries ---
+    def price_box(self, brands=None, price_range=None):
+        # Per-brand Tukey box statistics, like rollup.Rollup.price_box; price_range
+        # is half-open and keeps the retained items inside it
+        rows = []
+        for brand in sorted(self.groups["brand"]) if brands is None else brands:
+            if brand not in self.groups["brand"]:
+                continue
+            sketch = self.groups["brand"][brand][0]
+            values, weights = sketch.items()
+            # The exact extremes, while no price range cuts them off
+            low_value, high_value = sketch.min, sketch.max
+            if price_range:
+                low, high = price_range
+                inside = (values >= low) & (values < high)
+                values, weights = values[inside], weights[inside]
+                low_value, high_value = -math.inf, math.inf
+            if not len(values):
+                continue
+            q1, median, q3 = weighted_quantiles(values, weights, [0.25, 0.5, 0.75])
+            iqr = q3 - q1
+            inside = values[(values >= q1 - 1.5 * iqr) & (values <= q3 + 1.5 * iqr)]
+            lowerfence = low_value if low_value >= q1 - 1.5 * iqr else inside.min()
+            upperfence = high_value if high_value <= q3 + 1.5 * iqr else inside.max()
+            rows.append({"brand": brand, "q1": q1, "median": median, "q3": q3,
+                         "lowerfence": lowerfence, "upperfence": upperfence, "count": int(weights.sum())})
+        return pd.DataFrame(rows, columns=BOX_COLUMNS)
+
+    def price_quantiles(self, dimension, qs=(0.25, 0.5, 0.75)):
+        return pd.DataFrame(
+            [sketch.quantiles(qs) for sketch, _ in self.groups[dimension].values()],
+            index=pd.Index(list(self.groups[dimension]), name=dimension), columns=list(qs),
+        ).sort_index()
+
+    def distinct_models(self, dimension="brand", groups=None):
+        keys = sorted(self.groups[dimension]) if groups is None else [g for g in groups if g in self.groups[dimension]]
+        return pd.DataFrame({
+            dimension: keys,
+            "distinct_models": [self.groups[dimension][key][1].estimate() for key in keys],
+        })
+
+    # --- Storage: three small column stores under `path` ---
+    def save(self, path):
+        items, groups, registers = [], [], []
+        for dimension, sketches in self.groups.items():
+            for key, (prices_sketch, models_sketch) in sketches.items():
+                for level, values in enumerate(prices_sketch.levels):
+                    items.append(pd.DataFrame({"dimension": dimension, "group": str(key), "level": level, "value": values}))
+                groups.append({"dimension": dimension, "group": str(key), "rows": prices_sketch.count,
+                               "min": prices_sketch.min, "max": prices_sketch.max,
+                               "levels": len(prices_sketch.levels)})
+                registers.append(models_sketch.registers)
+        meta = {"k": self.k, "bits": self.bits}
+        item_frame = pd.concat(items, ignore_index=True) if items else pd.DataFrame(
+            {"dimension": [], "group": [], "level": [], "value": []})
+        write_store(item_frame.astype({"level": "int8", "value": "float64"}), os.path.join(path, "items"), meta=meta)
+        write_store(pd.DataFrame(groups, columns=["dimension", "group", "rows", "min", "max", "levels"]),
+                    os.path.join(path, "groups"), meta=meta)
+        write_store(pd.DataFrame({"register": np.concatenate(registers) if registers else np.empty(0, np.uint8)}),
+                    os.path.join(path, "registers"), meta=meta)
+
+    @classmethod
+    def load(cls, path):
+        from datastore import read_meta
+        meta = read_meta(os.path.join(path, "groups"))
+        sketches = cls(meta["k"], meta["bits"])
+        groups = read_store(os.path.join(path, "groups"))
+        items = read_store(os.path.join(path, "items"))
+        registers = read_store(os.path.join(path, "registers"))["register"].to_numpy()
+        item_groups = items.groupby(["dimension", "group", "level"], sort=False).indices
+        values = items["value"].to_numpy()
+        width = 2 ** sketches.bits
+        for i, row in enumerate(groups.itertuples(index=False)):
+            # Group keys are stored as text; battery capacities are numbers
+            key = row.group if row.dimension == "brand" else float(row.group)
+            prices_sketch = KLL(sketches.k)
+            prices_sketch.levels = [
+                values[item_groups[(row.dimension, row.group, level)]] if (row.dimension, row.group, level) in item_groups
+                else np.empty(0)
+                for level in range(row.levels)
+            ]
+            prices_sketch.count, prices_sketch.min, prices_sketch.max = int(row.rows), row.min, row.max
+            models_sketch = HyperLogLog(sketches.bits, registers[i * width:(i + 1) * width].copy())
+            sketches.groups[row.dimension][key] = (prices_sketch, models_sketch)
+        return sketches
+
+
+def sketch_errors(sketches, data):
+    # Per group: worst quartile rank error and distinct-count relative error against `data`
+    rows = []
+    for dimension in SKETCH_DIMENSIONS:
+        for key, positions in data.groupby(dimension, observed=True).indices.items():
+            if key not in sketches.groups[dimension]:
+                continue
+            prices_sketch, models_sketch = sketches.groups[dimension][key]
+            exact = np.sort(data["discounted_price"].to_numpy(dtype="float64")[positions])
+            exact = exact[~np.isnan(exact)]
+            qs = [0.25, 0.5, 0.75]
+            if len(exact):
+                # Rank error: how far q is from the range of ranks the estimate
+                # holds among the exact prices (a range, since prices repeat)
+                estimated = prices_sketch.quantiles(qs)
+                below = np.searchsorted(exact, estimated, side="left") / len(exact)
+                upto = np.searchsorted(exact, estimated, side="right") / len(exact)
+                worst_rank = float(np.max(np.maximum(np.maximum(below - qs, np.subtract(qs, upto)), 0)))
+            else:
+                worst_rank = 0.0
+            distinct = data["model"].iloc[positions].nunique()
+            distinct_err = abs(models_sketch.estimate() - distinct) / distinct if distinct else 0.0
+            rows.append({"dimension": dimension, "group": key, "rows": len(positions),
+                         "rank_error": worst_rank, "distinct_error": distinct_err})
+    return pd.DataFrame(rows)
+
+
+def check(source, rank_error=RANK_ERROR_BOUND, distinct_error=DISTINCT_ERROR_BOUND):
+    # Stored sketches against exact results; returns the rows that exceed a bound
+    from datastore import store_path
+    path = store_path(source)
+    sketches = CatalogueSketches.load(os.path.join(path, "sketches"))
+    report = sketch_errors(sketches, read_store(path, ["brand", "battery_capacity", "model", "discounted_price"]))
+    failed = report[(report["rank_error"] > rank_error) | (report["distinct_error"] > distinct_error)]
+    return report, failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check catalogue sketches against exact statistics")
+    parser.add_argument("command", choices=["check"])
+    parser.add_argument("source", nargs="?", default="cleaned_data.csv")
+    parser.add_argument("--rank-error", type=float, default=RANK_ERROR_BOUND)
+    parser.add_argument("--distinct-error", type=float, default=DISTINCT_ERROR_BOUND)
+    args = parser.parse_args()
+    report, failed = check(args.source, args.rank_error, args.distinct_error)
+    print(report.round(4).to_string(index=False))
+    print("worst rank error %.4f (bound %.4f), worst distinct error %.4f (bound %.4f)" % (
+        report["rank_error"].max(), args.rank_error, report["distinct_error"].max(), args.distinct_error))
+    if len(failed):
+        print("%d groups outside the bounds" % len(failed))
+        sys.exit(1)
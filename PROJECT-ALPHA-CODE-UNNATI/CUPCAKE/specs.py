@@ -0,0 +1,123 @@
+import functools
+import re
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+# Typed spec columns parsed out of the free-text camera and processor fields.
+#
+#   rear_camera "50 MP + 2 MP Depth Lens + AI Lens" -> rear_mp_total 52, rear_mp_primary 50, rear_lens_count 3
+#   front_camera " 16MP + 8MP Dual"                 -> front_mp 16
+#   processor "Qualcomm Snapdragon 695 5G"          -> processor_family "Snapdragon"
+#
+# The raw strings repeat heavily (a few hundred distinct values per column in
+# a catalogue of any size), so parse_table() parses each distinct string once,
+# through an lru_cache shared across chunks, and broadcasts the results back
+# with the factorize codes. The cache holds PARSE_CACHE_SIZE strings, so a
+# long-running server that keeps reloading new scrapes does not grow with them. memory/storage are parsed to GB the same way in
+# cleaning.parse_size_gb.
+#
+#   python specs.py [rows]      parse throughput on a resampled catalogue
+
+PARSE_CACHE_SIZE = 4096
+
+SPEC_COLUMNS = ["rear_mp_total", "rear_mp_primary", "rear_lens_count", "front_mp", "processor_family"]
+
+_MEGAPIXELS = re.compile(r"(\d+(?:\.\d+)?)\s*mp", re.IGNORECASE)
+
+# First match wins; checked against the lowercased processor string
+PROCESSOR_FAMILIES = [
+    ("Snapdragon", re.compile(r"snapdragon|qualcomm|\bsm\d{4}")),
+    ("Dimensity", re.compile(r"dimensity")),
+    ("Helio", re.compile(r"helio|\b(mediatek|meditek)\s+[gpa]\d")),
+    ("MediaTek", re.compile(r"mediatek|meditek|\bmtk?\s?\d")),
+    ("Exynos", re.compile(r"exynos|\bs5e\d")),
+    ("Tensor", re.compile(r"tensor")),
+    ("Apple Bionic", re.compile(r"bionic|\bapple\s+a\d")),
+    ("Unisoc", re.compile(r"unisoc|spreadtrum|tiger|\bsc\d{4}|\bums\d|^t\d{3}")),
+    ("Kirin", re.compile(r"kirin")),
+]
+# Core counts alone ("Octa Core") name no family
+_CORES_ONLY = re.compile(r"^[\s(]*(octa|quad|hexa|dual)[\s-]*core[\s)]*$")
+
+
+@functools.lru_cache(maxsize=PARSE_CACHE_SIZE)
+def parse_camera(text):
+    # (total MP, primary MP, lens count); a lens is any "+"-separated part, with or without a MP figure
+    megapixels = [float(value) for value in _MEGAPIXELS.findall(text)]
+    lenses = len([part for part in text.split("+") if part.strip()])
+    if not megapixels:
+        return np.nan, np.nan, float(lenses) if lenses else np.nan
+    return sum(megapixels), max(megapixels), float(lenses)
+
+
+@functools.lru_cache(maxsize=PARSE_CACHE_SIZE)
+def parse_processor(text):
+    text = " ".join(text.lower().split())
+    if not text:
+        return None
+    for family, pattern in PROCESSOR_FAMILIES:
+        if pattern.search(text):
+            return family
+    return None if _CORES_ONLY.match(text) else "Other"
+
+
+def parse_table(values, parse, width=1, dtype="float64"):
+    # parse(str) for each distinct value, broadcast back to every row; missing rows get NaN/None
+    codes, uniques = pd.factorize(values)
+    parsed = [parse(str(value)) for value in uniques]
+    if width == 1:
+        table = np.array(parsed + [np.nan if dtype != object else None], dtype=dtype)
+        return table[codes]
+    table = np.array(parsed + [(np.nan,) * width], dtype=dtype).reshape(-1, width)
+    return [table[codes, i] for i in range(width)]
+
+
+def add_specs(data):
+    # Adds whichever SPEC_COLUMNS the frame's raw columns allow
+    if "rear_camera" in data.columns:
+        total, primary, lenses = parse_table(data["rear_camera"], parse_camera, width=3)
+        data["rear_mp_total"] = total
+        data["rear_mp_primary"] = primary
+        data["rear_lens_count"] = lenses
+    if "front_camera" in data.columns:
+        data["front_mp"] = parse_table(data["front_camera"], lambda text: parse_camera(text)[1])
+    if "processor" in data.columns:
+        data["processor_family"] = pd.Series(
+            parse_table(data["processor"], parse_processor, dtype=object), index=data.index, dtype=object)
+    return data
+
+
+def _row_by_row(data):
+    # The per-row equivalent of add_specs, without the lookup table; benchmark baseline only
+    rear = [parse_camera.__wrapped__(str(text)) for text in data["rear_camera"]]
+    front = [parse_camera.__wrapped__(str(text))[1] for text in data["front_camera"]]
+    family = [parse_processor.__wrapped__(str(text)) for text in data["processor"]]
+    return rear, front, family
+
+
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 2000000
+    real = pd.read_csv("cleaned_data.csv", usecols=["rear_camera", "front_camera", "processor"])
+    rng = np.random.default_rng(0)
+    sample = real.iloc[rng.integers(0, len(real), rows)].reset_index(drop=True)
+
+    started = time.perf_counter()
+    add_specs(sample.copy())
+    cold = time.perf_counter() - started
+    started = time.perf_counter()
+    parsed = add_specs(sample.copy())
+    warm = time.perf_counter() - started
+    baseline_rows = min(rows, 200000)
+    started = time.perf_counter()
+    _row_by_row(sample.head(baseline_rows))
+    baseline = time.perf_counter() - started
+
+    print("%d rows, %d/%d/%d distinct rear/front/processor strings" % (
+        rows, real["rear_camera"].nunique(), real["front_camera"].nunique(), real["processor"].nunique()))
+    print("lookup table, cold cache: %.3fs (%d rows/sec)" % (cold, rows / cold))
+    print("lookup table, warm cache: %.3fs (%d rows/sec)" % (warm, rows / warm))
+    print("row by row (%d rows):    %.3fs (%d rows/sec)" % (baseline_rows, baseline, baseline_rows / baseline))
+    print(parsed["processor_family"].value_counts(dropna=False).to_string())
@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from datastore import load_catalogue
+from sketches import (
+    DISTINCT_ERROR_BOUND, RANK_ERROR_BOUND, SKETCH_DIMENSIONS, CatalogueSketches, HyperLogLog, sketch_errors,
+)
+
+# Sketch error bounds (derived from SKETCH_K and SKETCH_HLL_BITS in sketches.py)
+# against exact statistics, on a synthetic catalogue and on cleaned_data.csv.
+
+COLUMNS = ["brand", "battery_capacity", "model", "discounted_price"]
+
+
+def synthetic_catalogue(rows=200000, seed=0):
+    # Skewed brand sizes, repeated models (colour/storage variants) and whole-rupee prices, so prices repeat
+    rng = np.random.default_rng(seed)
+    brands = np.array(["BRAND%d" % i for i in range(12)])
+    weights = 1 / np.arange(1, len(brands) + 1)
+    brand = rng.choice(brands, rows, p=weights / weights.sum())
+    model = np.char.add(np.char.add(brand, " "), rng.integers(0, 8000, rows).astype(str))
+    return pd.DataFrame({
+        "brand": brand,
+        "battery_capacity": rng.choice([3000.0, 4000.0, 4500.0, 5000.0, 6000.0], rows),
+        "model": model.astype(object),
+        "discounted_price": np.round(rng.lognormal(9.5, 0.6, rows)),
+    })
+
+
+def assert_within_bounds(report):
+    worst = report[["rank_error", "distinct_error"]].max()
+    assert worst["rank_error"] <= RANK_ERROR_BOUND, report.sort_values("rank_error").tail()
+    assert worst["distinct_error"] <= DISTINCT_ERROR_BOUND, report.sort_values("distinct_error").tail()
+
+
+def test_synthetic_catalogue_within_bounds():
+    data = synthetic_catalogue()
+    assert_within_bounds(sketch_errors(CatalogueSketches.build(data), data))
+
+
+def test_chunked_updates_within_bounds():
+    # As ingest.py builds them, one chunk at a time
+    data = synthetic_catalogue(seed=1)
+    sketches = CatalogueSketches()
+    for start in range(0, len(data), 30000):
+        sketches.update(data.iloc[start:start + 30000])
+    assert_within_bounds(sketch_errors(sketches, data))
+
+
+def test_cleaned_data_within_bounds():
+    data = load_catalogue("cleaned_data.csv", COLUMNS)
+    assert_within_bounds(sketch_errors(CatalogueSketches.build(data), data))
+
+
+def test_merged_halves_match_whole():
+    data = synthetic_catalogue(seed=2)
+    half = len(data) // 2
+    merged = CatalogueSketches.build(data.iloc[:half]).merge(CatalogueSketches.build(data.iloc[half:]))
+    whole = CatalogueSketches.build(data)
+    for dimension in SKETCH_DIMENSIONS:
+        assert merged.groups[dimension].keys() == whole.groups[dimension].keys()
+        for key, (prices, models) in whole.groups[dimension].items():
+            merged_prices, merged_models = merged.groups[dimension][key]
+            # HyperLogLog registers merge exactly; KLL keeps the same count and extremes
+            np.testing.assert_array_equal(merged_models.registers, models.registers)
+            assert (merged_prices.count, merged_prices.min, merged_prices.max) == (prices.count, prices.min, prices.max)
+            # ...and quantiles within the error bound of each other
+            exact = np.sort(data.loc[data[dimension] == key, "discounted_price"].to_numpy())
+            ranks = np.searchsorted(exact, [merged_prices.quantiles([q])[0] for q in (0.25, 0.5, 0.75)]) / len(exact)
+            whole_ranks = np.searchsorted(exact, [prices.quantiles([q])[0] for q in (0.25, 0.5, 0.75)]) / len(exact)
+            assert np.max(np.abs(ranks - whole_ranks)) <= 2 * RANK_ERROR_BOUND
+    assert_within_bounds(sketch_errors(merged, data))
+
+
+def test_hyperloglog_rejects_inexact_register_counts():
+    with pytest.raises(ValueError):
+        HyperLogLog(bits=11)